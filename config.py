@@ -10,6 +10,19 @@ class Config(object):
                   b"\xd9\xb4\xdc\xbaz\x8bO\x06\xd6\x8e+y\x9f\x06C\xec\xfd\xfc;_J{\x88^Ht\xf5\xb4")
 
     SQLALCHEMY_DATABASE_URI = "sqlite:///G:\\OldDDrive\\Projects\\discord-bot\\storage\\database.db"
+
+    # Socket.io message queue (e.g. "redis://localhost:6379"), required when poker tables run in worker processes.
+    SOCKETIO_MESSAGE_QUEUE = None
+    # Amount of worker processes for the poker tables, 0 runs all tables in the web process.
+    POKER_WORKERS = 0
+    # Amount of worker processes for the spectator equity estimates (per web process or table worker), 0 runs the
+    # estimate in the table's own process.
+    POKER_EQUITY_PROCESSES = 0
+    # Record every poker hand to storage/hand_history, to replay them with poker_replay.py. The files are not rotated.
+    POKER_HAND_HISTORY = False
+    # Amount of worker processes which generate hallway floors ahead of time, 0 generates a floor when a game starts.
+    HALLWAY_FLOOR_PROCESSES = 1
+
     # Document storage is required for RAG to index document pages, and we need the raw text for the normal search.
 
 
@@ -0,0 +1,119 @@
+"""
+Benchmarks the hallway A* (src/web_server/lib/hallway/algorithms/pathfinding.py) against the previous implementation
+on generated floors.
+
+For every floor, random pairs of floor cells are searched with the old A*, the new A* and the new A* with jump point
+search. Pairs in different parts of the floor (unreachable goals) are measured separately, the old implementation
+explored the whole reachable maze for those. Path lengths of all implementations are compared.
+
+Usage: python pathfinding_benchmark.py [--floors N] [--pairs N] [--size N]
+"""
+import argparse
+import heapq
+import random
+import time
+from collections import defaultdict
+
+from src.web_server.lib.hallway.Utils import Point
+from src.web_server.lib.hallway.algorithms import pathfinding
+from src.web_server.lib.hallway.map.generator import Generator
+
+
+def reference_astar(level_map, start: Point, goal: Point):
+    """
+    The previous implementation, over Point objects and dictionaries.
+    """
+    frontier = []
+    heapq.heappush(frontier, (0, start))
+    came_from = {start: None}
+    cost_so_far = {start: 0}
+
+    while frontier:
+        current = heapq.heappop(frontier)[1]
+        if current == goal:
+            break
+
+        points = [
+            Point(current.x + 1, current.y),
+            Point(current.x - 1, current.y),
+            Point(current.x, current.y + 1),
+            Point(current.x, current.y - 1)
+        ]
+        for neighbour in [p for p in points if level_map.passable[p.x, p.y]]:
+            new_cost = cost_so_far[current] + 1
+            if neighbour not in cost_so_far or new_cost < cost_so_far[neighbour]:
+                cost_so_far[neighbour] = new_cost
+                heapq.heappush(frontier, (new_cost + neighbour.manhattan_distance(goal), neighbour))
+                came_from[neighbour] = current
+
+    if goal not in came_from:
+        return []
+
+    path = []
+    current_point = goal
+    while current_point != start:
+        path.append(current_point - came_from[current_point])
+        current_point = came_from[current_point]
+    path.reverse()
+    return path
+
+
+IMPLEMENTATIONS = {
+    "old": reference_astar,
+    "new": pathfinding.astar,
+    "new jps": lambda board, start, goal: pathfinding.astar(board, start, goal, jump=True),
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hallway A* against the previous implementation.")
+    parser.add_argument("--floors", type=int, default=5, help="Amount of generated floors.")
+    parser.add_argument("--pairs", type=int, default=100, help="Searches per floor and category.")
+    parser.add_argument("--size", type=int, default=93, help="Size of the floors.")
+    args = parser.parse_args()
+
+    timings = defaultdict(list)
+    mismatches = 0
+    for seed in range(args.floors):
+        random.seed(seed)
+        board, _ = Generator(args.size).generate_board(args.size, seed)
+
+        cells = [Point(x, y) for x in range(args.size) for y in range(args.size) if board.passable[x, y]]
+        width = args.size + 2
+        labels = pathfinding.get_components(board)
+
+        def component(point):
+            return labels[(point.x + 1) * width + point.y + 1]
+
+        reachable, unreachable = [], []
+        while len(reachable) < args.pairs or (len(unreachable) < args.pairs and len(set(labels)) > 2):
+            start, goal = random.sample(cells, 2)
+            pairs = reachable if component(start) == component(goal) else unreachable
+            if len(pairs) < args.pairs:
+                pairs.append((start, goal))
+
+        for category, pairs in (("reachable", reachable), ("unreachable", unreachable)):
+            for start, goal in pairs:
+                lengths = set()
+                for name, implementation in IMPLEMENTATIONS.items():
+                    begin = time.perf_counter()
+                    path = implementation(board, start, goal)
+                    timings[(category, name)].append(time.perf_counter() - begin)
+                    lengths.add(len(path))
+                if len(lengths) != 1:
+                    mismatches += 1
+
+    print(f"{args.floors} floors of {args.size}x{args.size}, {mismatches} searches with different path lengths")
+    print(f"{'':<26}{'calls':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for (category, name), values in timings.items():
+        print(f"{category + ' ' + name:<26}{len(values):>8}{1000 * sum(values) / len(values):>10.3f}"
+              f"{1000 * percentile(values, 0.5):>10.3f}{1000 * percentile(values, 0.95):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Replays recorded poker hands (see src/web_server/lib/poker/HandHistory.py) through a headless PokerTable.
+
+Reports the throughput, the latency per phase and whether every replayed hand ended with the same balances and
+leftover pot as the recorded one. No sockets or database are needed.
+
+Hands are only recorded with POKER_HAND_HISTORY set in the config.
+
+Usage: python poker_replay.py storage/hand_history/table_1.jsonl [more files] [--repeat N]
+"""
+import argparse
+import time
+from collections import defaultdict
+
+from src.database.repository import profile_repository
+from src.web_server import sio
+from src.web_server.lib.poker.Card import card_from_index
+from src.web_server.lib.poker.HandHistory import read_hands
+from src.web_server.lib.poker.Ledger import ChipLedger
+from src.web_server.lib.poker.Player import Player
+from src.web_server.lib.poker.PokerSettings import PokerSettings
+from src.web_server.lib.poker.PokerTable import PokerTable
+
+
+class ReplayProfile(dict):
+    """
+    A recorded profile, which can be read both as a dictionary and through attributes like a UserModel.
+    """
+
+    def __getattr__(self, item):
+        try:
+            return self[item]
+        except KeyError:
+            raise AttributeError(item)
+
+
+class ReplayLedger(ChipLedger):
+    """
+    Only keeps the balances in memory, replays never touch the database or the journal.
+    """
+
+    def __init__(self):
+        self.hand_id = None
+        self.changes = {}
+
+    def record(self, player, amount: int):
+        player.chips += amount
+
+    def settle(self):
+        pass
+
+    def recover(self):
+        pass
+
+
+def timed(timings, name, function):
+    def wrap(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[name].append(time.perf_counter() - start)
+        return result
+
+    return wrap
+
+
+def replay_hand(events, timings):
+    """
+    Plays a single recorded hand on a new table.
+
+    :return: True if the replayed hand ended the same way as the recorded hand.
+    """
+    start, actions, end = events[0], events[1:-1], events[-1]
+
+    table = PokerTable("replay", ReplayLedger())
+
+    settings = dict(start["settings"], equity_iterations=0)
+    table.settings = PokerSettings(settings)
+    table.small_blind_index = start["small_blind_index"]
+    table.pot = start["pot"]
+    table.player_list = [Player(ReplayProfile(player, discord_id=player["owner_id"]), None, table)
+                         for player in start["players"]]
+    for player in table.player_list:
+        table.players.add(player.profile.discord_id, player)
+
+    table.evaluate_hand = timed(timings, "evaluate_hand", table.evaluate_hand)
+    table.post_round = timed(timings, "post_round", table.post_round)
+
+    timed(timings, "initialize_round", table.initialize_round)([card_from_index(i) for i in start["deck"]])
+
+    for event in actions:
+        if event["type"] == "action":
+            phase = table.phase.name
+            timed(timings, phase, table.round)({"owner_id": event["owner_id"]}, event["action"], event["value"])
+        elif event["type"] == "leave":
+            table.remove_player(ReplayProfile(discord_id=event["owner_id"]))
+
+    balances = {str(player.profile['owner_id']): player.chips for player in table.player_list}
+    return balances == end["balances"] and table.pot == end["pot"]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded poker hands as a benchmark.")
+    parser.add_argument("files", nargs="+", help="Hand history files to replay.")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay every hand this many times.")
+    args = parser.parse_args()
+
+    # Headless: nothing is sent and no profiles are fetched from the database.
+    sio.emit = lambda *_args, **_kwargs: None
+    profile_repository.get_profiles = lambda user_ids: []
+
+    hands = [hand for path in args.files for hand in read_hands(path)]
+    timings = defaultdict(list)
+    mismatches = 0
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for hand in hands:
+            if not replay_hand(hand, timings):
+                mismatches += 1
+    total = time.perf_counter() - start
+
+    n_hands = len(hands) * args.repeat
+    print(f"Replayed {n_hands} hands in {total:.3f}s ({n_hands / max(total, 1e-9):.1f} hands/s)")
+    print(f"{mismatches} hands ended differently than recorded")
+    print(f"{'':<18}{'calls':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, values in timings.items():
+        print(f"{name:<18}{len(values):>8}{1000 * sum(values) / len(values):>10.3f}"
+              f"{1000 * percentile(values, 0.5):>10.3f}{1000 * percentile(values, 0.95):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
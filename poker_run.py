@@ -9,6 +9,9 @@ if __name__ == "__main__":
 
     app = create_app()
 
+    from src.web_server.lib.poker.TableManager import init_table_manager
+    init_table_manager(app)
+
     from src import bot
     app.secret_key = bot.config["WEBSERVER"]["SECRET"]
     host = bot.config["WEBSERVER"]["IP"]
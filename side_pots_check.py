@@ -0,0 +1,126 @@
+"""
+Randomized property check of the poker side pots (src/web_server/lib/poker/SidePots.py).
+
+Random hands with uneven stacks, all ins, folds and tied hand strengths are settled, and every hand is checked for:
+- chip conservation: the payouts plus the odd chips equal the contributions plus the carried over chips,
+- the pots match a naive reference which builds a pot for every single chip level,
+- folded players are never eligible for a pot and never win anything,
+- the strongest eligible hands of every pot are paid.
+
+Usage: python side_pots_check.py [--hands N] [--seed N]
+"""
+import argparse
+import random
+
+from src.web_server.lib.poker.SidePots import Pot, build_pots, settle_pots
+
+
+def reference_pots(contributions, contenders, extra=0):
+    """
+    Builds the pots one chip level at a time: level l holds one chip of every player which put in at least l chips.
+    Consecutive levels with the same eligible players form one pot.
+    """
+    pots = []
+    unclaimed = 0
+    for level in range(1, max(contributions.values(), default=0) + 1):
+        reached = [player for player, amount in contributions.items() if amount >= level]
+        eligible = [player for player in reached if player in contenders]
+        if len(eligible) == 0:
+            unclaimed += len(reached)
+        elif len(pots) != 0 and set(pots[-1].eligible) == set(eligible):
+            pots[-1].amount += len(reached)
+        else:
+            pots.append(Pot(len(reached), eligible))
+
+    if len(pots) == 0:
+        return [Pot(extra + unclaimed, list(contenders))] if extra + unclaimed and contenders else []
+
+    pots[0].amount += extra
+    pots[-1].amount += unclaimed
+    return pots
+
+
+def random_hand(rng: random.Random):
+    n_players = rng.randint(2, 9)
+    players = ["player %d" % i for i in range(n_players)]
+
+    # Few distinct levels, so equal contributions (players calling the same all in) are common
+    levels = [rng.randint(0, 200) for _ in range(rng.randint(1, 4))]
+    contributions = {player: rng.choice(levels) for player in players}
+
+    contenders = [player for player in players if rng.random() < 0.7]
+    if len(contenders) == 0:
+        contenders = [rng.choice(players)]
+
+    # Few distinct strengths, so split pots are common
+    strengths = {player: rng.randint(0, 3) for player in contenders}
+    extra = rng.choice([0, 0, rng.randint(1, 50)])
+    return contributions, contenders, strengths, extra
+
+
+def as_comparable(pots):
+    return [(pot.amount, frozenset(pot.eligible)) for pot in pots]
+
+
+def check_hand(contributions, contenders, strengths, extra):
+    """
+    :return: The description of every property the hand violates.
+    """
+    errors = []
+    pots = build_pots(contributions, contenders, extra)
+    if as_comparable(pots) != as_comparable(reference_pots(contributions, contenders, extra)):
+        errors.append("pots differ from the reference: %s" % pots)
+
+    if any(len(pot.eligible) == 0 for pot in pots):
+        errors.append("pot without eligible players: %s" % pots)
+
+    for pot in pots:
+        if any(player not in contenders for player in pot.eligible):
+            errors.append("folded player eligible for %s" % pot)
+
+    payouts, leftover = settle_pots(pots, strengths)
+    if sum(payouts.values()) + leftover != sum(contributions.values()) + extra:
+        errors.append("chips not conserved: paid %d + leftover %d, put in %d + extra %d" % (
+            sum(payouts.values()), leftover, sum(contributions.values()), extra))
+
+    winners = [player for player, amount in payouts.items() if amount > 0]
+    if any(player not in contenders for player in winners):
+        errors.append("folded player won: %s" % payouts)
+
+    if leftover < 0 or any(amount < 0 for amount in payouts.values()):
+        errors.append("negative payout or leftover: %s, %d" % (payouts, leftover))
+
+    # Every pot with at least a chip per eligible player pays all of its winners
+    for pot in pots:
+        best = max(strengths[player] for player in pot.eligible)
+        for player in pot.eligible:
+            if strengths[player] == best and payouts.get(player, 0) == 0 and pot.amount >= len(pot.eligible):
+                errors.append("winner %s of %s was not paid" % (player, pot))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Randomized property check of the poker side pots.")
+    parser.add_argument("--hands", type=int, default=100000, help="Amount of random hands.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random hands.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    for i in range(args.hands):
+        hand = random_hand(rng)
+        errors = check_hand(*hand)
+        if errors:
+            failures += 1
+            if failures <= 10:
+                print("hand %d %s:" % (i, hand))
+                for error in errors:
+                    print("    " + error)
+
+    print("%d hands, %d failed" % (args.hands, failures))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
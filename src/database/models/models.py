@@ -153,6 +153,14 @@ class EsportsGame(db.Model, JSONAble):
     result = Column(String, default=None)
 
 
+class PokerSettlement(db.Model, JSONAble):
+    __tablename__ = "poker_settlement"
+
+    # The chip ledger of a poker table, and the last hand of which the balance changes were written.
+    table = Column(String, primary_key=True)
+    hand_id = Column(String)
+
+
 class GameRoom(db.Model, JSONAble):
     __tablename__ = "game_room"
 
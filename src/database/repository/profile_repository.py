@@ -1,18 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Tuple
+
 from discord import User
+from sqlalchemy import case, event, inspect, update
+from sqlalchemy.orm import Session
 
 from src.database import db
 from src.database.models import models
 
+# Least recently used profiles by discord id, every process (the bot, the web server) has its own cache.
+# Entries are invalidated by the session events below whenever a profile is flushed in this process. Changes made by
+# other processes are not seen, so entries are only trusted for PROFILE_CACHE_TTL seconds, and the cache is disabled
+# when poker table workers settle hands, see configure(). Balances are never written back from a cached profile: they
+# are changed with atomic increments in the database.
+PROFILE_CACHE_SIZE = 512
+PROFILE_CACHE_TTL = 5  # Seconds
+# Discord id -> (profile, time it was loaded)
+_cache: "OrderedDict[int, Tuple[models.UserModel, float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_enabled = True
+cache_hits = 0
+cache_misses = 0
+
+
+def configure(enabled: bool):
+    global _cache_enabled
+    with _cache_lock:
+        _cache_enabled = enabled
+        _cache.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed(session, flush_context):
+    """
+    Drops the cached profiles which were changed or deleted, and remembers them to drop them again once the
+    transaction is committed: until then other sessions may still load and cache the old row.
+    """
+    changed = [instance.discord_id for instance in list(session.dirty) + list(session.deleted)
+               if isinstance(instance, models.UserModel)]
+    if len(changed) == 0:
+        return
+    session.info.setdefault("changed_profiles", set()).update(changed)
+    for discord_id in changed:
+        invalidate(discord_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for discord_id in session.info.pop("changed_profiles", ()):
+        invalidate(discord_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session, previous_transaction):
+    # The rolled back changes never reach the database, the flush already dropped the entries.
+    session.info.pop("changed_profiles", None)
+
+
+def _cache_get(discord_id):
+    """
+    Returns the cached profile attached to the current session, or None if it has to be loaded from the database.
+    """
+    global cache_hits, cache_misses
+    if not _cache_enabled:
+        return None
+    with _cache_lock:
+        profile, loaded = _cache.get(discord_id, (None, 0.))
+        if profile is not None:
+            state = inspect(profile)
+            # Unsaved or expired changes cannot be trusted, nor can old entries, those profiles are loaded again.
+            if state.modified or state.expired_attributes or time.monotonic() - loaded > PROFILE_CACHE_TTL:
+                del _cache[discord_id]
+                profile = None
+
+        if profile is None:
+            cache_misses += 1
+            return None
+
+        _cache.move_to_end(discord_id)
+        cache_hits += 1
+
+    return db.session.merge(profile, load=False)
+
+
+def _cache_put(profile: models.UserModel):
+    if not _cache_enabled:
+        return
+    with _cache_lock:
+        _cache[profile.discord_id] = (profile, time.monotonic())
+        _cache.move_to_end(profile.discord_id)
+        while len(_cache) > PROFILE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(discord_id):
+    with _cache_lock:
+        _cache.pop(discord_id, None)
+
+
+def cache_stats():
+    return {"enabled": _cache_enabled, "hits": cache_hits, "misses": cache_misses, "size": len(_cache),
+            "max_size": PROFILE_CACHE_SIZE}
+
 
 def get_profile(user: User = None, user_id: int = None, username: str = None):
     session = db.session
 
     db_user = None
     # Get the usermodel from either method
-    if user is not None:
-        db_user = session.query(models.UserModel).filter(models.UserModel.discord_id == user.id).one_or_none()
-    elif user_id is not None:
-        db_user = session.query(models.UserModel).filter(models.UserModel.discord_id == user_id).one_or_none()
+    if user is not None or user_id is not None:
+        discord_id = user.id if user is not None else user_id
+        db_user = _cache_get(discord_id)
+        if db_user is not None:
+            return db_user
+        db_user = session.query(models.UserModel).filter(models.UserModel.discord_id == discord_id).one_or_none()
     elif username is not None:
         db_user = session.query(models.UserModel).filter(models.UserModel.name == user.name).one_or_none()
 
@@ -22,9 +125,32 @@ def get_profile(user: User = None, user_id: int = None, username: str = None):
         session.commit()
         session.refresh(db_user)
 
+    _cache_put(db_user)
     return db_user
 
 
+def get_top_profiles(limit: int) -> List[models.UserModel]:
+    """
+    Returns the profiles with the highest balance, and caches them as they are likely to be looked up next.
+    """
+    profiles = db.session.query(models.UserModel).order_by(models.UserModel.balance.desc()).limit(limit).all()
+    for profile in profiles:
+        _cache_put(profile)
+    return profiles
+
+
+def get_profiles(user_ids: List[int]) -> List[models.UserModel]:
+    """
+    Fetches the latest state of many profiles with a single query, discarding unsaved in-memory changes.
+    """
+    session = db.session
+    with session.no_autoflush:
+        return session.query(models.UserModel) \
+            .filter(models.UserModel.discord_id.in_(user_ids)) \
+            .populate_existing() \
+            .all()
+
+
 def add_birthday(user: models.UserModel, birthday):
     session = db.session
     user.birthday = birthday
@@ -32,10 +158,30 @@ def add_birthday(user: models.UserModel, birthday):
     return user
 
 
+def _increment_balance(discord_id, amount):
+    """
+    Adds to the balance in the database, without going through a (possibly outdated) profile. Balances never go
+    below 0.
+    """
+    balance = models.UserModel.balance + amount
+    db.session.execute(
+        update(models.UserModel)
+        .where(models.UserModel.discord_id == discord_id)
+        .values(balance=case((balance < 0, 0), else_=balance))
+        .execution_options(synchronize_session=False)
+    )
+    # Dropped again when the transaction is committed, like profiles changed by a flush
+    db.session.info.setdefault("changed_profiles", set()).add(discord_id)
+    invalidate(discord_id)
+
+
 def update_money(user: models.UserModel, money_update):
     session = db.session
-    user.balance = max(user.balance + money_update, 0)
+    _increment_balance(user.discord_id, money_update)
     session.commit()
+    # The profile gets the balance written by this and every other process
+    if user in session:
+        session.refresh(user)
     return user
 
 
@@ -44,3 +190,41 @@ def update_active_playlist(profile: models.UserModel, value):
     profile.active_playlist = value
     session.commit()
     return profile
+
+
+def _apply_balance_changes(changes: Dict[int, int]):
+    for discord_id, amount in changes.items():
+        _increment_balance(discord_id, amount)
+
+
+def update_balances(changes: Dict[int, int]):
+    """
+    Applies the balance change of every user in a single transaction.
+
+    :param changes: The balance change per discord id.
+    """
+    _apply_balance_changes(changes)
+    db.session.commit()
+    return get_profiles(list(changes.keys()))
+
+
+def settle_hand(table: str, hand_id: str, changes: Dict[int, int]) -> bool:
+    """
+    Applies the balance changes of a poker hand in a single transaction, together with the id of the hand. A hand
+    which was settled before is not applied again.
+
+    :param table: The ledger of the table.
+    :return: False if the hand was already settled.
+    """
+    session = db.session
+    settlement = session.get(models.PokerSettlement, table, populate_existing=True)
+    if settlement is not None and settlement.hand_id == hand_id:
+        return False
+
+    if settlement is None:
+        settlement = models.PokerSettlement(table=table)
+        session.add(settlement)
+    settlement.hand_id = hand_id
+    _apply_balance_changes(changes)
+    session.commit()
+    return True
@@ -43,13 +43,22 @@ def create_app(config_name=None, start_bot=True):
     Payload.max_decode_packets = 500
 
     print("Initializing SocketIO")
-    sio.init_app(app)
+    sio.init_app(app, message_queue=app.config.get("SOCKETIO_MESSAGE_QUEUE"))
     print("Initializing Database")
     db.init_app(app)
+    # Poker table workers settle hands in other processes, a profile cache per process would serve stale balances.
+    from src.database.repository import profile_repository
+    profile_repository.configure(app.config.get("POKER_WORKERS", 0) <= 0)
     print("Initializing Bot")
     if start_bot:
         bot.init_app("config.conf", app)
 
+    from src.web_server.lib.poker import Equity, HandHistory
+    Equity.configure(app.config.get("POKER_EQUITY_PROCESSES", 0))
+    HandHistory.configure(app.config.get("POKER_HAND_HISTORY", False))
+    from src.web_server.lib.hallway.floor_pool import floor_pool
+    floor_pool.configure(app.config.get("HALLWAY_FLOOR_PROCESSES", 0))
+
     print("Registering routes")
     from src.web_server import main
     app.register_blueprint(main.bp)
@@ -58,9 +67,13 @@ def create_app(config_name=None, start_bot=True):
 
 
 def cleanup():
-    from src.web_server.lib.socket.poker_socket import tables
-    for table in tables.values():
-        table.cleanup()
+    from src.web_server.lib.poker import TableManager, Equity
+    from src.web_server.lib.hallway.scheduler import scheduler
+    from src.web_server.lib.hallway.floor_pool import floor_pool
+    TableManager.table_manager.stop()
+    scheduler.stop()
+    floor_pool.stop()
+    Equity.stop()
 
 
 def create_models():
@@ -2,6 +2,7 @@ from enum import Enum
 from typing import List
 
 from src.web_server import sio
+from src.web_server.lib.player_registry import RoomPlayers
 from src.web_server.lib.capture.World import World
 
 
@@ -37,6 +38,7 @@ class CaptureGame:
         self.room_id = room_id
 
         self.player_list: List[CapturePlayer] = []
+        self.players = RoomPlayers("/capture", room_id)
 
         # The game room host.
         self.author = author
@@ -65,17 +67,16 @@ class CaptureGame:
 
     def join(self, player: CapturePlayer):
         self.player_list.append(player)
+        self.players.add(player.username, player)
 
     def remove_player(self, player):
         self.player_list.remove(player)
+        self.players.remove(player.username)
 
     def get_player(self, username, socket_id=None):
         if socket_id is not None:
-            for player in self.player_list:
-                if player.socket == socket_id:
-                    return player
-
-        for player in self.player_list:
-            if player.username == username:
+            player = self.players.get_by_socket(socket_id)
+            if player is not None:
                 return player
-        return None
+
+        return self.players.get(username)
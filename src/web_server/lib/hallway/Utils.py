@@ -137,7 +137,7 @@ def point_interpolator(point1: Point, point2: Point, n_steps=20):
     step = (point2 - point1) / n_steps
 
     last = None
-    for i in range(20):
+    for i in range(n_steps):
         current = round(tracker)
         if last != current:
             yield current
@@ -0,0 +1,126 @@
+"""
+Distance fields (Dijkstra maps) over the passable cells of a board.
+
+A distance field holds for every cell the amount of steps to the nearest source, computed with a single breadth first
+search started from all sources at once. Any number of entities can then walk towards the nearest source by following
+the gradient: from a cell, step to a neighbour which is one step closer. This replaces one A* search per entity with
+one search per set of sources.
+
+Fields are memoized by (sources, board version), so they are only computed again when a source moved or when the
+passability of a cell changed.
+"""
+import threading
+from collections import OrderedDict, deque
+from typing import Iterable, List, Optional
+
+from src.web_server.lib.hallway.Utils import Point
+from src.web_server.lib.hallway.map.board import Board
+
+UNREACHABLE = -1
+FIELD_CACHE_SIZE = 16
+
+# Neighbour order when several neighbours are equally close: right, left, down, up.
+NEIGHBOURS = [Point(1, 0), Point(-1, 0), Point(0, 1), Point(0, -1)]
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+cache_hits = 0
+cache_misses = 0
+
+
+class DistanceField:
+    def __init__(self, board: Board, sources: Iterable[Point]):
+        # The field is stored as a flat list over the board padded with a border of walls, so neighbours never have
+        # to be bounds checked.
+        self.size = board.size
+        self.width = board.size + 2
+        passable = board.padded_passable()
+
+        distances = [UNREACHABLE] * (self.width * self.width)
+        queue = deque()
+        for source in sources:
+            index = self.index(source)
+            if distances[index] == UNREACHABLE:
+                distances[index] = 0
+                queue.append(index)
+
+        offsets = [self.width * point.x + point.y for point in NEIGHBOURS]
+        while queue:
+            index = queue.popleft()
+            distance = distances[index] + 1
+            for offset in offsets:
+                neighbour = index + offset
+                if passable[neighbour] and distances[neighbour] == UNREACHABLE:
+                    distances[neighbour] = distance
+                    queue.append(neighbour)
+
+        self.distances = distances
+
+    def index(self, point: Point):
+        return (point.x + 1) * self.width + point.y + 1
+
+    def distance(self, point: Point) -> int:
+        """
+        :return: The amount of steps to the nearest source, or UNREACHABLE.
+        """
+        if not (0 <= point.x < self.size and 0 <= point.y < self.size):
+            return UNREACHABLE
+        return self.distances[self.index(point)]
+
+    def path(self, start: Point, max_length: Optional[int] = None) -> List[Point]:
+        """
+        Follows the gradient from the start to the nearest source.
+
+        :param max_length: Stop after this many steps, by default the path goes all the way to the source.
+        :return: The moves (unit points) to take, like pathfinding.astar. Empty if no source can be reached.
+        """
+        index = self.index(start)
+        distance = self.distances[index]
+        if distance == UNREACHABLE:
+            return []
+
+        if max_length is not None:
+            distance = min(distance, max_length)
+
+        path = []
+        for _ in range(distance):
+            for move in NEIGHBOURS:
+                neighbour = index + self.width * move.x + move.y
+                if self.distances[neighbour] == self.distances[index] - 1:
+                    path.append(Point(move.x, move.y))
+                    index = neighbour
+                    break
+        return path
+
+
+def distance_field(board: Board, sources: Iterable[Point]) -> DistanceField:
+    """
+    Returns the distance field towards the sources, computing it only if it is not cached yet.
+    """
+    global cache_hits, cache_misses
+
+    sources = tuple(sorted((point.x, point.y) for point in sources))
+    key = (sources, board.version)
+    with _cache_lock:
+        field = _cache.get(key)
+        if field is not None:
+            _cache.move_to_end(key)
+            cache_hits += 1
+            return field
+        cache_misses += 1
+
+    field = DistanceField(board, [Point(x, y) for x, y in sources])
+
+    with _cache_lock:
+        _cache[key] = field
+        if len(_cache) > FIELD_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return field
+
+
+def cache_stats():
+    return {
+        "size": len(_cache),
+        "hits": cache_hits,
+        "misses": cache_misses,
+    }
@@ -0,0 +1,114 @@
+"""
+Field of view of players, cast over the opacity array of the board.
+
+A player sees a cone in the direction they are facing (see line_of_sight_endpoints). The cone is cast as a fixed set
+of rays, which only depend on the direction, so the cells of every ray are computed once as offsets and stored in a
+ray table. Casting a view is then a handful of array operations over that table: a ray stops at the edge of the board,
+and it sees one cell past the first opaque cell it hits, so walls are visible.
+
+Views are memoized by (position, direction, board version). The board version changes when the opacity (or
+passability) of a cell changes, e.g. when a door opens, which invalidates all views computed on the old board.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet
+
+import numpy as np
+
+from src.web_server.lib.hallway.Utils import Point, EntityDirections, line_of_sight_endpoints
+from src.web_server.lib.hallway.map.board import Board
+
+# Amount of samples along every ray
+RAY_STEPS = 20
+FOV_CACHE_SIZE = 512
+
+
+class RayTable:
+    def __init__(self, direction: EntityDirections):
+        rays = []
+        for endpoint in line_of_sight_endpoints(direction):
+            ray = []
+            for i in range(RAY_STEPS):
+                offset = (round(endpoint.x * i / RAY_STEPS), round(endpoint.y * i / RAY_STEPS))
+                if len(ray) == 0 or ray[-1] != offset:
+                    ray.append(offset)
+            rays.append(ray)
+
+        length = max(len(ray) for ray in rays)
+        # Rays are padded to the same length, padding is masked out.
+        self.dx = np.zeros((len(rays), length), dtype=np.intp)
+        self.dy = np.zeros((len(rays), length), dtype=np.intp)
+        self.mask = np.zeros((len(rays), length), dtype=bool)
+        for i, ray in enumerate(rays):
+            self.dx[i, :len(ray)], self.dy[i, :len(ray)] = zip(*ray)
+            self.mask[i, :len(ray)] = True
+        self.steps = np.arange(length)
+
+    def cast(self, opaque: np.ndarray, position: Point) -> np.ndarray:
+        """
+        :return: The visible cells as flat indexes (x * size + y), without duplicates.
+        """
+        size = opaque.shape[0]
+        xs = self.dx + position.x
+        ys = self.dy + position.y
+
+        # A ray stops at the first cell outside the board.
+        inside = (xs >= 0) & (xs < size) & (ys >= 0) & (ys < size)
+        inside = np.logical_and.accumulate(inside, axis=1) & self.mask
+
+        # A ray sees the first opaque cell it hits, and one cell behind it.
+        blocked = opaque[np.clip(xs, 0, size - 1), np.clip(ys, 0, size - 1)] & inside
+        first_blocked = np.where(blocked.any(axis=1), blocked.argmax(axis=1), len(self.steps))
+        visible = inside & (self.steps <= first_blocked[:, None] + 1)
+
+        return np.unique(xs[visible] * size + ys[visible])
+
+
+_ray_tables: Dict[EntityDirections, RayTable] = {}
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+cache_hits = 0
+cache_misses = 0
+
+
+def get_ray_table(direction: EntityDirections) -> RayTable:
+    table = _ray_tables.get(direction)
+    if table is None:
+        table = _ray_tables[direction] = RayTable(direction)
+    return table
+
+
+def field_of_view(board: Board, position: Point, direction: EntityDirections) -> FrozenSet[Point]:
+    """
+    Computes the cells which can be seen from the position, looking in the given direction.
+
+    :return: The visible positions, shared between callers, so it should not be modified.
+    """
+    global cache_hits, cache_misses
+
+    key = (position.x, position.y, direction, board.version)
+    with _cache_lock:
+        view = _cache.get(key)
+        if view is not None:
+            _cache.move_to_end(key)
+            cache_hits += 1
+            return view
+        cache_misses += 1
+
+    cells = get_ray_table(direction).cast(board.opaque, position)
+    view = frozenset(Point(int(cell) // board.size, int(cell) % board.size) for cell in cells)
+
+    with _cache_lock:
+        _cache[key] = view
+        if len(_cache) > FOV_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return view
+
+
+def cache_stats():
+    return {
+        "size": len(_cache),
+        "hits": cache_hits,
+        "misses": cache_misses,
+    }
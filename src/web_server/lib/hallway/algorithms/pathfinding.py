@@ -1,73 +1,209 @@
-import heapq
-from typing import Optional, List
-
-from src.web_server.lib.hallway.map import tiles
-from src.web_server.lib.hallway.Utils import Point
-
-
-#
-# A* implementation taken from
-# https://www.redblobgames.com/pathfinding/a-star/implementation.html
-#
-class PriorityQueue:
-    def __init__(self):
-        self.elements: list[tuple[float, Point]] = []
-
-    def empty(self) -> bool:
-        return not self.elements
-
-    def put(self, item: Point, priority: float):
-        heapq.heappush(self.elements, (priority, item))
-
-    def get(self) -> Point:
-        return heapq.heappop(self.elements)[1]
-
+"""
+Point to point path finding on the board.
 
-def get_neighbors(level_map: List[List[tiles.Tile]], current: Point):
-    points = [
-        Point(current.x + 1, current.y),
-        Point(current.x - 1, current.y),
-        Point(current.x, current.y + 1),
-        Point(current.x, current.y - 1)
-    ]
-    return [p for p in points if level_map[p.x][p.y].movement_allowed]
+A* runs over integer node ids into the padded passable list of the board (see Board.padded_passable), with
+preallocated cost arrays and a closed set. Ties in the priority queue are broken on the distance to the goal and then
+on insertion order, so Points are never compared. Before searching, the connected components of the board are checked,
+so an unreachable goal returns immediately instead of exploring the whole maze, and a node budget bounds the search.
 
+With jump=True the search uses jump point search for 4-connected grids: straight runs without side openings are
+skipped in one step, which expands far fewer nodes in open rooms. Paths are equally short.
 
-def astar(level_map: List[List[tiles.Tile]], start: Point, goal: Point):
-    def heuristic(a: Point, b: Point) -> float:
-        return a.manhattan_distance(b)
-
-    frontier = PriorityQueue()
-    frontier.put(start, 0)
-    came_from: dict[Point, Optional[Point]] = {}
-    cost_so_far: dict[Point, float] = {}
-    came_from[start] = None
-    cost_so_far[start] = 0
+For many entities walking to the same targets, use a distance field instead (see distance_field.py).
+"""
+import heapq
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional
 
-    while not frontier.empty():
-        current: Point = frontier.get()
+from src.web_server.lib.hallway.map.board import Board
+from src.web_server.lib.hallway.Utils import Point
 
-        if current == goal:
-            break
+COMPONENT_CACHE_SIZE = 8
+
+_components: OrderedDict = OrderedDict()
+_components_lock = threading.Lock()
+
+
+def get_components(board: Board) -> List[int]:
+    """
+    Labels the connected passable areas of the board, indexed like Board.padded_passable. Impassable cells are 0.
+    """
+    with _components_lock:
+        labels = _components.get(board.version)
+        if labels is not None:
+            _components.move_to_end(board.version)
+            return labels
+
+    passable = board.padded_passable()
+    width = board.size + 2
+    offsets = (width, -width, 1, -1)
+    labels = [0] * len(passable)
+    label = 0
+    for node in range(len(passable)):
+        if not passable[node] or labels[node]:
+            continue
+
+        label += 1
+        labels[node] = label
+        queue = deque([node])
+        while queue:
+            current = queue.popleft()
+            for offset in offsets:
+                neighbour = current + offset
+                if passable[neighbour] and not labels[neighbour]:
+                    labels[neighbour] = label
+                    queue.append(neighbour)
+
+    with _components_lock:
+        _components[board.version] = labels
+        if len(_components) > COMPONENT_CACHE_SIZE:
+            _components.popitem(last=False)
+    return labels
+
+
+def is_reachable(board: Board, start: Point, goal: Point) -> bool:
+    """
+    Whether a path can exist. The start itself does not need to be passable, entities may stand on e.g. a totem.
+    """
+    width = board.size + 2
+    labels = get_components(board)
+    goal_label = labels[(goal.x + 1) * width + goal.y + 1]
+    if goal_label == 0:
+        return False
+
+    start_id = (start.x + 1) * width + start.y + 1
+    if labels[start_id] == goal_label:
+        return True
+    return any(labels[start_id + offset] == goal_label for offset in (width, -width, 1, -1))
+
+
+def astar(level_map: Board, start: Point, goal: Point, max_nodes: Optional[int] = None, jump=False) -> List[Point]:
+    """
+    Finds a shortest path from start to goal.
+
+    :param max_nodes: Give up after expanding this many nodes, by default the search is not bounded.
+    :param jump: Use jump point search, which is faster in open rooms.
+    :return: The moves (unit points) to take, empty if there is no path or the budget ran out.
+    """
+    if not (level_map.in_bounds(start.x, start.y) and level_map.in_bounds(goal.x, goal.y)):
+        return []
+    if start == goal or not is_reachable(level_map, start, goal):
+        return []
 
-        for neighbour in get_neighbors(level_map, current):
-            new_cost = cost_so_far[current] + 1
-            if neighbour not in cost_so_far or new_cost < cost_so_far[neighbour]:
-                cost_so_far[neighbour] = new_cost
-                priority = new_cost + heuristic(neighbour, goal)
-                frontier.put(neighbour, priority)
+    width = level_map.size + 2
+    passable = level_map.padded_passable()
+    start_id = (start.x + 1) * width + start.y + 1
+    goal_id = (goal.x + 1) * width + goal.y + 1
+    goal_x, goal_y = divmod(goal_id, width)
+
+    cost = [-1] * len(passable)
+    came_from = [-1] * len(passable)
+    closed = bytearray(len(passable))
+
+    def successors(node):
+        if jump:
+            return _jump_successors(passable, width, node, came_from[node], goal_id)
+        return [node + offset for offset in (width, -width, 1, -1) if passable[node + offset]]
+
+    cost[start_id] = 0
+    counter = 0
+    frontier = [(0, 0, counter, start_id)]
+    expanded = 0
+    while frontier:
+        _, _, _, current = heapq.heappop(frontier)
+        if closed[current]:
+            continue
+        if current == goal_id:
+            return _build_path(came_from, start_id, goal_id, width)
+
+        closed[current] = 1
+        expanded += 1
+        if max_nodes is not None and expanded > max_nodes:
+            return []
+
+        current_x, current_y = divmod(current, width)
+        for neighbour in successors(current):
+            if closed[neighbour]:
+                continue
+            neighbour_x, neighbour_y = divmod(neighbour, width)
+            new_cost = cost[current] + abs(neighbour_x - current_x) + abs(neighbour_y - current_y)
+            if cost[neighbour] == -1 or new_cost < cost[neighbour]:
+                cost[neighbour] = new_cost
                 came_from[neighbour] = current
+                heuristic = abs(neighbour_x - goal_x) + abs(neighbour_y - goal_y)
+                counter += 1
+                heapq.heappush(frontier, (new_cost + heuristic, heuristic, counter, neighbour))
+    return []
 
-    if goal not in came_from:
-        # TODO: Random walk when we cannot find a path
-        return []
 
-    # Build the path
+def _build_path(came_from, start_id, goal_id, width) -> List[Point]:
     path = []
-    current_point = goal
-    while current_point != start:
-        path.append(current_point - came_from[current_point])
-        current_point = came_from[current_point]
+    current = goal_id
+    while current != start_id:
+        previous = came_from[current]
+        dx, dy = _direction(previous, current, width)
+        # Jump points can be several cells apart, they are always on a straight line.
+        for _ in range(abs(current - previous) // abs(dx * width + dy)):
+            path.append(Point(dx, dy))
+        current = previous
 
     path.reverse()
     return path
+
+
+def _direction(source, target, width):
+    dx = (target // width > source // width) - (target // width < source // width)
+    dy = 0 if dx != 0 else (target > source) - (target < source)
+    return dx, dy
+
+
+def _jump_successors(passable, width, node, parent, goal_id) -> List[int]:
+    """
+    The jump points reachable from the node. Horizontal runs (along y) only stop at the goal or where a side opens up,
+    vertical runs (along x) also stop wherever a horizontal run from them finds a jump point.
+    """
+    if parent == -1:
+        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    else:
+        dx, dy = _direction(parent, node, width)
+        if dx != 0:
+            # Moving vertically, continue and branch off horizontally.
+            directions = [(dx, 0), (0, 1), (0, -1)]
+        else:
+            directions = [(0, dy)]
+            # Moving horizontally, only turn where a side opened up (a forced neighbour).
+            for side in (1, -1):
+                if passable[node + side * width] and not passable[node - dy + side * width]:
+                    directions.append((side, 0))
+
+    jump_points = []
+    for dx, dy in directions:
+        jump_point = _jump(passable, width, node, dx, dy, goal_id)
+        if jump_point is not None:
+            jump_points.append(jump_point)
+    return jump_points
+
+
+def _jump(passable, width, node, dx, dy, goal_id) -> Optional[int]:
+    step = dx * width + dy
+    while True:
+        node += step
+        if not passable[node]:
+            return None
+        if node == goal_id:
+            return node
+
+        if dx == 0:
+            # Horizontal: a cell beside us opened up, which was closed beside the previous cell.
+            for side in (width, -width):
+                if passable[node + side] and not passable[node - step + side]:
+                    return node
+        else:
+            for side in (1, -1):
+                if passable[node + side] and not passable[node - step + side]:
+                    return node
+            # Vertical runs branch off into horizontal runs at every cell.
+            if _jump(passable, width, node, 0, 1, goal_id) is not None or \
+                    _jump(passable, width, node, 0, -1, goal_id) is not None:
+                return node
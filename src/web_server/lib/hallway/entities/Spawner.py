@@ -1,9 +1,9 @@
-import random
-
 from src.web_server.lib.hallway.entities.enemies.Slime import EnemyClass
 from src.web_server.lib.hallway.entities.entity import Entity
 from src.web_server.lib.hallway.entities.movable_entity import MovableEntity
-from src.web_server.lib.hallway.Utils import Point
+
+SPAWN_RADIUS = 4
+MAX_ENEMIES = 20
 
 
 class EntitySpawner(MovableEntity):
@@ -19,17 +19,18 @@ class EntitySpawner(MovableEntity):
         return True
 
     def post_movement_action(self):
-        if len(self.game.enemies) > 20 or self.game._turn % 2 == 1:
+        if self.game._turn % 2 == 1:
+            return
+        # Keys, doors and chests are enemy entities as well, only count the monsters
+        if sum(isinstance(entity, EnemyClass) for entity in self.game.enemy_entities) > MAX_ENEMIES:
             return
 
-        enemy = self.to_spawn(self.game, **self.kwargs)
-
-        tries = 0
-        while not self.game.board[enemy.position.x][enemy.position.y].movement_allowed:
-            enemy.position = self.position + Point(random.randint(-4, 4), random.randint(-4, 4))
-            tries += 1
+        # A free floor cell around the spawner, if there is none the spawner waits
+        position = self.game.free_cells.choice_near(self.position, SPAWN_RADIUS)
+        if position is None:
+            return
 
-            if tries == 10:
-                return
+        enemy = self.to_spawn(self.game, **self.kwargs)
+        enemy.position = position
         print(f"Spawning enemy at {enemy.position}")
-        self.game.enemies.append(enemy)
+        self.game.spawn_enemy(enemy)
@@ -1,7 +1,7 @@
 from typing import List
 
 from src.web_server.lib.hallway.Utils import Point, EntityDirections
-from src.web_server.lib.hallway.algorithms import pathfinding
+from src.web_server.lib.hallway.algorithms.distance_field import distance_field
 from src.web_server.lib.hallway.entities.Passive import Passive
 from src.web_server.lib.hallway.entities.entity import EntityStat, HPStat
 from src.web_server.lib.hallway.entities.spells.spell import SpellEntity
@@ -83,6 +83,7 @@ class EnemyClass(MovableEntity):
         if self.dead:
             return
 
-        path = pathfinding.astar(self.game.board, self.position, self.game.player_list[0].position)
-        self.movement_queue = path[:self.MAX_MOVEMENT]
+        # Walk towards the nearest living player, all enemies share the same distance field.
+        targets = [player.position for player in self.game.player_list if not player.dead]
+        self.movement_queue = distance_field(self.game.board, targets).path(self.position, self.MAX_MOVEMENT)
         self.movement_cooldown = self.BASE_MOVEMENT
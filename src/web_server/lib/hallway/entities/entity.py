@@ -113,6 +113,8 @@ class Entity:
         if unique_identifier is None:
             unique_identifier = str(uuid.uuid4())
         self.uid = unique_identifier
+        # The spatial index of the game, set while the entity is part of the game
+        self.entity_index = None
         self.position = Point(1, 1)
         self.direction = None
 
@@ -139,10 +141,22 @@ class Entity:
 
         self.class_name = None
 
+        # Forces the entity to be sent to the players on the next update, see pop_update.
         self.updated = True
+        self.sent_state = None
         self.alive = True
         self.can_move_through = True
 
+    @property
+    def position(self) -> Point:
+        return self._position
+
+    @position.setter
+    def position(self, position: Point):
+        self._position = position
+        if self.entity_index is not None:
+            self.entity_index.move(self, position)
+
     @abstractmethod
     def start(self):
         """
@@ -211,6 +225,19 @@ class Entity:
         }
         return state
 
+    def pop_update(self):
+        """
+        Returns the shareable state if it changed since it was last sent to the players, otherwise None.
+        :return:
+        """
+        state = self.to_json()
+        if not self.updated and state == self.sent_state:
+            return None
+
+        self.updated = False
+        self.sent_state = state
+        return state
+
     def die(self):
         """
         Use this to remove entities from the game.
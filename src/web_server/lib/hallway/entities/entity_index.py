@@ -0,0 +1,116 @@
+"""
+Spatial hash of the entities in a game, mapping every position to the entities standing on it.
+
+Entities register themselves with the index through their position setter, so direct assignments
+(movement, teleports, knock backs) keep the index up to date. Entities on the same position are returned in the
+order get_entities_at always used: players first, then allied entities, then enemy entities, each in the order
+they were added to the game.
+
+When a FreeCells index is attached, cells are occupied in it when the first entity steps on them, and released when
+the last entity leaves.
+"""
+import bisect
+import itertools
+from typing import Dict, Iterable, List, Tuple
+
+from src.web_server.lib.hallway.Utils import Point
+
+# Groups of entities, in lookup order
+PLAYERS = 0
+ALLIED = 1
+ENEMIES = 2
+
+
+class EntityIndex:
+    def __init__(self):
+        # Position -> (group, insertion order, entity), sorted
+        self.cells: Dict[Point, List[Tuple[int, int, object]]] = {}
+        # Entity -> its entry and the position under which it is stored
+        self.entries: Dict[int, Tuple[Tuple[int, int, object], Point]] = {}
+        self._order = itertools.count()
+        # The free cells of the board, kept in sync with the occupied positions once attached
+        self.free_cells = None
+
+    def add(self, entity, group: int):
+        """
+        Starts tracking the entity, its position is read now and on every later assignment.
+        """
+        self.remove(entity)
+        entry = (group, next(self._order), entity)
+        self._insert(entry, entity.position)
+        entity.entity_index = self
+
+    def replace(self, old, new):
+        """
+        Tracks the new entity instead of the old one, keeping the lookup order of the old entity.
+        """
+        old_entry, _ = self.entries[id(old)]
+        self.remove(old)
+        entry = (old_entry[0], old_entry[1], new)
+        self._insert(entry, new.position)
+        new.entity_index = self
+
+    def remove(self, entity):
+        stored = self.entries.pop(id(entity), None)
+        if stored is None:
+            return
+        entry, position = stored
+        self._discard(entry, position)
+        entity.entity_index = None
+
+    def clear(self, group: int):
+        """
+        Removes every entity of the group.
+        """
+        for entry, _ in list(self.entries.values()):
+            if entry[0] == group:
+                self.remove(entry[2])
+
+    def move(self, entity, position: Point):
+        entry, old_position = self.entries[id(entity)]
+        if old_position == position:
+            return
+        self._discard(entry, old_position)
+        self._insert(entry, position)
+
+    def attach(self, free_cells):
+        """
+        Keeps the free cells up to date with the positions of the tracked entities, starting with the current ones.
+        """
+        for position in self.cells:
+            free_cells.occupy(position)
+        self.free_cells = free_cells
+
+    def at(self, position: Point) -> list:
+        return [entry[2] for entry in self.cells.get(position, ())]
+
+    def within(self, positions: Iterable[Point], groups=(PLAYERS, ALLIED, ENEMIES)) -> list:
+        """
+        Returns the entities of the given groups standing on any of the positions.
+        """
+        cells = self.cells
+        return [entry[2] for position in positions for entry in cells.get(position, ()) if entry[0] in groups]
+
+    def __contains__(self, entity):
+        return id(entity) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _insert(self, entry, position: Point):
+        self.entries[id(entry[2])] = (entry, position)
+        cell = self.cells.get(position)
+        if cell is None:
+            cell = self.cells[position] = []
+            if self.free_cells is not None:
+                self.free_cells.occupy(position)
+        # Entries compare by group and order, which are unique, so entities themselves are never compared.
+        bisect.insort(cell, entry)
+
+    def _discard(self, entry, position: Point):
+        cell = self.cells[position]
+        cell.remove(entry)
+        if len(cell) == 0:
+            del self.cells[position]
+            if self.free_cells is not None:
+                self.free_cells.release(position)
@@ -111,8 +111,7 @@ class MovableEntity(Entity, metaclass=ABCMeta):
             raise InvalidAction("You cannot move out of bounds.")
 
         self.movement_timer = self.movement_cooldown
-        tile = self.game.board[new_position.x][new_position.y]
-        if not tile.movement_allowed:
+        if not self.game.board.passable[new_position.x, new_position.y]:
             self.moving = False
             raise InvalidAction("You cannot move on this tile.")
 
@@ -32,6 +32,7 @@ class Door(Entity):
         super().__init__(game)
 
         self.can_move_through = False
+        self.orientation = orientation
         self._key = Key(game)
         self.key_gotten = False
 
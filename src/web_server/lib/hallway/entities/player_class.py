@@ -1,10 +1,9 @@
-import random
 from typing import Optional, List
 
 from src.web_server import sio
 from src.web_server.lib.hallway.Items import Item, CollectorItem
-from src.web_server.lib.hallway.Utils import Point, EntityDirections, line_of_sight_endpoints, \
-    point_interpolator
+from src.web_server.lib.hallway.Utils import Point, EntityDirections
+from src.web_server.lib.hallway.algorithms.field_of_view import field_of_view
 from src.web_server.lib.hallway.cards.deck import Deck
 from src.web_server.lib.hallway.entities.Passive import Passive
 from src.web_server.lib.hallway.entities.enemies.Slime import EnemyClass
@@ -12,7 +11,6 @@ from src.web_server.lib.hallway.entities.entity import EntityStat, HPStat
 from src.web_server.lib.hallway.entities.movable_entity import MovableEntity
 from src.web_server.lib.hallway.entities.spells import available_cards, SpellEntity
 from src.web_server.lib.hallway.exceptions import InvalidAction
-from src.web_server.lib.hallway.map.tiles import FloorTile
 
 SPRINT_COOLDOWN = 10 * 60  # Ticks
 KILL_COOLDOWN = 10 * 60  # Ticks
@@ -56,6 +54,8 @@ class PlayerClass(MovableEntity):
         self.passives: List[Passive] = []
 
         self.visible_tiles = []
+        # The personal data this player last received, see HallwayHunters.update_players.
+        self.sent_personal_data = None
 
         from src.web_server.lib.hallway.hallway_hunters import HallwayHunters
         self.game: HallwayHunters = game
@@ -96,7 +96,7 @@ class PlayerClass(MovableEntity):
 
         self.stored_items = []
         self.direction = EntityDirections.DOWN
-        self.visible_tiles = self.compute_line_of_sight()
+        self.update_line_of_sight()
         self.generate_item()
         self.queued_spell_idx = None
 
@@ -216,54 +216,27 @@ class PlayerClass(MovableEntity):
         return cls
 
     def compute_line_of_sight(self):
-        visible_positions = set()
-
-        endpoints = line_of_sight_endpoints(self.direction)
-        endpoints = [point + self.position for point in endpoints]
-        for point in endpoints:
-            walls = 0
-            try:
-                for intermediate in point_interpolator(self.position, point):
-                    if not (0 <= intermediate.x < self.game.size and 0 <= intermediate.y < self.game.size):
-                        break
-                    # Allow for one wall in line of sight
-                    if walls != 0 or self.game.board[intermediate.x][intermediate.y].opaque:
-                        walls += 1
-
-                    visible_positions.add(intermediate)
-                    if walls == 2:
-                        break
-            except IndexError:
-                pass
-
-        return list(visible_positions)
+        return field_of_view(self.game.board, self.position, self.direction)
 
     def get_visible_tiles(self):
-        return [{
-            "x": position.x,
-            "y": position.y,
-            "tile": self.game.board[position.x][position.y].to_json()
-        } for position in self.visible_tiles]
+        return self.game.board.export_cells(self.visible_tiles)
 
     def get_visible_players(self):
         visible_tiles = self.visible_tiles
         return [player for player in self.game.player_list if player.position in visible_tiles]
 
     def generate_item(self):
-        random_x = random.randint(0, len(self.game.board[0]) - 1)
-        random_y = random.randint(0, len(self.game.board) - 1)
-        while not isinstance(self.game.board[random_x][random_y], FloorTile):
-            random_x = random.randint(0, len(self.game.board[0]) - 1)
-            random_y = random.randint(0, len(self.game.board) - 1)
-
-        self.objective = Point(random_x, random_y)
+        position = self.game.free_cells.choice()
+        if position is None:
+            return
 
-        self.game.board[random_x][random_y].item = CollectorItem(self.color)
+        self.objective = position
+        self.game.change_item(position, CollectorItem(self.color))
 
     def drop_item(self):
         if self.item is not None and \
-                not isinstance(self.game.board[self.position.x][self.position.y].item, CollectorItem):
-            self.game.board[self.position.x][self.position.y].item = self.item
+                not isinstance(self.game.board.get_item(self.position.x, self.position.y), CollectorItem):
+            self.game.change_item(self.position, self.item)
             self.item = None
             self.update_line_of_sight()
 
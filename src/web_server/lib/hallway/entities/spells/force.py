@@ -90,7 +90,7 @@ class Teleport(SpellEntity):
         increment = direction_to_point(player.direction)
         for i in range(self.card.ability_range):
             new_position = player.position + increment
-            if player.game.board[new_position.x][new_position.y].movement_allowed:
+            if player.game.board.passable[new_position.x, new_position.y]:
                 player.position += increment
 
         # We moved, so update sight
@@ -1,4 +1,4 @@
-from src.web_server.lib.hallway.algorithms import pathfinding
+from src.web_server.lib.hallway.algorithms.distance_field import distance_field
 from src.web_server.lib.hallway.entities.entity import SimpleEntityAnimationFrames
 from src.web_server.lib.hallway.entities.spells.card import Card
 from src.web_server.lib.hallway.entities.spells.spell import SpellEntity
@@ -78,4 +78,4 @@ class Boomerang(SpellEntity):
 
     def before_turn_action(self):
         if self.returning:
-            self.movement_queue = pathfinding.astar(self.game.board, self.position, self.player.position)
+            self.movement_queue = distance_field(self.game.board, [self.player.position]).path(self.position)
@@ -0,0 +1,115 @@
+"""
+Generates floors in worker processes before the games need them.
+
+Floors are seeded by (room id, floor number), so the pool does not keep anonymous floors but prefetches the floor a
+room will play next: a room asks for its first floor when it is created, and for the next floor when a floor starts.
+Taking a prefetched floor only waits (cooperatively, without blocking the game loop) if its generation did not finish
+yet. Floors in the disk cache are not prefetched, they are loaded when they are taken. Without a prefetched floor, or
+without worker processes, the floor is generated in place.
+
+At most POOL_SIZE floors are kept, the oldest prefetch is dropped when more are requested. The amount of worker
+processes is set from the HALLWAY_FLOOR_PROCESSES config, the workers are spawned instead of forked so they do not
+inherit the monkey patched gevent hub of the web process.
+"""
+import multiprocessing
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Optional
+
+from src.web_server import sio
+from src.web_server.lib.hallway.map.floor import Floor, floor_cache, generate_floor
+
+POOL_SIZE = 8
+TAKE_TIMEOUT = 10  # Seconds
+
+
+class FloorPool:
+    def __init__(self, capacity=POOL_SIZE, processes=0):
+        self.capacity = capacity
+        self.processes = processes
+        self.floors: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        # Floors which were ready (or being generated) when taken, and floors which were generated in place
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, processes):
+        """
+        Sets the amount of worker processes, 0 generates every floor in place when it is taken.
+        """
+        processes = max(0, int(processes))
+        if processes != self.processes:
+            self.stop()
+        self.processes = processes
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def prefetch(self, size, seed):
+        """
+        Starts generating the floor in the background, if it is not generated already.
+        """
+        if self.processes == 0 or floor_cache.contains(size, seed):
+            return
+
+        key = (size, seed)
+        with self.lock:
+            if key in self.floors:
+                return
+            self.floors[key] = self._get_executor().submit(generate_floor, size, seed)
+            while len(self.floors) > self.capacity:
+                _, future = self.floors.popitem(last=False)
+                future.cancel()
+
+    def take(self, size, seed) -> Floor:
+        """
+        Returns the floor for the seed, generated in the background if it was prefetched.
+        """
+        with self.lock:
+            future: Optional[Future] = self.floors.pop((size, seed), None)
+
+        if future is not None:
+            deadline = time.monotonic() + TAKE_TIMEOUT
+            while not future.done() and time.monotonic() < deadline:
+                sio.sleep(0.01)
+
+            if future.done() and not future.cancelled():
+                try:
+                    floor = future.result()
+                    self.hits += 1
+                    return floor
+                except Exception:
+                    traceback.print_exc()
+            else:
+                future.cancel()
+
+        self.misses += 1
+        return generate_floor(size, seed)
+
+    def stop(self):
+        with self.lock:
+            self.floors.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        with self.lock:
+            ready = sum(future.done() for future in self.floors.values())
+            return {
+                "ready": ready,
+                "pending": len(self.floors) - ready,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+floor_pool = FloorPool()
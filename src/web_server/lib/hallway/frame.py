@@ -0,0 +1,36 @@
+"""
+The state of a Hallway Hunters game which all players share, collected once per tick.
+
+Everything except the personal data (hand, passives) is the same for every player: all players see the union of
+each others line of sight. The frame is sent to the whole socket.io room at once, so it is only serialized once
+instead of once per player.
+"""
+from typing import List, Optional, Set
+
+from src.web_server.lib.hallway.Utils import Point
+from src.web_server.lib.hallway.map.board import Board
+
+
+class TickFrame:
+    def __init__(self, board: Board, all_players: List[dict], visible_positions: Set[Point], visible_entities: list):
+        self.board = board
+        self.all_players = all_players
+        self.visible_positions = visible_positions
+        self.visible_entities = visible_entities
+
+        # The shared state which changed since the previous frame, filled by HallwayHunters.build_frame
+        self.changes = {}
+        self._full_state: Optional[dict] = None
+
+    def full_state(self) -> dict:
+        """
+        The complete shared state, for heartbeats and (re)loading clients. Built at most once per frame.
+        """
+        if self._full_state is None:
+            self._full_state = {
+                "all_players": self.all_players,
+                # Cells are sent as [x, y, palette id].
+                "visible_tiles": self.board.export_cells(list(self.visible_positions)),
+                "visible_entities": [entity.to_json() for entity in self.visible_entities],
+            }
+        return self._full_state
@@ -1,25 +1,29 @@
 from __future__ import annotations
-import logging
 import random
-import threading
-import time
-from datetime import datetime
 from typing import List, Optional, Dict
 
 from src.web_server import sio
 from src.web_server.utils import timing
+from src.web_server.lib.player_registry import RoomPlayers
 from src.web_server.lib.hallway.entities.movable_entity import MovableEntity
 from src.web_server.lib.hallway.entities.spells import SpellEntity
 from src.web_server.lib.hallway.entities.enemies.MonkeyBall import MonkeyBall
 from src.web_server.lib.hallway.entities.enemies.Sloth import Sloth
 
+from src.web_server.lib.hallway.Items import Item
 from src.web_server.lib.hallway.map import tiles
+from src.web_server.lib.hallway.map.board import Board, PALETTE, FLOOR
+from src.web_server.lib.hallway.map.free_cells import FreeCells
 from src.web_server.lib.hallway.Utils import Point, Turns, Phases
 from src.web_server.lib.hallway.entities.enemies.Slime import EnemyClass, Slime
 from src.web_server.lib.hallway.entities.player_class import PlayerClass, PlayerState
 from src.web_server.lib.hallway.entities.entity import Entity
+from src.web_server.lib.hallway.entities.entity_index import EntityIndex, PLAYERS, ALLIED, ENEMIES
+from src.web_server.lib.hallway.frame import TickFrame
+from src.web_server.lib.hallway.profiler import TickProfiler
+from src.web_server.lib.hallway.scheduler import scheduler
+from src.web_server.lib.hallway.floor_pool import floor_pool
 from src.web_server.lib.hallway.entities.Spawner import EntitySpawner
-from src.web_server.lib.hallway.map.generator import Generator
 
 games: Dict[int, HallwayHunters] = {}
 
@@ -32,29 +36,47 @@ class HallwayHunters:
         self.author = username
         self.phase = Phases.NOT_YET_STARTED
         self.player_list: List[PlayerClass] = []
+        self.players = RoomPlayers("/hallway", room_id)
         self.size = 93
 
         self.color_pool = ["blue", "red", "black", "purple", "green"]
 
-        self.generator = Generator(self.size)
+        # Floors are generated from (room id, floor), so the same room always plays the same floors.
+        self.floor = 0
+        floor_pool.prefetch(self.size, (self.room_id, self.floor))
+
         self.room_centers: List[Point] = []
-        self.board: List[List[tiles.Tile]] = []
+        self.board = Board(self.size)
         self.allied_entities: List[Entity] = []
         self.enemy_entities: List[Entity] = []
+        # Position -> entities, for players and both entity lists
+        self.entity_index = EntityIndex()
+        # Floor cells without entities, to place items and spawned enemies
+        self.free_cells: Optional[FreeCells] = None
 
-        # Generate this to send to every player initially
-        self.initial_board_json = [[tiles.UnknownTile().to_json() for _ in range(self.size)] for _ in range(self.size)]
         self.updated_line_of_sight = True
+        # The amount of palette entries which were sent to the room.
+        self.palette_sent = 0
+
+        # Cells seen by any player, recomputed when a line of sight or an allied entity moved.
+        self.visible_positions = set()
+        self.visible_cells: List[List[int]] = []
+        self.visibility_version = 0
+        self.allied_positions: List[Point] = []
+
+        # Shared state as it was last sent to the players, during the game only changes are sent.
+        self.sent_players: Optional[List[dict]] = None
+        self.sent_visibility_version = -1
+        # Without changes, the full state is sent every heartbeat_ticks ticks.
+        self.heartbeat_ticks = self.tick_rate
+        self.idle_ticks = 0
+        # Timings of sampled ticks, per phase and per entity type
+        self.profiler = TickProfiler()
 
-        self.spent_time = 0.00001
-        self.ticks = 0
         self.processing_entities = False
         self._turn = 0
         self.finished = False
 
-        self.game_loop_thread = threading.Thread(target=self.game_loop)
-        self.game_lock = threading.Condition()
-
         self.board_changes = []
 
     def generate_spawners(self, n=2):
@@ -65,36 +87,38 @@ class HallwayHunters:
         for point in points:
             spawner = EntitySpawner(self, Slime)
             spawner.position = point
-            self.enemy_entities.append(spawner)
-            self.board[point.x][point.y - 1] = tiles.TotemTopLeft()
-            self.board[point.x][point.y] = tiles.TotemMidLeft()
-            self.board[point.x][point.y + 1] = tiles.TotemBotLeft()
-            self.board[point.x + 1][point.y - 1] = tiles.TotemTopRight()
-            self.board[point.x + 1][point.y] = tiles.TotemMidRight()
-            self.board[point.x + 1][point.y + 1] = tiles.TotemBotRight()
+            self.spawn_enemy(spawner)
+            self.board.set_tile(point.x, point.y - 1, tiles.TotemTopLeft())
+            self.board.set_tile(point.x, point.y, tiles.TotemMidLeft())
+            self.board.set_tile(point.x, point.y + 1, tiles.TotemBotLeft())
+            self.board.set_tile(point.x + 1, point.y - 1, tiles.TotemTopRight())
+            self.board.set_tile(point.x + 1, point.y, tiles.TotemMidRight())
+            self.board.set_tile(point.x + 1, point.y + 1, tiles.TotemBotRight())
 
     def start(self):
         if self.phase == Phases.STARTED:
             return
         self.phase = Phases.STARTED
 
-        # Generate current floor of the dungeon
-        self.board, self.room_centers = self.generator.generate_board(self.size, self.room_id)
+        # Take the current floor of the dungeon, which was generated in the background, and prefetch the next one
+        floor = floor_pool.take(self.size, (self.room_id, self.floor))
+        self.floor += 1
+        floor_pool.prefetch(self.size, (self.room_id, self.floor))
+
+        self.board = floor.create_board()
+        self.room_centers = [Point(x, y) for x, y in floor.room_centers]
         self.generate_spawners(0)
-        spawn_point = random.choice(self.room_centers)
+        spawn_point = Point(*floor.spawn_point)
 
-        # Generate keys and door entities
+        # Add the keys, doors and chests of the floor
         self.enemy_entities.clear()
         self.allied_entities.clear()
+        self.entity_index.clear(ENEMIES)
+        self.entity_index.clear(ALLIED)
 
-        entities = self.generator.generate_keys(spawn_point)
-        self.add_enemy_entities(entities)
-
-        chests = self.generator.generate_chests(self, loot_table=(
-            [1],
-            ["teleport"]
-        ))
-        self.add_enemy_entities(chests)
+        self.add_enemy_entities(floor.create_entities(self))
+        self.free_cells = FreeCells(self.board.tile_type == FLOOR)
+        self.entity_index.attach(self.free_cells)
 
         spawn_point_modifier = [
             Point(0, 0),
@@ -103,6 +127,7 @@ class HallwayHunters:
             Point(1, 1),
             Point(-1, 1)
         ]
+        self.updated_line_of_sight = True
         for i, player in enumerate(self.player_list):
             player.change_position(spawn_point + spawn_point_modifier[i])
             player.start()
@@ -119,36 +144,7 @@ class HallwayHunters:
         self._turn = 0
 
         self.finished = False
-        self.game_lock.acquire()
-        self.game_lock.notify()
-        self.game_lock.release()
-
-    def game_loop(self):
-        s_per_tick = 1 / self.tick_rate
-        while True:
-            print("Started loop")
-            while not self.finished:
-                start = datetime.now()
-
-                self.tick()
-
-                diff = (datetime.now() - start).total_seconds()
-
-                self.spent_time += diff
-                self.ticks += 1.
-                if self.ticks % self.tick_rate == 0:
-                    self.spent_time = 0.000001
-                    self.ticks = 0
-
-                # Fill time sleeping while waiting for next tick
-                time.sleep(s_per_tick - diff)
-
-                logger = logging.getLogger("timing")
-                logger.info(f"game_loop: {diff}")
-
-            self.game_lock.acquire()
-            self.game_lock.wait()
-            self.game_lock.release()
+        scheduler.add(self)
 
     def process_player_turn(self):
         # Check if players are each ready with their queued actions
@@ -193,13 +189,17 @@ class HallwayHunters:
         self.increment_turn()
 
     def tick(self):
+        profiler = self.profiler
+        profiler.start_tick()
+
         # Resolve entities
         for entity in self.allied_entities:
-            entity.tick()
+            profiler.tick_entity(entity)
         for entity in self.enemy_entities:
-            entity.tick()
+            profiler.tick_entity(entity)
         for player in self.player_list:
-            player.tick()
+            profiler.tick_entity(player)
+        profiler.mark("entities")
 
         # Player turn
         if self.to_move() == Turns.PLAYER:
@@ -217,72 +217,146 @@ class HallwayHunters:
             self.process_entity_turn([
                 entity for entity in self.enemy_entities if not isinstance(entity, EnemyClass)
             ])
+        profiler.mark("turn")
 
-        # Update the player of all changes that occurred
-        self.update_players()
+        # Update the player of all changes that occurred, the shared state is collected once for all players
+        self.update_players(self.build_frame())
+        profiler.mark("emit")
         # After having sent the update to all players, empty board changes list
         self.board_changes = []
+        profiler.end_tick()
 
     def add_player(self, username: str, socket_id):
-        for player in self.player_list:
-            if player.username == username:
-                # If the user is already in the list, overwrite the socket id to the newest one.
-                player.socket = socket_id
-                print("Already found player, overwriting socket id")
-                return player
+        player = self.players.get(username)
+        if player is not None:
+            # If the user is already in the list, overwrite the socket id to the newest one.
+            self.players.set_socket(username, socket_id)
+            print("Already found player, overwriting socket id")
+            return player
 
         player = PlayerClass(username, socket_id, self)
 
         player.color = self.color_pool.pop()
         if self.phase == Phases.NOT_YET_STARTED and len(self.player_list) < 8:
             self.player_list.append(player)
+            self.players.add(username, player)
+            self.entity_index.add(player, PLAYERS)
         return player
 
-    def update_players(self):
+    def build_frame(self) -> TickFrame:
+        """
+        Collects the state which all players share, and which part of it changed since the previous frame.
+        """
+        self.refresh_visibility()
+        self.profiler.mark("line_of_sight")
+        frame = TickFrame(self.board, [player.to_json() for player in self.player_list], self.visible_positions,
+                          self.get_visible_entities())
+        changes = frame.changes
+
+        if frame.all_players != self.sent_players:
+            self.sent_players = changes["all_players"] = frame.all_players
+
+        if self.removed_entity_ids:
+            changes["removed_entity_ids"] = self.removed_entity_ids
+            self.removed_entity_ids = []
+
+        if self.visibility_version != self.sent_visibility_version:
+            self.sent_visibility_version = self.visibility_version
+            changes["visible_tiles"] = self.visible_cells
+
+        # Changed tiles in sight, tiles out of sight are sent once they become visible.
+        board_changes = [[x, y, pid] for x, y, pid in self.board_changes if Point(x, y) in self.visible_positions]
+        if board_changes:
+            changes["board_changes"] = board_changes
+
+        visible_entities = [state for state in (entity.pop_update() for entity in frame.visible_entities)
+                            if state is not None]
+        if visible_entities:
+            changes["visible_entities"] = visible_entities
+
+        # New palette entries, palette ids are indexes into the full list.
+        if self.palette_sent < len(PALETTE):
+            changes.update({
+                "palette_offset": self.palette_sent,
+                "palette": PALETTE[self.palette_sent:]
+            })
+            self.palette_sent = len(PALETTE)
+
+        self.profiler.mark("serialization")
+        return frame
+
+    def update_players(self, frame: TickFrame = None):
+        """
+        Sends the shared changes to the whole room at once, and the personal data to the players whose data changed.
+        Nothing is sent while the game is idle, except for a heartbeat with the full state every heartbeat_ticks ticks.
+        """
+        if frame is None:
+            frame = self.build_frame()
+        started = self.phase == Phases.STARTED
+
+        shared = frame.changes
+        heartbeat = len(shared) == 0 and self.idle_ticks >= self.heartbeat_ticks
+        if heartbeat:
+            shared = frame.full_state()
+
+        sent = False
+        if len(shared) != 0:
+            sio.emit("game_state", dict(shared, started=started), room=self.room_id, namespace="/hallway")
+            sent = True
+
         for player in self.player_list:
-            sio.emit("game_state", self.export_board(player, reduced=True), room=player.socket, namespace="/hallway")
+            personal_data = player.personal_data_json()
+            if heartbeat or personal_data != player.sent_personal_data:
+                player.sent_personal_data = personal_data
+                sio.emit("game_state", {
+                    "started": started,
+                    "player_data": personal_data
+                }, room=player.socket, namespace="/hallway")
+                sent = True
+
+        self.idle_ticks = 0 if sent else self.idle_ticks + 1
+
+    def refresh_visibility(self):
+        """
+        Recomputes the cells seen by any player, if a line of sight changed or an allied entity moved.
+        The visibility version is only incremented when the set of visible cells changed.
+        """
+        allied_positions = [entity.position for entity in self.allied_entities]
+        if not self.updated_line_of_sight and allied_positions == self.allied_positions:
+            return
+        self.updated_line_of_sight = False
+        self.allied_positions = allied_positions
 
-    def export_board(self, player: PlayerClass, reduced=False):
-        data = {
-            "started": self.phase == Phases.STARTED,
-            "player_data": player.personal_data_json(),
-            "all_players": [player.to_json() for player in self.player_list],
-            "removed_entity_ids": [i for i in self.removed_entity_ids]
-        }
-        self.removed_entity_ids.clear()
-
-        # If this players line of sight changed, send new data.
-        if self.updated_line_of_sight:
-            # TODO: Remove the condition in some cases
-            visible_tiles = []
-            for p in self.player_list:
-                visible_tiles.extend(p.visible_tiles)
-            visible_tiles.extend(entity.position for entity in self.allied_entities)
-
-            data.update({
-                "visible_tiles": [{
-                    "x": p.x,
-                    "y": p.y,
-                    "tile": self.board[p.x][p.y].to_json()
-                } for p in list(set(visible_tiles))]
-            })
+        visible_positions = set(allied_positions)
+        for player in self.player_list:
+            visible_positions.update(player.visible_tiles)
+        if visible_positions == self.visible_positions:
+            return
 
-            # Share visible enemies too user
-            visible_entities = []
-            for tile in visible_tiles:
-                for entity in self.enemy_entities + self.allied_entities:
-                    if entity.position == tile:
-                        visible_entities.append(entity)
+        self.visible_positions = visible_positions
+        self.visible_cells = self.board.export_cells(list(visible_positions))
+        self.visibility_version += 1
 
-            data.update({
-                "visible_entities": [entity.to_json() for entity in visible_entities]
-            })
+    def get_visible_entities(self) -> List[Entity]:
+        return self.entity_index.within(self.visible_positions, (ALLIED, ENEMIES))
 
-        if not reduced:
-            data.update({
-                "board_size": self.size
-            })
+    def export_board(self, player: PlayerClass):
+        """
+        Exports the full state for a single (re)loading client.
+        """
+        self.refresh_visibility()
+        frame = TickFrame(self.board, [player.to_json() for player in self.player_list], self.visible_positions,
+                          self.get_visible_entities())
 
+        data = dict(frame.full_state())
+        data.update({
+            "started": self.phase == Phases.STARTED,
+            "player_data": player.personal_data_json(),
+            "board_size": self.size,
+            # The client does not know any palette entries yet.
+            "palette_offset": 0,
+            "palette": PALETTE[:]
+        })
         return data
 
     def set_color(self, username: str, color: str):
@@ -297,32 +371,27 @@ class HallwayHunters:
         player.color = color
 
     def get_player(self, username: str = None, socket_id=None) -> Optional[PlayerClass]:
-        combined_list = self.player_list[:]
-
         if username is not None:
-            for player in combined_list:
-                if player.username == username:
-                    return player
-            return None
+            return self.players.get(username)
         elif socket_id is not None:
-            for player in combined_list:
-                if player.socket == socket_id:
-                    return player
-            return None
+            return self.players.get_by_socket(socket_id)
 
     def set_player(self, username, new_player):
         for i, player in enumerate(self.player_list):
             if player.username == username:
                 self.player_list[i] = new_player
+                self.players.add(username, new_player)
+                self.entity_index.replace(player, new_player)
                 return
 
     def remove_player(self, username: str):
-        player = self.get_player(username)
+        player = self.players.remove(username)
         self.color_pool.append(player.color)
         print("Disconnecting player, current pool:", self.color_pool)
 
         if player in self.player_list:
             self.player_list.remove(player)
+        self.entity_index.remove(player)
 
         if len(self.player_list) == 0:
             self.finished = True
@@ -347,12 +416,12 @@ class HallwayHunters:
     def change_tile(self, position, tile: tiles.Tile):
         if not self.in_bounds(position):
             return
-        self.board[position.x][position.y] = tile
-        self.board_changes.append({
-            "x": position.x,
-            "y": position.y,
-            "tile": tile.to_json()
-        })
+        self.board.set_tile(position.x, position.y, tile)
+        self.board_changes.append([position.x, position.y, self.board.palette_id(position.x, position.y)])
+
+    def change_item(self, position, item: Optional[Item]):
+        self.board.set_item(position.x, position.y, item)
+        self.board_changes.append([position.x, position.y, self.board.palette_id(position.x, position.y)])
 
     @timing
     def increment_turn(self):
@@ -373,15 +442,7 @@ class HallwayHunters:
                     entity.before_turn_action()
 
     def get_entities_at(self, position):
-        all_entities = []
-        all_entities.extend(
-            [x for x in (
-                    self.player_list +
-                    self.allied_entities +  # noqa
-                    self.enemy_entities)
-             if x.position == position]
-        )
-        return all_entities
+        return self.entity_index.at(position)
 
     def remove_entity(self, entity):
         if entity in self.enemy_entities:
@@ -390,10 +451,12 @@ class HallwayHunters:
             self.allied_entities.remove(entity)
         else:
             return  # Already removed this entity
+        self.entity_index.remove(entity)
         self.removed_entity_ids.append(entity.uid)
 
     def spawn_enemy(self, enemy):
         self.enemy_entities.append(enemy)
+        self.entity_index.add(enemy, ENEMIES)
 
     def to_move(self):
         return self._turn % 4
@@ -401,9 +464,11 @@ class HallwayHunters:
     def add_ally_entities(self, entities):
         for entity in entities:
             entity.game = self
+            self.entity_index.add(entity, ALLIED)
         self.allied_entities.extend(entities)
 
     def add_enemy_entities(self, entities):
         for entity in entities:
             entity.game = self
+            self.entity_index.add(entity, ENEMIES)
         self.enemy_entities.extend(entities)
@@ -0,0 +1,230 @@
+"""
+Array backed board for Hallway Hunters.
+
+Instead of one Tile object per cell, the board keeps parallel NumPy arrays indexed as [x, y]:
+ - tile_type: an id into the shared tile type table, which holds the image and flags of every kind of tile.
+ - passable: whether entities may move onto the cell.
+ - opaque: whether the cell blocks line of sight.
+ - item: an id into the items of this board, 0 if the cell has no item.
+
+Tile objects are only created again when callers ask for one explicitly. Clients receive cells as
+[x, y, palette id] triples instead, where the palette holds the serialized tile of every distinct tile state.
+
+Every board has a version, which changes whenever the opacity or passability of a cell changes. Versions are unique
+over all boards, so results derived from them (like the field of view or distance fields) can be cached by version.
+"""
+import copy
+import itertools
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.web_server.lib.hallway.Items import Item
+from src.web_server.lib.hallway.map.tiles import Tile, UnknownTile, FloorTile
+
+
+class TileType:
+    def __init__(self, type_id, prototype: Tile):
+        self.id = type_id
+        self.prototype = prototype
+        self.tile_class = type(prototype)
+        self.image = prototype.image
+        self.movement_allowed = prototype.movement_allowed
+        self.opaque = prototype.opaque
+
+
+# Every distinct tile (class, image, flags and extra attributes like a door orientation) gets a type id.
+TILE_TYPES: List[TileType] = []
+_tile_type_ids: Dict[tuple, int] = {}
+_tile_type_lock = threading.Lock()
+
+
+def _tile_key(tile: Tile):
+    return type(tile), tuple(sorted((key, value) for key, value in vars(tile).items() if key != "item"))
+
+
+def tile_type_id(tile: Tile) -> int:
+    """
+    Returns the type id of the tile, registering a new type the first time such a tile is seen.
+    """
+    key = _tile_key(tile)
+    type_id = _tile_type_ids.get(key)
+    if type_id is not None:
+        return type_id
+
+    with _tile_type_lock:
+        if key not in _tile_type_ids:
+            prototype = copy.copy(tile)
+            prototype.item = None
+            TILE_TYPES.append(TileType(len(TILE_TYPES), prototype))
+            _tile_type_ids[key] = len(TILE_TYPES) - 1
+        return _tile_type_ids[key]
+
+
+UNKNOWN = tile_type_id(UnknownTile())
+FLOOR = tile_type_id(FloorTile())
+
+# Serialized tile states (a tile type with an item), shared by all boards. Only grows, so clients can be sent the
+# entries they have not seen yet.
+PALETTE: List[dict] = []
+_palette_ids: Dict[tuple, int] = {}
+_palette_lock = threading.Lock()
+
+
+def palette_id(type_id, item: Optional[Item]) -> int:
+    item_json = item.to_json() if item is not None else None
+    key = (type_id, tuple(sorted(item_json.items())) if item_json is not None else None)
+    pid = _palette_ids.get(key)
+    if pid is not None:
+        return pid
+
+    with _palette_lock:
+        if key not in _palette_ids:
+            data = TILE_TYPES[type_id].prototype.to_json()
+            data["item"] = item_json
+            PALETTE.append(data)
+            _palette_ids[key] = len(PALETTE) - 1
+        return _palette_ids[key]
+
+
+_versions = itertools.count()
+
+
+class Board:
+    def __init__(self, size, fill: Tile = None):
+        fill_type = TILE_TYPES[tile_type_id(fill if fill is not None else UnknownTile())]
+
+        self.size = size
+        self.tile_type = np.full((size, size), fill_type.id, dtype=np.uint16)
+        self.passable = np.full((size, size), fill_type.movement_allowed, dtype=bool)
+        self.opaque = np.full((size, size), fill_type.opaque, dtype=bool)
+        self.item = np.zeros((size, size), dtype=np.int32)
+        # Palette id of every cell, -1 when the cell changed since it was last serialized.
+        self.palette = np.full((size, size), -1, dtype=np.int32)
+
+        self.items: Dict[int, Item] = {}
+        self._next_item_id = 1
+        self.version = next(_versions)
+        self._padded_passable = None
+
+    def __len__(self):
+        return self.size
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def set_type(self, x, y, type_id):
+        tile_type = TILE_TYPES[type_id]
+        if self.opaque[x, y] != tile_type.opaque or self.passable[x, y] != tile_type.movement_allowed:
+            self.version = next(_versions)
+        self.tile_type[x, y] = type_id
+        self.passable[x, y] = tile_type.movement_allowed
+        self.opaque[x, y] = tile_type.opaque
+        self.palette[x, y] = -1
+
+    def set_tile(self, x, y, tile: Tile):
+        self.set_type(x, y, tile_type_id(tile))
+        self.set_item(x, y, tile.item)
+
+    def fill(self, x, y, width, height, type_id):
+        """
+        Sets every cell in the rectangle to the same tile type.
+        """
+        tile_type = TILE_TYPES[type_id]
+        self.tile_type[x:x + width, y:y + height] = type_id
+        self.passable[x:x + width, y:y + height] = tile_type.movement_allowed
+        self.opaque[x:x + width, y:y + height] = tile_type.opaque
+        self.palette[x:x + width, y:y + height] = -1
+        self.version = next(_versions)
+
+    def is_type(self, x, y, type_id) -> bool:
+        return self.tile_type[x, y] == type_id
+
+    def get_type(self, x, y) -> TileType:
+        return TILE_TYPES[self.tile_type[x, y]]
+
+    def get_item(self, x, y) -> Optional[Item]:
+        item_id = self.item[x, y]
+        return self.items[item_id] if item_id else None
+
+    def set_item(self, x, y, item: Optional[Item]):
+        old_id = self.item[x, y]
+        if old_id:
+            del self.items[old_id]
+        self.palette[x, y] = -1
+
+        if item is None:
+            self.item[x, y] = 0
+            return
+
+        self.items[self._next_item_id] = item
+        self.item[x, y] = self._next_item_id
+        self._next_item_id += 1
+
+    def get_tile(self, x, y) -> Tile:
+        """
+        Materializes the cell as a Tile object.
+        """
+        tile = copy.copy(TILE_TYPES[self.tile_type[x, y]].prototype)
+        tile.item = self.get_item(x, y)
+        return tile
+
+    def padded_passable(self) -> List[bool]:
+        """
+        The passable flags as a flat list over the board padded with a border of impassable cells, cell (x, y) is at
+        (x + 1) * (size + 2) + y + 1. Searches use it so they never have to check bounds. Cached per version.
+        """
+        if self._padded_passable is None or self._padded_passable[0] != self.version:
+            padded = np.zeros((self.size + 2, self.size + 2), dtype=bool)
+            padded[1:-1, 1:-1] = self.passable
+            self._padded_passable = (self.version, padded.ravel().tolist())
+        return self._padded_passable[1]
+
+    def palette_id(self, x, y) -> int:
+        pid = self.palette[x, y]
+        if pid < 0:
+            pid = self.palette[x, y] = palette_id(self.tile_type[x, y], self.get_item(x, y))
+        return int(pid)
+
+    def tile_json(self, x, y):
+        return PALETTE[self.palette_id(x, y)]
+
+    def export_cells(self, positions) -> List[List[int]]:
+        """
+        Serializes the given cells as [x, y, palette id] triples.
+        """
+        xs = np.fromiter((position.x for position in positions), dtype=np.intp, count=len(positions))
+        ys = np.fromiter((position.y for position in positions), dtype=np.intp, count=len(positions))
+        pids = self.palette[xs, ys]
+        for i in np.flatnonzero(pids < 0):
+            pids[i] = self.palette_id(xs[i], ys[i])
+        return np.stack((xs, ys, pids), axis=1).tolist()
+
+    @classmethod
+    def from_tile_types(cls, tile_type: np.ndarray) -> "Board":
+        """
+        Creates a board from a square array of tile type ids, the flags of every cell are looked up in the tile type
+        table. The board has no items.
+        """
+        movement_allowed = np.array([entry.movement_allowed for entry in TILE_TYPES], dtype=bool)
+        opaque = np.array([entry.opaque for entry in TILE_TYPES], dtype=bool)
+
+        board = cls.__new__(cls)
+        board.size = len(tile_type)
+        board.tile_type = tile_type.astype(np.uint16)
+        board.passable = movement_allowed[tile_type]
+        board.opaque = opaque[tile_type]
+        board.item = np.zeros((board.size, board.size), dtype=np.int32)
+        board.palette = np.full((board.size, board.size), -1, dtype=np.int32)
+        board.items = {}
+        board._next_item_id = 1
+        board.version = next(_versions)
+        board._padded_passable = None
+        return board
+
+    def upscaled(self, scale):
+        """
+        Returns a new board where every cell is repeated in a scale x scale block. Items are not copied.
+        """
+        return Board.from_tile_types(np.kron(self.tile_type, np.ones((scale, scale), dtype=self.tile_type.dtype)))
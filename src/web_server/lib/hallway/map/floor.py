@@ -0,0 +1,326 @@
+"""
+A generated floor of the dungeon in a compact form.
+
+Generating a floor gives a board and a handful of entities, which reference the game. A Floor only holds the result as
+arrays and tuples, so it is cheap to send between processes and can be kept ready before a game needs it. Tiles are
+stored as indexes into the tile prototypes used by the floor instead of tile type ids, which differ between processes.
+
+Floors are cached on disk by size and seed. A floor file is a header, JSON metadata (seed, spawn point, tile prototypes
+by tile class name and attributes, strings and the location of every array) and the packed arrays, aligned so they are read as views of a numpy.memmap:
+
+    magic "HHFL" | version u16 | size u16 | metadata length u32 | metadata | tiles u8 | rubbish, room centers, doors,
+    keys, chests i16
+
+Doors and chests refer to their orientation and loot by index into the strings. Tile classes are only looked up in the
+tiles module. A file which cannot be read is a cache miss, the floor is generated again and the file is overwritten.
+The cache drops the least recently used files when the files take more than MAX_CACHE_BYTES.
+"""
+import json
+import os
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.web_server.lib.hallway.Items import RubbishItem
+from src.web_server.lib.hallway.Utils import Point
+from src.web_server.lib.hallway.entities.entity import Entity
+from src.web_server.lib.hallway.entities.neutral.Chest import Chest
+from src.web_server.lib.hallway.entities.neutral.Door import Door
+from src.web_server.lib.hallway.map.board import Board, TILE_TYPES, tile_type_id
+from src.web_server.lib.hallway.map.generator import Generator
+from src.web_server.lib.hallway.map import tiles
+from src.web_server.lib.hallway.map.tiles import Tile
+
+N_CHESTS = 50
+CHEST_LOOT = ([1], ["teleport"])
+# Minimum Manhattan distance (in steps) between two chests
+CHEST_SPACING = 4
+
+# Increment when the format or the generated floors change, files of older versions are not read.
+VERSION = 4
+MAGIC = b"HHFL"
+HEADER = struct.Struct("<4sHHI")
+ALIGNMENT = 8
+
+CACHE_DIRECTORY = os.path.join("storage", "floors")
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# The tile classes a floor file may name
+TILE_CLASSES = {name: value for name, value in vars(tiles).items()
+                if isinstance(value, type) and issubclass(value, Tile)}
+
+
+class Floor:
+    def __init__(self, size, seed, tile_prototypes: List[Tile], tiles: np.ndarray, rubbish: np.ndarray,
+                 room_centers: List[Tuple[int, int]], spawn_point: Tuple[int, int],
+                 doors: List[Tuple[int, int, str]], keys: List[Tuple[int, int, int]],
+                 chests: List[Tuple[int, int, str]]):
+        """
+        :param tiles: Index into tile_prototypes of every cell.
+        :param rubbish: The cells with a rubbish item, as an (n, 2) array.
+        :param doors: (x, y, orientation) of every door.
+        :param keys: (door index, x, y) of every key, in the order in which they were placed.
+        :param chests: (x, y, loot) of every chest.
+        """
+        self.size = size
+        self.seed = seed
+        self.tile_prototypes = tile_prototypes
+        self.tiles = tiles
+        self.rubbish = rubbish
+        self.room_centers = room_centers
+        self.spawn_point = spawn_point
+        self.doors = doors
+        self.keys = keys
+        self.chests = chests
+
+    def create_board(self) -> Board:
+        type_ids = np.array([tile_type_id(tile) for tile in self.tile_prototypes], dtype=np.uint16)
+        board = Board.from_tile_types(type_ids[self.tiles])
+        for x, y in self.rubbish.tolist():
+            board.set_item(x, y, RubbishItem())
+        return board
+
+    def create_entities(self, game) -> List[Entity]:
+        """
+        :return: The keys, doors and chests of the floor, in the order in which they were generated.
+        """
+        doors = []
+        for x, y, orientation in self.doors:
+            door = Door(game, orientation=orientation)
+            door.position = Point(x, y)
+            doors.append(door)
+
+        keys = []
+        for door_index, x, y in self.keys:
+            key = doors[door_index].get_key()
+            key.position = Point(x, y)
+            keys.append(key)
+
+        chests = []
+        for x, y, loot in self.chests:
+            chest = Chest(game)
+            chest.position = Point(x, y)
+            chest.add_loot(loot)
+            chests.append(chest)
+
+        return keys + doors + chests
+
+    def write(self, path):
+        strings = sorted({orientation for _, _, orientation in self.doors} | {loot for _, _, loot in self.chests})
+        string_ids = {string: i for i, string in enumerate(strings)}
+        arrays = {
+            "tiles": np.asarray(self.tiles, dtype=np.uint8),
+            "rubbish": np.asarray(self.rubbish, dtype=np.int16).reshape(-1, 2),
+            "room_centers": np.array(self.room_centers, dtype=np.int16).reshape(-1, 2),
+            "doors": np.array([(x, y, string_ids[orientation]) for x, y, orientation in self.doors],
+                              dtype=np.int16).reshape(-1, 3),
+            "keys": np.array(self.keys, dtype=np.int16).reshape(-1, 3),
+            "chests": np.array([(x, y, string_ids[loot]) for x, y, loot in self.chests], dtype=np.int16).reshape(-1, 3),
+        }
+
+        sections = {}
+        offset = 0
+        for name, array in arrays.items():
+            sections[name] = [offset, array.dtype.str, list(array.shape)]
+            offset = _align(offset + array.nbytes)
+
+        metadata = json.dumps({
+            "seed": _seed_json(self.seed),
+            "spawn_point": list(self.spawn_point),
+            "tile_prototypes": [[type(tile).__name__, {key: value for key, value in vars(tile).items() if key != "item"}]
+                                for tile in self.tile_prototypes],
+            "strings": strings,
+            "sections": sections,
+        }).encode()
+
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.size, len(metadata)))
+            file.write(metadata)
+            start = _align(HEADER.size + len(metadata))
+            for name, array in arrays.items():
+                file.seek(start + sections[name][0])
+                file.write(array.tobytes())
+
+    @classmethod
+    def read(cls, path) -> "Floor":
+        """
+        Loads a floor file, the arrays are views of a memory map of the file.
+        """
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is not a floor file.")
+        magic, version, size, metadata_length = HEADER.unpack(data[:HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a floor file of version {VERSION}.")
+        metadata = json.loads(data[HEADER.size:HEADER.size + metadata_length].tobytes())
+
+        start = _align(HEADER.size + metadata_length)
+        arrays = {}
+        for name, (offset, dtype, shape) in metadata["sections"].items():
+            dtype = np.dtype(dtype)
+            length = int(np.prod(shape)) * dtype.itemsize
+            arrays[name] = data[start + offset:start + offset + length].view(dtype).reshape(shape)
+
+        tile_prototypes = [_read_tile(name, attributes) for name, attributes in metadata["tile_prototypes"]]
+
+        strings = metadata["strings"]
+        seed = metadata["seed"]
+        return cls(
+            size, tuple(seed) if isinstance(seed, list) else seed,
+            tile_prototypes=tile_prototypes,
+            tiles=arrays["tiles"],
+            rubbish=arrays["rubbish"],
+            room_centers=[(x, y) for x, y in arrays["room_centers"].tolist()],
+            spawn_point=tuple(metadata["spawn_point"]),
+            doors=[(x, y, strings[i]) for x, y, i in arrays["doors"].tolist()],
+            keys=[(door, x, y) for door, x, y in arrays["keys"].tolist()],
+            chests=[(x, y, strings[i]) for x, y, i in arrays["chests"].tolist()],
+        )
+
+
+def _read_tile(name, attributes) -> Tile:
+    """
+    Creates a tile of one of the TILE_CLASSES, only overriding the attributes such a tile has.
+    """
+    tile_class = TILE_CLASSES.get(name)
+    if tile_class is None:
+        raise ValueError(f"Unknown tile class {name}.")
+    tile = tile_class()
+    for key, value in attributes.items():
+        if key not in vars(tile) or key == "item" or not isinstance(value, (str, int, float, bool, type(None))):
+            raise ValueError(f"Invalid attribute {key} of tile {name}.")
+        setattr(tile, key, value)
+    return tile
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _seed_json(seed):
+    return list(seed) if isinstance(seed, tuple) else seed
+
+
+class FloorCache:
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, size, seed) -> Optional[str]:
+        """
+        :return: The file of the floor, None for floors without a seed, which are never cached.
+        """
+        if seed is None:
+            return None
+        seed = "-".join(str(part) for part in seed) if isinstance(seed, tuple) else str(seed)
+        return os.path.join(self.directory, f"{size}_{seed}.v{VERSION}.floor")
+
+    def contains(self, size, seed) -> bool:
+        path = self.path(size, seed)
+        return path is not None and os.path.exists(path)
+
+    def load(self, size, seed) -> Optional[Floor]:
+        path = self.path(size, seed)
+        if path is None or not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        try:
+            floor = Floor.read(path)
+            # The modification time marks the last use, for the eviction.
+            os.utime(path)
+        except Exception as e:
+            # Damaged or outdated, the floor is generated again and replaces the file.
+            print(f"Could not read cached floor {path}: {e!r}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return floor
+
+    def store(self, floor: Floor):
+        path = self.path(floor.size, floor.seed)
+        if path is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name first, other processes may read the file at the same time.
+        temporary = f"{path}.{os.getpid()}.tmp"
+        floor.write(temporary)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache fits in max_bytes.
+        """
+        with self.lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".floor"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    # Still in use (memory mapped files cannot be removed on Windows), try again next time.
+                    pass
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+floor_cache = FloorCache()
+
+
+def generate_floor(size, seed=None, cache: Optional[FloorCache] = floor_cache) -> Floor:
+    """
+    Generates a floor with its keys and chests, the same seed always gives the same floor.
+
+    :param cache: Load the floor from this cache if it was generated before, and store it otherwise.
+    """
+    if cache is not None:
+        floor = cache.load(size, seed)
+        if floor is not None:
+            return floor
+
+    floor = _generate_floor(size, seed)
+    if cache is not None:
+        cache.store(floor)
+    return floor
+
+
+def _generate_floor(size, seed) -> Floor:
+    generator = Generator(size)
+    board, room_centers = generator.generate_board(size, seed)
+    spawn_point = generator.choice(room_centers)
+
+    generator.generate_keys(spawn_point)
+    chests = generator.generate_chests(N_CHESTS, loot_table=CHEST_LOOT, spacing=CHEST_SPACING)
+
+    type_ids, tiles = np.unique(board.tile_type, return_inverse=True)
+    door_indexes = {id(door.get_key()): i for i, door in enumerate(generator.doors) if door.key_gotten}
+    return Floor(
+        size, seed,
+        tile_prototypes=[TILE_TYPES[type_id].prototype for type_id in type_ids],
+        tiles=tiles.reshape(board.tile_type.shape).astype(np.uint8),
+        rubbish=np.argwhere(board.item != 0).astype(np.int16),
+        room_centers=[(center.x, center.y) for center in room_centers],
+        spawn_point=(spawn_point.x, spawn_point.y),
+        doors=[(door.position.x, door.position.y, door.orientation) for door in generator.doors],
+        keys=[(door_indexes[id(key)], key.position.x, key.position.y) for key in generator.entities],
+        chests=[(chest.position.x, chest.position.y, chest.loot[0]) for chest in chests],
+    )
@@ -0,0 +1,136 @@
+"""
+Index of the free cells of a board, to place chests, items and spawned enemies without retrying random positions.
+
+The free cells are kept in a bitmap and in a Fenwick tree over the flattened bitmap, which counts the free cells up to
+every index. Occupying or releasing a cell updates the tree in O(log n), and the r-th free cell is found in O(log n)
+by descending the tree, so a uniformly random free cell is one random rank. Picking k cells is O(k log n), also when the
+board is almost full.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.web_server.lib.hallway.Utils import Point
+
+
+class FreeCells:
+    def __init__(self, cells: np.ndarray, occupied=(), rng: Optional[np.random.Generator] = None):
+        """
+        :param cells: Bitmap of the cells which can be free, e.g. the floor tiles.
+        :param occupied: Positions which are taken already.
+        :param rng: The random generator to sample from.
+        """
+        self.cells = cells.astype(bool)
+        self.free = self.cells.copy()
+        for position in occupied:
+            if self._in_bounds(position.x, position.y):
+                self.free[position.x, position.y] = False
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.count = int(self.free.sum())
+
+        # The tree is built in O(n): every node adds its sum to its parent.
+        n = self.free.size
+        tree = [0] + self.free.ravel().astype(int).tolist()
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+        self._spacing_offsets: Dict[int, List[tuple]] = {}
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, position: Point):
+        return self._in_bounds(position.x, position.y) and bool(self.free[position.x, position.y])
+
+    def _in_bounds(self, x, y):
+        return 0 <= x < self.free.shape[0] and 0 <= y < self.free.shape[1]
+
+    def _set(self, x, y, free: bool):
+        if self.free[x, y] == free:
+            return
+        self.free[x, y] = free
+        delta = 1 if free else -1
+        self.count += delta
+
+        i = x * self.free.shape[1] + y + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _select(self, rank) -> Point:
+        """
+        :return: The free cell with the given rank, counted in flat index order.
+        """
+        index = 0
+        step = self._top
+        while step:
+            if index + step < len(self._tree) and self._tree[index + step] <= rank:
+                index += step
+                rank -= self._tree[index]
+            step >>= 1
+        return Point(*divmod(index, self.free.shape[1]))
+
+    def occupy(self, position: Point):
+        if self._in_bounds(position.x, position.y):
+            self._set(position.x, position.y, False)
+
+    def release(self, position: Point):
+        if self._in_bounds(position.x, position.y) and self.cells[position.x, position.y]:
+            self._set(position.x, position.y, True)
+
+    def choice(self) -> Optional[Point]:
+        """
+        :return: A random free cell, None if there is none.
+        """
+        if self.count == 0:
+            return None
+        return self._select(int(self.rng.integers(self.count)))
+
+    def sample(self, k, spacing=0) -> List[Point]:
+        """
+        Picks distinct random free cells, the cells stay free.
+
+        :param spacing: The cells are at least this far apart (in steps), except when spacing is 0 or 1.
+        :return: k cells, or less if not enough cells are free.
+        """
+        offsets = self._offsets(spacing)
+        excluded = []
+        chosen = []
+        while len(chosen) < k and self.count > 0:
+            position = self._select(int(self.rng.integers(self.count)))
+            chosen.append(position)
+
+            # Exclude the cell, and the cells too close to it, until all cells are picked
+            for dx, dy in offsets:
+                x, y = position.x + dx, position.y + dy
+                if self._in_bounds(x, y) and self.free[x, y]:
+                    self._set(x, y, False)
+                    excluded.append((x, y))
+
+        for x, y in excluded:
+            self._set(x, y, True)
+        return chosen
+
+    def choice_near(self, position: Point, radius) -> Optional[Point]:
+        """
+        :return: A random free cell at most radius away in both directions, None if there is none.
+        """
+        x0, y0 = max(0, position.x - radius), max(0, position.y - radius)
+        cells = np.argwhere(self.free[x0:position.x + radius + 1, y0:position.y + radius + 1])
+        if len(cells) == 0:
+            return None
+        x, y = cells[self.rng.integers(len(cells))]
+        return Point(x0 + int(x), y0 + int(y))
+
+    def _offsets(self, spacing) -> List[tuple]:
+        offsets = self._spacing_offsets.get(spacing)
+        if offsets is None:
+            radius = max(spacing, 1) - 1
+            offsets = self._spacing_offsets[spacing] = [
+                (dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+                if abs(dx) + abs(dy) <= radius
+            ]
+        return offsets
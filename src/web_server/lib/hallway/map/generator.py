@@ -1,12 +1,21 @@
-import copy
-import random
+"""
+Generates the floors of Hallway Hunters.
+
+The layout is generated on a small grid of CELL_ values (rooms, mazes between them, connections with doors) which is
+upscaled by three, after which the walls are tiled from the passable neighbours of every cell. All steps work on
+NumPy arrays and draw from one random generator, so a seed (e.g. the room id and floor number) reproduces a floor.
+"""
 from typing import List, Tuple
 
+import numpy as np
+
 from src.web_server.lib.hallway.Items import RubbishItem
 from src.web_server.lib.hallway.Utils import Point
 from src.web_server.lib.hallway.entities.entity import Entity
 from src.web_server.lib.hallway.entities.neutral.Chest import Chest
 from src.web_server.lib.hallway.entities.neutral.Door import Door
+from src.web_server.lib.hallway.map.board import Board, FLOOR, UNKNOWN, tile_type_id
+from src.web_server.lib.hallway.map.free_cells import FreeCells
 from src.web_server.lib.hallway.map.tiles import *
 
 
@@ -19,29 +28,51 @@ def get_surrounding_points(point: Point, scale):
     ]
 
 
-def flood_fill(base: List[List[Tile]], player_spawn_location: Point, scale=3):
-    rounded_spawn_location: Point = player_spawn_location // 3 * 3
-
-    frontier = [rounded_spawn_location + Point(1, 1)]
-
-    points = []
-    while len(frontier) != 0:
-        current = frontier.pop()
-        points.append(current)
+class ReachableRegion:
+    """
+    Flood fill over the centers of the scale x scale blocks of the board, starting at the block of a position.
 
-        neighbours = get_surrounding_points(current, scale)
-        for neighbour in neighbours:
-            if neighbour in points:
-                continue
+    Door placeholders are part of the region, but the fill does not continue through them. When a door is opened, the
+    fill resumes from the door only, the cells which were reached before are kept.
+    """
 
-            # If this is a door placeholder, we add it to the list of points.
-            # While we cannot search through the door, we add it to be able to search in it more easily
-            if isinstance(base[neighbour.x][neighbour.y], DoorPlaceholder):
-                points.append(neighbour)
-            elif base[neighbour.x][neighbour.y].movement_allowed:
-                frontier.append(neighbour)
+    def __init__(self, board: Board, start: Point, scale=3):
+        self.board = board
+        self.scale = scale
+        # Bitmap over the board of the block centers in the region
+        self.reachable = np.zeros((board.size, board.size), dtype=bool)
+        # The block centers in the order in which they were reached, and the doors among them which are not open yet
+        self.points: List[Point] = []
+        self.closed_doors: List[Point] = []
+
+        self._frontier: List[Point] = []
+        self._add(start // scale * scale + Point(scale // 2, scale // 2))
+
+    def _add(self, point: Point):
+        self.reachable[point.x, point.y] = True
+        self.points.append(point)
+        # We cannot search through a door, but we add it to be able to search from it once it is opened
+        if self.board.tile_type[point.x, point.y] in DOOR_PLACEHOLDERS:
+            self.closed_doors.append(point)
+        else:
+            self._frontier.append(point)
+
+    def expand(self):
+        """
+        Continues the fill until it only borders walls and closed doors.
+        """
+        board = self.board
+        while len(self._frontier) != 0:
+            current = self._frontier.pop()
+            for neighbour in get_surrounding_points(current, self.scale):
+                if not board.in_bounds(neighbour.x, neighbour.y) or self.reachable[neighbour.x, neighbour.y]:
+                    continue
+                if board.passable[neighbour.x, neighbour.y]:
+                    self._add(neighbour)
 
-    return points
+    def open_door(self, door: Point):
+        self.closed_doors.remove(door)
+        self._frontier.append(door)
 
 
 class DoorPlaceholder(Tile):
@@ -60,406 +91,415 @@ class DoorPlaceholder(Tile):
         return "X"
 
 
+VERTICAL_DOOR = tile_type_id(DoorPlaceholder("vertical"))
+HORIZONTAL_DOOR = tile_type_id(DoorPlaceholder("horizontal"))
+DOOR_PLACEHOLDERS = (VERTICAL_DOOR, HORIZONTAL_DOOR)
+
+
+def _tile_type(tile: Tile, image=None) -> int:
+    if image is not None:
+        tile.image = image
+    return tile_type_id(tile)
+
+
+# Cells of the generator grid, before upscaling
+CELL_UNKNOWN = 0
+CELL_FLOOR = 1
+CELL_VERTICAL_DOOR = 2
+CELL_HORIZONTAL_DOOR = 3
+CELL_TYPES = np.array([UNKNOWN, FLOOR, VERTICAL_DOOR, HORIZONTAL_DOOR], dtype=np.uint16)
+
+# Wall tiles, a few of the straight walls have alternative images.
+BOTTOM_WALLS = [
+    (_tile_type(BottomWall()), _tile_type(BottomWall2())),
+    (_tile_type(BottomWall(), "edge_b_alt1"), _tile_type(BottomWall2(), "edge_b_alt1_top")),
+    (_tile_type(BottomWall(), "edge_b_alt2"), _tile_type(BottomWall2(), "edge_b_alt2_top")),
+    (_tile_type(BottomWall(), "edge_b_alt3"), _tile_type(BottomWall2())),
+]
+TOP_WALLS = [_tile_type(TopWall()), _tile_type(TopWall(), "edge_t_alt1")]
+LEFT_WALL = _tile_type(LeftWall())
+RIGHT_WALL = _tile_type(RightWall())
+BOTTOM_LEFT_CORNER = (_tile_type(BottomLeftCornerWall()), _tile_type(BottomLeftCornerWall2()))
+BOTTOM_RIGHT_CORNER = (_tile_type(BottomRightCornerWall()), _tile_type(BottomRightCornerWall2()))
+TOP_LEFT_CORNER = (_tile_type(TopLeftCornerWall2()), _tile_type(TopLeftCornerWall()))
+TOP_RIGHT_CORNER = (_tile_type(TopRightCornerWall2()), _tile_type(TopRightCornerWall()))
+INNER_CORNERS = {
+    "tr": (_tile_type(InnerBottomLeftCornerWall()), _tile_type(InnerBottomLeftCornerWall2())),
+    "br": (_tile_type(InnerTopLeftCornerWall()), _tile_type(InnerTopLeftCornerWall2())),
+    "tl": (_tile_type(InnerBottomRightCornerWall()), _tile_type(InnerBottomRightCornerWall2())),
+    "bl": (_tile_type(InnerTopRightCornerWall()), _tile_type(InnerTopRightCornerWall2())),
+}
+THIN_WALL_VERTICAL = _tile_type(ThinWallTileVertical())
+THIN_WALL_VERTICAL_TOP = (_tile_type(ThinWallTileVerticalConnectorTop2()), _tile_type(ThinWallTileVerticalConnectorTop1()))
+THIN_WALL_VERTICAL_BOTTOM = _tile_type(ThinWallTileVerticalConnectorBottom())
+THIN_WALL_HORIZONTAL = _tile_type(ThinWallTileHorizontal())
+THIN_WALL_HORIZONTAL_LEFT = (_tile_type(ThinWallTileHorizontalConnectorLeft1()),
+                             _tile_type(ThinWallTileHorizontalConnectorLeft2()))
+THIN_WALL_HORIZONTAL_RIGHT = (_tile_type(ThinWallTileHorizontalConnectorRight1()),
+                              _tile_type(ThinWallTileHorizontalConnectorRight2()))
+
+
+def shifted(array: np.ndarray, dx, dy, fill=0) -> np.ndarray:
+    """
+    :return: An array where cell (x, y) holds array[x + dx, y + dy], cells outside of the array are filled in.
+    """
+    size_x, size_y = array.shape
+    result = np.full_like(array, fill)
+    result[max(0, -dx):size_x - max(0, dx), max(0, -dy):size_y - max(0, dy)] = \
+        array[max(0, dx):size_x - max(0, -dx), max(0, dy):size_y - max(0, -dy)]
+    return result
+
+
+def neighbour_mask(passable: np.ndarray, neighbours) -> np.ndarray:
+    """
+    Convolves the passable cells with a kernel of powers of two, bit i of a cell is set when neighbours[i] is passable.
+    """
+    mask = np.zeros(passable.shape, dtype=np.uint8)
+    for bit, (dx, dy) in enumerate(neighbours):
+        mask |= shifted(passable, dx, dy).astype(np.uint8) << bit
+    return mask
+
+
+class DisjointSet:
+    """
+    Union-find over the integers 0 to n - 1.
+    """
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[b] = a
+
+
 class Generator:
     def __init__(self, generator_size):
         self.DOOR_PERCENTAGE = 0.5
         self.generator_size = generator_size
-        self.base: List[List[Tile]] = [[UnknownTile() for _ in range(generator_size)] for _ in range(generator_size)]
+        self.rng = np.random.default_rng()
+        # The grid of CELL_ values which is generated before upscaling
+        self.cells = np.zeros((generator_size, generator_size), dtype=np.int8)
+        self.base = Board(generator_size)
         self.room_centers: List[Point] = []
         self.doors: List[Door] = []
         self.entities: List[Entity] = []
+        # The block centers which can be reached from the spawn, as a list and as a bitmap over the board
         self.valid_3x3_locations: List[Point] = []
+        self.reachable = np.zeros((generator_size, generator_size), dtype=bool)
 
-    def room_generator(self, size, attempts=50):
-        def room_fits(_x, _y, _width, _height):
-            """
-            Check if a room fits if all the squares around it and itself are walls
-            """
-            for i in range(_x - 1, _x + _width + 1):
-                for j in range(_y - 1, _y + _height + 1):
-                    if not isinstance(self.base[i][j], UnknownTile):
-                        return False
-            return True
-
-        def carve_room(_x, _y, _width, _height):
-            """
-            Replace tiles with ground tiles for all in the x, y, width, height range.
-            """
-            for i in range(_x, _x + _width):
-                for j in range(_y, _y + _height):
-                    self.base[i][j] = FloorTile()
-            return True
+    def randint(self, low, high) -> int:
+        """
+        Random integer in [low, high], like random.randint.
+        """
+        return int(self.rng.integers(low, high, endpoint=True))
+
+    def choice(self, options):
+        return options[int(self.rng.integers(len(options)))]
 
+    def room_generator(self, size, attempts=50):
         min_size = 3
         max_size = 7
 
         rooms = []
         for _ in range(attempts):
-            width = random.randint(min_size // 2, max_size // 2) * 2 + 1
-            height = random.randint(min_size // 2, max_size // 2) * 2 + 1
+            width = self.randint(min_size // 2, max_size // 2) * 2 + 1
+            height = self.randint(min_size // 2, max_size // 2) * 2 + 1
 
-            x = random.randint(0, (size - width - 2) // 2) * 2 + 1
-            y = random.randint(0, (size - height - 2) // 2) * 2 + 1
+            x = self.randint(0, (size - width - 2) // 2) * 2 + 1
+            y = self.randint(0, (size - height - 2) // 2) * 2 + 1
 
-            if room_fits(x, y, width, height):
+            # A room fits if all the squares around it and itself are walls
+            if (self.cells[x - 1:x + width + 1, y - 1:y + height + 1] == CELL_UNKNOWN).all():
                 rooms.append(Point(x + width // 2, y + height // 2))
-                carve_room(x, y, width, height)
+                self.cells[x:x + width, y:y + height] = CELL_FLOOR
 
         self.room_centers = rooms
 
     def maze_generator(self):
-        def check_point(_point, _orig_point):
-            # If the left point is not the original point, and it is already ground, it is not valid
-            lp = Point(_point.x - 1, _point.y)
-            if lp != _orig_point and isinstance(self.base[_point.x - 1][_point.y], FloorTile):
-                return False
-            rp = Point(_point.x + 1, _point.y)
-            if rp != _orig_point and isinstance(self.base[_point.x + 1][_point.y], FloorTile):
-                return False
-            tp = Point(_point.x, _point.y - 1)
-            if tp != _orig_point and isinstance(self.base[_point.x][_point.y - 1], FloorTile):
-                return False
-            bp = Point(_point.x, _point.y + 1)
-            if bp != _orig_point and isinstance(self.base[_point.x][_point.y + 1], FloorTile):
-                return False
-            return True
-
-        size = len(self.base)
-        # add all wall cells to a list to process
-        wall_cells = []
-        for x in range(1, size, 2):
-            for y in range(1, size, 2):
-                if not self.base[x][y].movement_allowed:
-                    wall_cells.append(Point(x, y))
+        """
+        Fills the space between the rooms with mazes, carved on the cells with odd coordinates.
+        """
+        cells = self.cells
+        size = len(cells)
+        # All uncarved cells, a cell which was carved by an earlier maze is skipped when it is popped.
+        wall_cells = [(int(x), int(y)) for x, y in np.argwhere(cells[1::2, 1::2] == CELL_UNKNOWN) * 2 + 1]
 
         while len(wall_cells) > 0:
             # Pop an uncarved cell and set it to ground, then branch from this position onward
-            carved_cells = [wall_cells.pop()]
-            self.base[carved_cells[0].x][carved_cells[0].y] = FloorTile()
+            x, y = wall_cells.pop()
+            if cells[x, y] != CELL_UNKNOWN:
+                continue
+            cells[x, y] = CELL_FLOOR
+            carved_cells = [(x, y)]
             while len(carved_cells) > 0:
-                current_cell = carved_cells[random.randint(0, len(carved_cells) - 1)]
-                potential_cells = []
-                x = current_cell.x
-                y = current_cell.y
-                if x - 1 != 0 and isinstance(self.base[x - 2][y], UnknownTile):
-                    potential_cells.append(Point(x - 2, y))
-                if x + 2 != size and isinstance(self.base[x + 2][y], UnknownTile):
-                    potential_cells.append(Point(x + 2, y))
-                if y - 1 != 0 and isinstance(self.base[x][y - 2], UnknownTile):
-                    potential_cells.append(Point(x, y - 2))
-                if y + 2 != size and isinstance(self.base[x][y + 2], UnknownTile):
-                    potential_cells.append(Point(x, y + 2))
+                index = int(self.rng.integers(len(carved_cells)))
+                x, y = carved_cells[index]
+                potential_cells = [
+                    (next_x, next_y) for next_x, next_y in ((x - 2, y), (x + 2, y), (x, y - 2), (x, y + 2))
+                    if 0 < next_x < size and 0 < next_y < size and cells[next_x, next_y] == CELL_UNKNOWN
+                ]
 
                 if len(potential_cells) != 0:
-                    next_cell = potential_cells[random.randint(0, len(potential_cells) - 1)]
-                    # Remove this cell from all available wall cells
-                    wall_cells.remove(next_cell)
-                    self.base[next_cell.x][next_cell.y] = FloorTile()
-                    self.base[(next_cell.x + current_cell.x) // 2][(next_cell.y + current_cell.y) // 2] = FloorTile()
-                    carved_cells.append(next_cell)
+                    next_x, next_y = potential_cells[int(self.rng.integers(len(potential_cells)))]
+                    cells[next_x, next_y] = CELL_FLOOR
+                    cells[(next_x + x) // 2, (next_y + y) // 2] = CELL_FLOOR
+                    carved_cells.append((next_x, next_y))
                 else:
-                    carved_cells.remove(current_cell)
+                    # Swap with the last cell, so removing it does not shift the list
+                    carved_cells[index] = carved_cells[-1]
+                    carved_cells.pop()
 
     def connector_generator(self):
-        size = len(self.base)
-        start = Point(1, 1)
-        region = []
-        tails = [start]
-
+        """
+        Connects the rooms and mazes into one region. Maze cells are grouped into components with a disjoint set, the
+        region starts as the component of the first cell. While other cells are left, connections are made from the
+        region to two random cells next to it, of which only the first joins its component into the region: the
+        second one will be connected again later, which makes loops.
+        """
+        cells = self.cells
+        n = len(cells) // 2
+        sets = DisjointSet(n * n)
+
+        # Cell (i, j) of the maze is at (2i + 1, 2j + 1) of the grid, join cells which are connected already.
+        for i, j in np.argwhere(cells[2:-1:2, 1::2] != CELL_UNKNOWN):
+            sets.union(i * n + j, (i + 1) * n + j)
+        for i, j in np.argwhere(cells[1::2, 2:-1:2] != CELL_UNKNOWN):
+            sets.union(i * n + j, i * n + j + 1)
+
+        # Only the region grows, so the other components never change: the cells of every component are found once.
+        labels = np.array([sets.find(i) for i in range(n * n)])
+        order = np.argsort(labels, kind="stable")
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        components = {int(labels[members[0]]): members for members in np.split(order, boundaries)}
+
+        region = np.zeros((n, n), dtype=bool)
+        region.flat[components[int(labels[0])]] = True
+
+        # Direction to the region, with the door which is placed in between
+        directions = [(-1, 0, CELL_VERTICAL_DOOR), (1, 0, CELL_VERTICAL_DOOR),
+                      (0, 1, CELL_HORIZONTAL_DOOR), (0, -1, CELL_HORIZONTAL_DOOR)]
         while True:
-            # Expand the current region to include all connected tiles
-            while len(tails) > 0:
-                tail = tails.pop()
-                region.append(tail)
-                p = Point(tail.x + 2, tail.y)
-                if self.base[tail.x + 1][tail.y].movement_allowed and p not in region and p not in tails:
-                    tails.append(p)
-                p = Point(tail.x - 2, tail.y)
-                if self.base[tail.x - 1][tail.y].movement_allowed and p not in region and p not in tails:
-                    tails.append(p)
-                p = Point(tail.x, tail.y + 2)
-                if self.base[tail.x][tail.y + 1].movement_allowed and p not in region and p not in tails:
-                    tails.append(p)
-                p = Point(tail.x, tail.y - 2)
-                if self.base[tail.x][tail.y - 1].movement_allowed and p not in region and p not in tails:
-                    tails.append(p)
-
-            # If the current region is large enough to spawn the entire board, stop
-            if len(region) == (len(self.base) // 2) ** 2:
+            # If the region spans the entire board, stop
+            if region.all():
                 return
 
-            # Add random connections to an unknown region
-            edges = set()
-            for segment in region:
-                points = [
-                    Point(segment.x + 2, segment.y),
-                    Point(segment.x - 2, segment.y),
-                    Point(segment.x, segment.y + 2),
-                    Point(segment.x, segment.y - 2)
-                ]
-                for point in points:
-                    if 0 < point.x < size \
-                            and 0 < point.y < size \
-                            and point not in region:
-                        edges.add(point)
-
-            edges = list(edges)
-            # the amount of random connections to make
-            for i in range(min(2, len(edges))):
-                random_door = edges[random.randint(0, len(edges) - 1)]
-                # Removed
-                edges.remove(random_door)
-                if i == 0:
-                    tails.append(random_door)
-                if Point(random_door.x - 2, random_door.y) in region:
-                    if random.random() < self.DOOR_PERCENTAGE:
-                        tile = DoorPlaceholder("vertical")
-                    else:
-                        tile = FloorTile()
-                    self.base[random_door.x - 1][random_door.y] = tile
-                    continue
-                if Point(random_door.x + 2, random_door.y) in region:
-                    if random.random() < self.DOOR_PERCENTAGE:
-                        tile = DoorPlaceholder("vertical")
-                    else:
-                        tile = FloorTile()
-                    self.base[random_door.x + 1][random_door.y] = tile
-                    continue
-                if Point(random_door.x, random_door.y + 2) in region:
-                    if random.random() < self.DOOR_PERCENTAGE:
-                        tile = DoorPlaceholder("horizontal")
-                    else:
-                        tile = FloorTile()
-                    self.base[random_door.x][random_door.y + 1] = tile
-                    continue
-                if Point(random_door.x, random_door.y - 2) in region:
-                    if random.random() < self.DOOR_PERCENTAGE:
-                        tile = DoorPlaceholder("horizontal")
-                    else:
-                        tile = FloorTile()
-                    self.base[random_door.x][random_door.y - 1] = tile
-                    continue
+            edges = np.zeros_like(region)
+            for dx, dy, _ in directions:
+                edges |= shifted(region, dx, dy)
+            edges = np.argwhere(edges & ~region)
+            if len(edges) == 0:
+                return
+
+            # The amount of random connections to make
+            joined = None
+            for k, index in enumerate(self.rng.choice(len(edges), size=min(2, len(edges)), replace=False)):
+                i, j = edges[index]
+                for dx, dy, door in directions:
+                    if not (0 <= i + dx < n and 0 <= j + dy < n and region[i + dx, j + dy]):
+                        continue
+
+                    tile = door if self.rng.random() < self.DOOR_PERCENTAGE else CELL_FLOOR
+                    cells[2 * i + 1 + dx, 2 * j + 1 + dy] = tile
+                    if k == 0:
+                        joined = components[int(labels[i * n + j])]
+                    break
+
+            # Joined after both connections, the second one is chosen next to the region before the join
+            if joined is not None:
+                region.flat[joined] = True
 
     def remove_dead_ends(self):
-        size = len(self.base)
-
-        def is_end(_x, _y):
-            end_count = sum([
-                not self.base[_x][_y - 1].movement_allowed,
-                not self.base[_x][_y + 1].movement_allowed,
-                not self.base[_x - 1][_y].movement_allowed,
-                not self.base[_x + 1][_y].movement_allowed
-            ])
-
-            return end_count == 3
-
-        def get_neighbour(point):
-            if self.base[point.x][point.y - 1].movement_allowed:
-                return Point(point.x, point.y - 2)
-            if self.base[point.x][point.y + 1].movement_allowed:
-                return Point(point.x, point.y + 2)
-            if self.base[point.x - 1][point.y].movement_allowed:
-                return Point(point.x - 2, point.y)
-            if self.base[point.x + 1][point.y].movement_allowed:
-                return Point(point.x + 2, point.y)
-
-        # Find all ends in the maze
-        ends = []
-        for x in range(1, size, 2):
-            for y in range(1, size, 2):
-                if is_end(x, y):
-                    ends.append(Point(x, y))
-
-        # Keep removing hallways until there is no more end
-        for end in ends:
-            while is_end(end.x, end.y):
-                neighbour = get_neighbour(end)
-                self.base[end.x][end.y] = UnknownTile()
-                self.base[(end.x + neighbour.x) // 2][(end.y + neighbour.y) // 2] = UnknownTile()
-                end = neighbour
+        """
+        Removes hallways which lead nowhere, all dead ends are removed at once until none are left.
+        """
+        cells = self.cells
+        maze_cells = np.zeros(cells.shape, dtype=bool)
+        maze_cells[1::2, 1::2] = True
+        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+        while True:
+            passable = cells != CELL_UNKNOWN
+            open_sides = sum(shifted(passable, dx, dy).astype(np.int8) for dx, dy in directions)
+            ends = maze_cells & passable & (open_sides <= 1)
+            if not ends.any():
+                return
+
+            # Remove the end and the hallway leading to it
+            removed = ends.copy()
+            for dx, dy in directions:
+                removed |= shifted(ends, dx, dy)
+            cells[removed] = CELL_UNKNOWN
+
+    def autotile(self, tile_type: np.ndarray, passable: np.ndarray):
+        """
+        Replaces the unknown cells next to passable cells by the matching wall tiles.
+
+        The tile of a cell depends on its passable neighbours. Some walls also set the cell above them (the top of a
+        wall) or below them (corners), these are applied in the order in which the cells were filled in one by one
+        before: column by column from the top, where a cell which was set by the cell above it keeps that tile.
+        """
+        size = len(tile_type)
+        neighbours = neighbour_mask(passable, [(0, 1), (0, -1), (-1, 0), (1, 0), (-1, 1), (-1, -1), (1, 1), (1, -1)])
+        down, up, left, right, bl, tl, br, tr = [(neighbours >> bit & 1).astype(bool) for bit in range(8)]
+
+        cells = np.zeros((size, size), dtype=bool)
+        cells[1:size - 2, 1:size - 2] = tile_type[1:size - 2, 1:size - 2] == UNKNOWN
+
+        # The tile of the cell itself, of the cell above and of the cell below, -1 if it is not set.
+        own = np.full((size, size), -1, dtype=np.int32)
+        above = np.full((size, size), -1, dtype=np.int32)
+        below = np.full((size, size), -1, dtype=np.int32)
+
+        def put(mask, own_tile, above_tile=None, below_tile=None):
+            mask = mask & cells & (own < 0)
+            own[mask] = own_tile[mask] if isinstance(own_tile, np.ndarray) else own_tile
+            if above_tile is not None:
+                above[mask] = above_tile[mask] if isinstance(above_tile, np.ndarray) else above_tile
+            if below_tile is not None:
+                below[mask] = below_tile
+            return mask
+
+        # Alternative images for straight walls
+        chance = self.rng.integers(0, 21, (size, size))
+        bottom_walls = np.array(BOTTOM_WALLS)[np.where((1 <= chance) & (chance <= 3), chance, 0)]
+        top_walls = np.array(TOP_WALLS)[(self.rng.integers(0, 11, (size, size)) == 1).astype(np.intp)]
+
+        put(down & left, *BOTTOM_LEFT_CORNER)
+        put(down & right, *BOTTOM_RIGHT_CORNER)
+        put(down, bottom_walls[..., 0], bottom_walls[..., 1])
+        put(up & left, TOP_LEFT_CORNER[0], below_tile=TOP_LEFT_CORNER[1])
+        put(up & right, TOP_RIGHT_CORNER[0], below_tile=TOP_RIGHT_CORNER[1])
+        put(up, top_walls)
+        put(left, LEFT_WALL)
+        put(right, RIGHT_WALL)
+        # Inner corners, when several apply the first one of bl, tl, br and tr is used.
+        for corner, mask in (("bl", bl), ("tl", tl), ("br", br), ("tr", tr)):
+            put(mask, *INNER_CORNERS[corner])
+
+        # A cell below a corner keeps the corner tile, it is not tiled itself.
+        covered = shifted(below >= 0, 0, -1, fill=False)
+        own[covered] = -1
+        above[covered] = -1
+
+        tile_type[own >= 0] = own[own >= 0]
+        tile_type[covered] = shifted(below, 0, -1)[covered]
+        above = shifted(above, 0, 1, fill=-1)
+        tile_type[above >= 0] = above[above >= 0]
 
     def upscale_nx(self, scale=3):
-        size = len(self.base)
-
-        upscaled_board = []
-        for x in range(size):
-            row = []
-            for y in range(size):
-                tile = self.base[x][y]
-                for _ in range(scale - 1):
-                    row.append(copy.deepcopy(tile))
-                row.append(tile)
-            for _ in range(scale - 1):
-                upscaled_board.append(copy.deepcopy(row))
-            upscaled_board.append(row)
-
-        # Fill in the correct wall tiles
-        for x in range(1, size * scale - 2):
-            for y in range(1, size * scale - 2):
-                if isinstance(upscaled_board[x][y], UnknownTile):
-                    # Add the correct tiles to the board.
-                    down = upscaled_board[x][y + 1].movement_allowed
-                    up = upscaled_board[x][y - 1].movement_allowed
-                    left = upscaled_board[x - 1][y].movement_allowed
-                    right = upscaled_board[x + 1][y].movement_allowed
-
-                    # Add the correct corner and edge tiles
-                    if down:
-                        if left:
-                            upscaled_board[x][y] = BottomLeftCornerWall()
-                            upscaled_board[x][y - 1] = BottomLeftCornerWall2()
-                        elif right:
-                            upscaled_board[x][y] = BottomRightCornerWall()
-                            upscaled_board[x][y - 1] = BottomRightCornerWall2()
-                        else:
-                            upscaled_board[x][y] = BottomWall()
-                            upscaled_board[x][y - 1] = BottomWall2()
-                            chance = random.randint(0, 20)
-                            if chance == 1:
-                                upscaled_board[x][y].image = "edge_b_alt1"
-                                upscaled_board[x][y - 1].image = "edge_b_alt1_top"
-                            if chance == 2:
-                                upscaled_board[x][y].image = "edge_b_alt2"
-                                upscaled_board[x][y - 1].image = "edge_b_alt2_top"
-                            if chance == 3:
-                                upscaled_board[x][y].image = "edge_b_alt3"
-                    elif up:
-                        if left:
-                            upscaled_board[x][y] = TopLeftCornerWall2()
-                            upscaled_board[x][y + 1] = TopLeftCornerWall()
-                        elif right:
-                            upscaled_board[x][y] = TopRightCornerWall2()
-                            upscaled_board[x][y + 1] = TopRightCornerWall()
-                        else:
-                            upscaled_board[x][y] = TopWall()
-                            chance = random.randint(0, 10)
-                            if chance == 1:
-                                upscaled_board[x][y].image = "edge_t_alt1"
-                    elif left:
-                        upscaled_board[x][y] = LeftWall()
-
-                    elif right:
-                        upscaled_board[x][y] = RightWall()
-                    else:
-                        bl = upscaled_board[x - 1][y + 1].movement_allowed
-                        tl = upscaled_board[x - 1][y - 1].movement_allowed
-                        br = upscaled_board[x + 1][y + 1].movement_allowed
-                        tr = upscaled_board[x + 1][y - 1].movement_allowed
-                        if tr:
-                            upscaled_board[x][y] = InnerBottomLeftCornerWall()
-                            upscaled_board[x][y - 1] = InnerBottomLeftCornerWall2()
-                        if br:
-                            upscaled_board[x][y] = InnerTopLeftCornerWall()
-                            upscaled_board[x][y - 1] = InnerTopLeftCornerWall2()
-                        if tl:
-                            upscaled_board[x][y] = InnerBottomRightCornerWall()
-                            upscaled_board[x][y - 1] = InnerBottomRightCornerWall2()
-                        if bl:
-                            upscaled_board[x][y] = InnerTopRightCornerWall()
-                            upscaled_board[x][y - 1] = InnerTopRightCornerWall2()
+        cells = np.kron(self.cells, np.ones((scale, scale), dtype=self.cells.dtype))
+        tile_type = CELL_TYPES[cells]
+        self.autotile(tile_type, cells != CELL_UNKNOWN)
 
         # Add the correct door tiles
-        for x in range(1, size * scale, scale):
-            for y in range(1, size * scale, scale):
-                tile = upscaled_board[x][y]
-                if isinstance(tile, DoorPlaceholder):
-                    if tile.orientation == "vertical":
-                        for y_repl in range(3):
-                            upscaled_board[x - 1][y - 1 + y_repl] = FloorTile()
-                            upscaled_board[x + 1][y - 1 + y_repl] = FloorTile()
-
-                        upscaled_board[x][y - 3] = ThinWallTileVerticalConnectorTop2()
-                        upscaled_board[x][y - 2] = ThinWallTileVerticalConnectorTop1()
-                        upscaled_board[x][y - 1] = ThinWallTileVertical()
-                        upscaled_board[x][y + 1] = ThinWallTileVertical()
-                        upscaled_board[x][y + 2] = ThinWallTileVerticalConnectorBottom()
-                    else:
-                        for x_repl in range(3):
-                            upscaled_board[x - 1 + x_repl][y - 1] = ThinWallTileHorizontal()
-                            upscaled_board[x - 1 + x_repl][y + 1] = FloorTile()
-
-                        upscaled_board[x - 2][y - 1] = ThinWallTileHorizontalConnectorLeft1()
-                        upscaled_board[x - 2][y] = ThinWallTileHorizontalConnectorLeft2()
-                        upscaled_board[x + 2][y - 1] = ThinWallTileHorizontalConnectorRight1()
-                        upscaled_board[x + 2][y] = ThinWallTileHorizontalConnectorRight2()
-
-                        upscaled_board[x - 1][y] = BottomWall()
-                        upscaled_board[x + 1][y] = BottomWall()
-
-                    door = Door(None, orientation=tile.orientation)
-                    door.position = Point(x, y)
-                    self.doors.append(door)
-
-        self.base = upscaled_board
+        for x, y in np.argwhere((self.cells == CELL_VERTICAL_DOOR) | (self.cells == CELL_HORIZONTAL_DOOR)):
+            orientation = "vertical" if self.cells[x, y] == CELL_VERTICAL_DOOR else "horizontal"
+            x, y = int(x) * scale + scale // 2, int(y) * scale + scale // 2
+            if orientation == "vertical":
+                tile_type[x - 1, y - 1:y + 2] = FLOOR
+                tile_type[x + 1, y - 1:y + 2] = FLOOR
+
+                tile_type[x, y - 3], tile_type[x, y - 2] = THIN_WALL_VERTICAL_TOP
+                tile_type[x, y - 1] = THIN_WALL_VERTICAL
+                tile_type[x, y + 1] = THIN_WALL_VERTICAL
+                tile_type[x, y + 2] = THIN_WALL_VERTICAL_BOTTOM
+            else:
+                tile_type[x - 1:x + 2, y - 1] = THIN_WALL_HORIZONTAL
+                tile_type[x - 1:x + 2, y + 1] = FLOOR
+
+                tile_type[x - 2, y - 1], tile_type[x - 2, y] = THIN_WALL_HORIZONTAL_LEFT
+                tile_type[x + 2, y - 1], tile_type[x + 2, y] = THIN_WALL_HORIZONTAL_RIGHT
+
+                tile_type[x - 1, y] = BOTTOM_WALLS[0][0]
+                tile_type[x + 1, y] = BOTTOM_WALLS[0][0]
+
+            door = Door(None, orientation=orientation)
+            door.position = Point(x, y)
+            self.doors.append(door)
+
+        self.base = Board.from_tile_types(tile_type)
         self.room_centers = [center * scale for center in self.room_centers]
 
     def generate_props(self):
-        size = len(self.base)
-
-        for x in range(0, size):
-            for y in range(0, size):
-                if isinstance(self.base[x][y], FloorTile):
-                    chance = random.randint(0, 30)
-                    if chance == 0:
-                        self.base[x][y].item = RubbishItem()
+        rubbish = (self.base.tile_type == FLOOR) & (self.rng.integers(0, 31, self.base.tile_type.shape) == 0)
+        for x, y in np.argwhere(rubbish):
+            self.base.set_item(x, y, RubbishItem())
 
     def generate_keys(self, player_spawn_location: Point):
-        n_prev_valid_locations = -1
-        valid_locations = []
-
-        # Keep looping until we find no more new tiles
-        while len(valid_locations) != n_prev_valid_locations:
-            n_prev_valid_locations = len(valid_locations)
-            valid_locations = flood_fill(self.base, player_spawn_location)
-            location_modifiers = [
-                Point(x, y) for x in range(-1, 2) for y in range(-1, 2)
-            ]
-
-            for door in self.doors:
-                if door.key_gotten:
-                    continue
-                if door.position in valid_locations:
-                    # Get the key for this door, place it in a reachable location
-                    key = door.get_key()
-                    key.position = random.choice(valid_locations) + random.choice(location_modifiers)
-                    self.entities.append(key)
-
-                    # Remove the blocked door so we can continue the floodfill
-                    self.base[door.position.x][door.position.y] = FloorTile()
-
-        self.valid_3x3_locations = valid_locations
-        return self.entities + self.doors
-
-    def generate_chests(self, game, n_chests=50, loot_table: Tuple[List[float], List[str]] = None):
+        """
+        Places the key of every door which can be reached from the spawn, where keys may be placed behind doors whose
+        keys were placed before.
+        """
         location_modifiers = [
             Point(x, y) for x in range(-1, 2) for y in range(-1, 2)
         ]
+        doors = {door.position: door for door in self.doors}
+
+        region = ReachableRegion(self.base, player_spawn_location)
+        region.expand()
+        # Keep looping until no more doors are reached
+        while len(region.closed_doors) != 0:
+            reached_doors = list(region.closed_doors)
+            for position in reached_doors:
+                # Get the key for this door, place it in a reachable location
+                key = doors[position].get_key()
+                key.position = self.choice(region.points) + self.choice(location_modifiers)
+                self.entities.append(key)
+
+            for position in reached_doors:
+                # Remove the blocked door so we can continue the flood fill from there
+                self.base.set_type(position.x, position.y, FLOOR)
+                region.open_door(position)
+            region.expand()
+
+        self.reachable = region.reachable
+        self.valid_3x3_locations = region.points
+        return self.entities + self.doors
+
+    def generate_chests(self, n_chests=50, loot_table: Tuple[List[float], List[str]] = None,
+                        spacing=0) -> List[Chest]:
+        """
+        Places chests on distinct reachable cells, after the keys and doors were generated. The chests have no game yet.
+
+        :param spacing: The minimum distance (in steps) between two chests.
+        """
+        # Reachable cells we can move on, where no keys or doors are placed
+        free_cells = FreeCells(self.reachable & self.base.passable,
+                               occupied=[entity.position for entity in self.entities + self.doors], rng=self.rng)
+        positions = free_cells.sample(n_chests, spacing=spacing)
+        weights = np.array(loot_table[0], dtype=float)
+        loot = self.rng.choice(len(weights), size=len(positions), p=weights / weights.sum())
 
         chests = []
-        for i in range(n_chests):
-            # Generate a position we can move on, and where no entities are placed yet
-            position = random.choice(self.valid_3x3_locations)
-            while (
-                    not self.base[position.x][position.y].movement_allowed or
-                    len(game.get_entities_at(position)) != 0
-            ):
-                position = random.choice(self.valid_3x3_locations)
-
-            chest = Chest(game)
+        for position, loot_index in zip(positions, loot.tolist()):
+            chest = Chest(None)
             chest.position = position
-            loot_name = random.choices(loot_table[1], weights=loot_table[0])[0]
-            chest.add_loot(loot_name)
+            chest.add_loot(loot_table[1][loot_index])
             chests.append(chest)
 
         return chests
 
     def print(self):
-        for row in self.base:
-            for tile in row:
-                print(tile, end="")
+        for x in range(len(self.base)):
+            for y in range(len(self.base)):
+                print(self.base.get_tile(x, y), end="")
             print("\n")
 
-    def generate_board(self, size, room) -> Tuple[List[List[Tile]], List[Point]]:
+    def generate_board(self, size, seed=None) -> Tuple[Board, List[Point]]:
+        """
+        Generates a floor, the same seed always gives the same floor (and keys and chests).
+
+        :param seed: An int or a sequence of ints, like (room id, floor number). Random if not given.
+        """
         scale = 3
         if size % scale != 0:
             raise ValueError("Room size must be a multiple of %d.", scale)
@@ -471,7 +511,8 @@ class Generator:
         self.entities.clear()
         self.room_centers.clear()
 
-        self.base = [[UnknownTile() for _ in range(generator_size)] for _ in range(generator_size)]
+        self.rng = np.random.default_rng(seed)
+        self.cells = np.zeros((generator_size, generator_size), dtype=np.int8)
 
         self.room_generator(generator_size, attempts=30)
         self.maze_generator()
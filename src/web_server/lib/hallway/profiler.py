@@ -0,0 +1,141 @@
+"""
+Per phase timings of the Hallway Hunters tick.
+
+Every game has a TickProfiler. Only one in sample_every ticks is measured, the other ticks only pay for a flag check
+per phase. A measured tick is split into phases with mark(), which records the time since the previous mark, and the
+tick of every entity is added up per entity type. The last WINDOW measurements of every phase are kept, so the
+percentiles follow the current state of the game instead of its whole history.
+
+The line_of_sight phase is the union of the views of all players. The views themselves are cast when a player moves,
+so they are part of the time of the player entity types.
+
+The timings of all rooms, together with the scheduler, cache and floor pool statistics, are collected by metrics().
+"""
+import time
+from collections import defaultdict, deque
+from typing import Dict
+
+from src.web_server.lib.hallway.algorithms import distance_field, field_of_view
+from src.web_server.lib.hallway.floor_pool import floor_pool
+from src.web_server.lib.hallway.map.floor import floor_cache
+from src.web_server.lib.hallway.scheduler import scheduler, TICK_RATE
+
+PHASES = ["entities", "turn", "line_of_sight", "serialization", "emit"]
+SAMPLE_EVERY = 10
+WINDOW = 600
+TICK_BUDGET = 1 / TICK_RATE  # Seconds
+
+
+class RollingTimings:
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, fraction) -> float:
+        """
+        :return: The percentile of the last samples, in milliseconds.
+        """
+        if len(self.samples) == 0:
+            return 0.
+        samples = sorted(self.samples)
+        return 1000 * samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def to_json(self):
+        return {
+            "samples": len(self.samples),
+            "mean_ms": 1000 * sum(self.samples) / len(self.samples) if self.samples else 0.,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": 1000 * max(self.samples) if self.samples else 0.,
+        }
+
+
+class TickProfiler:
+    def __init__(self, sample_every=SAMPLE_EVERY):
+        # Measure one in sample_every ticks, 0 disables profiling.
+        self.sample_every = sample_every
+        self.sampling = False
+        self.ticks = 0
+        self.sampled_ticks = 0
+        self.over_budget = 0
+
+        self.total = RollingTimings()
+        self.phases: Dict[str, RollingTimings] = {phase: RollingTimings() for phase in PHASES}
+        self.entity_types: Dict[str, RollingTimings] = defaultdict(RollingTimings)
+
+        self._tick_start = 0.
+        self._last_mark = 0.
+        self._entity_time: Dict[str, float] = defaultdict(float)
+
+    def start_tick(self):
+        self.ticks += 1
+        self.sampling = self.sample_every > 0 and self.ticks % self.sample_every == 0
+        if self.sampling:
+            self._entity_time.clear()
+            self._tick_start = self._last_mark = time.perf_counter()
+
+    def mark(self, phase: str):
+        """
+        Ends the phase, it took the time since the previous mark (or the start of the tick).
+        """
+        if not self.sampling:
+            return
+        now = time.perf_counter()
+        self.phases[phase].record(now - self._last_mark)
+        self._last_mark = now
+
+    def tick_entity(self, entity):
+        """
+        Ticks the entity, and adds its time to its type when this tick is measured.
+        """
+        if not self.sampling:
+            entity.tick()
+            return
+        start = time.perf_counter()
+        entity.tick()
+        self._entity_time[type(entity).__name__] += time.perf_counter() - start
+
+    def end_tick(self):
+        if not self.sampling:
+            return
+        self.sampling = False
+
+        duration = time.perf_counter() - self._tick_start
+        self.total.record(duration)
+        self.sampled_ticks += 1
+        if duration > TICK_BUDGET:
+            self.over_budget += 1
+        for entity_type, seconds in self._entity_time.items():
+            self.entity_types[entity_type].record(seconds)
+
+    def to_json(self):
+        return {
+            "ticks": self.ticks,
+            "sample_every": self.sample_every,
+            "sampled_ticks": self.sampled_ticks,
+            "over_budget": self.over_budget,
+            "budget_ms": 1000 * TICK_BUDGET,
+            "tick": self.total.to_json(),
+            "phases": {phase: timings.to_json() for phase, timings in self.phases.items()},
+            "entity_types": {entity_type: timings.to_json() for entity_type, timings in self.entity_types.items()},
+        }
+
+
+def metrics(games: dict):
+    """
+    :param games: The running games by room id.
+    :return: The scheduler and cache statistics, and the tick profile of every room.
+    """
+    return {
+        "scheduler": scheduler.stats(),
+        "caches": {
+            "field_of_view": field_of_view.cache_stats(),
+            "distance_field": distance_field.cache_stats(),
+        },
+        "floor_pool": floor_pool.stats(),
+        "floor_cache": floor_cache.stats(),
+        "rooms": {str(room_id): game.profiler.to_json() for room_id, game in games.items()},
+    }
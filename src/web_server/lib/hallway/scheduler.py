@@ -0,0 +1,179 @@
+"""
+Runs the game loop of every active Hallway Hunters game from a single background task.
+
+The scheduler uses a fixed timestep on the monotonic clock: the time since the previous iteration is added to an
+accumulator, and every game ticks once for every full timestep in it, so ticks do not drift when sleeps are late. When
+ticking takes longer than the timestep, at most MAX_CATCH_UP ticks are run per iteration and the remaining time is
+dropped and counted as an overrun, instead of falling further behind.
+
+Tick durations are counted in a histogram, which is reported every REPORT_INTERVAL seconds instead of logging every
+tick.
+"""
+import bisect
+import threading
+import time
+import traceback
+from typing import List
+
+from src.web_server import sio
+
+TICK_RATE = 60
+MAX_CATCH_UP = 5
+REPORT_INTERVAL = 60  # Seconds
+
+
+class TickHistogram:
+    # Upper bounds of the buckets in milliseconds, the last bucket holds everything slower.
+    BUCKETS = [0.5, 1, 2, 4, 8, 16, 32, 64]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0
+        self.max = 0.
+
+    def record(self, seconds):
+        milliseconds = seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS, milliseconds)] += 1
+        self.total += 1
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction) -> float:
+        """
+        :return: The upper bound in milliseconds of the bucket which holds the percentile.
+        """
+        if self.total == 0:
+            return 0.
+
+        seen = 0
+        for bound, count in zip(self.BUCKETS + [self.max], self.counts):
+            seen += count
+            if seen >= fraction * self.total:
+                return min(bound, self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0
+        self.max = 0.
+
+    def to_json(self):
+        return {
+            "buckets_ms": self.BUCKETS,
+            "counts": self.counts,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+        }
+
+
+class GameScheduler:
+    def __init__(self, tick_rate=TICK_RATE):
+        self.s_per_tick = 1 / tick_rate
+        self.games: List = []
+        self.lock = threading.Lock()
+        self.running = False
+
+        # Duration of the tick of a single game
+        self.histogram = TickHistogram()
+        self.ticks = 0
+        # Iterations which could not catch up, and the ticks which were dropped because of it
+        self.overruns = 0
+        self.dropped_ticks = 0
+        self.last_report = time.monotonic()
+
+    def add(self, game):
+        """
+        Starts ticking the game, until it is finished.
+        """
+        with self.lock:
+            if game not in self.games:
+                self.games.append(game)
+            if not self.running:
+                self.running = True
+                sio.start_background_task(self.run)
+
+    def remove(self, game):
+        with self.lock:
+            if game in self.games:
+                self.games.remove(game)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        print("Started game loop")
+        previous = time.monotonic()
+        accumulator = 0.
+        while self.running:
+            now = time.monotonic()
+            accumulator += now - previous
+            previous = now
+
+            steps = 0
+            while accumulator >= self.s_per_tick and steps < MAX_CATCH_UP:
+                self.tick_games()
+                accumulator -= self.s_per_tick
+                steps += 1
+
+            if accumulator >= self.s_per_tick:
+                dropped = int(accumulator / self.s_per_tick)
+                accumulator -= dropped * self.s_per_tick
+                self.overruns += 1
+                self.dropped_ticks += dropped
+
+            if now - self.last_report >= REPORT_INTERVAL:
+                self.report()
+                self.last_report = now
+
+            # The loop stops when there are no games left, adding a game starts it again.
+            with self.lock:
+                if len(self.games) == 0:
+                    self.running = False
+                    break
+
+            # Sleep until the next tick is due
+            sio.sleep(max(0., self.s_per_tick - accumulator - (time.monotonic() - previous)))
+        print("Stopped game loop")
+
+    def tick_games(self):
+        with self.lock:
+            games = list(self.games)
+
+        for game in games:
+            if game.finished:
+                self.remove(game)
+                continue
+
+            start = time.monotonic()
+            try:
+                game.tick()
+            except Exception:
+                # One broken game should not stop the other games.
+                traceback.print_exc()
+            self.histogram.record(time.monotonic() - start)
+        self.ticks += 1
+
+    def stats(self):
+        """
+        :return: The counters since the last report.
+        """
+        return {
+            "games": len(self.games),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "dropped_ticks": self.dropped_ticks,
+            "tick_duration": self.histogram.to_json(),
+        }
+
+    def report(self):
+        if self.histogram.total != 0:
+            print(f"Game loop: {len(self.games)} games, {self.ticks} ticks, "
+                  f"p50 {self.histogram.percentile(0.5):.1f}ms, p99 {self.histogram.percentile(0.99):.1f}ms, "
+                  f"max {self.histogram.max:.1f}ms, {self.overruns} overruns ({self.dropped_ticks} ticks dropped)")
+        self.histogram.reset()
+        self.ticks = 0
+        self.overruns = 0
+        self.dropped_ticks = 0
+
+
+scheduler = GameScheduler()
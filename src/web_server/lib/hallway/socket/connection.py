@@ -2,6 +2,7 @@ from flask import request
 from flask_socketio import join_room
 
 from src.web_server import session_user, sio
+from src.web_server.lib import player_registry
 from src.web_server.lib.hallway.hallway_hunters import HallwayHunters, games
 from src.web_server.lib.user_session import session_user_set
 
@@ -40,15 +41,16 @@ def on_join(data):
 
 @sio.event(namespace="/hallway")
 def disconnect():
-    for room_id, game in games.items():
-        print("Looking for disconnect...")
-        player = game.get_player(socket_id=request.sid)
-        if player:
-            print("Found player!")
-            game.remove_player(player.username)
-
-            game.broadcast("%s left the game." % player.username)
-            sio.emit("leave", player.username, room=room_id, namespace="/hallway")
+    entry = player_registry.lookup_socket(request.sid)
+    if entry is None or entry.namespace != "/hallway" or entry.room_id not in games:
+        return
+
+    player = entry.player
+    game = games[entry.room_id]
+    game.remove_player(player.username)
+
+    game.broadcast("%s left the game." % player.username)
+    sio.emit("leave", player.username, room=entry.room_id, namespace="/hallway")
 
 
 print("SocketIO hallway registered.")
\ No newline at end of file
@@ -5,6 +5,7 @@ from src.web_server.utils import timing
 from src.web_server.lib.hallway.commands import handle_developer_command
 from src.web_server.lib.hallway.exceptions import InvalidAction, InvalidCommand
 from src.web_server.lib.hallway.hallway_hunters import games
+from src.web_server.lib.hallway.profiler import metrics
 from src.web_server.lib.hallway.Utils import Phases
 
 
@@ -40,9 +41,6 @@ def start_game(data):
         return
 
     sio.emit("loading", "Generating game...", room=room_id, namespace="/hallway")
-    if not game.game_loop_thread.is_alive():
-        game.game_loop_thread.start()
-
     game.start()
 
     sio.emit("start", None, room=room_id, namespace="/hallway")
@@ -96,3 +94,19 @@ def message(data):
         else:
 
             sio.emit('chat message', data, room=room_id, include_self=True, namespace="/hallway")
+
+
+@sio.on("profile", namespace="/hallway")
+def get_profile(data):
+    """
+    Debug event, sends the tick timings of the room. The room owner may change how often ticks are measured.
+    """
+    room_id = int(data.get("room"))
+    game = games[room_id]
+
+    sample_every = data.get("sample_every")
+    if sample_every is not None and game.author == session_user():
+        game.profiler.sample_every = max(0, int(sample_every))
+
+    profile = metrics({room_id: game})
+    sio.emit("profile", profile, room=request.sid, namespace="/hallway")
@@ -0,0 +1,96 @@
+"""
+Constant time lookups of the players in a room, and of the room behind a socket.
+
+Every game keeps a RoomPlayers index next to its own player lists, keyed by the user (discord id or username)
+and by socket id. All indexes also maintain the global socket index, which maps a socket id to the namespace,
+room and player it belongs to, so a disconnect does not have to search through every room.
+"""
+from typing import Dict, NamedTuple, Optional
+
+
+class SocketEntry(NamedTuple):
+    namespace: str
+    room_id: int
+    player: object
+
+
+# Socket id -> the room the socket joined.
+sockets: Dict[str, SocketEntry] = {}
+
+
+def bind_socket(socket_id, namespace, room_id, player=None):
+    """
+    Registers which room a socket belongs to. The player may be unknown, e.g. when the game runs in another process.
+    """
+    sockets[socket_id] = SocketEntry(namespace, room_id, player)
+
+
+def unbind_socket(socket_id, player=None) -> Optional[SocketEntry]:
+    """
+    Removes the socket from the global index.
+
+    :param player: Only remove the entry if it belongs to this player, the socket may be bound to a newer player.
+    :return: The removed entry, or None if the socket was not known.
+    """
+    entry = sockets.get(socket_id)
+    if entry is None or (player is not None and entry.player is not player):
+        return None
+    return sockets.pop(socket_id)
+
+
+def lookup_socket(socket_id) -> Optional[SocketEntry]:
+    return sockets.get(socket_id)
+
+
+class RoomPlayers:
+    """
+    The players of a single room, indexed by user key and by socket id. Players need a `socket` attribute.
+    """
+
+    def __init__(self, namespace, room_id):
+        self.namespace = namespace
+        self.room_id = room_id
+        self.by_user = {}
+        self.by_socket = {}
+
+    def add(self, key, player):
+        self.remove(key)
+        self.by_user[key] = player
+        if player.socket is not None:
+            self.by_socket[player.socket] = player
+            bind_socket(player.socket, self.namespace, self.room_id, player)
+
+    def remove(self, key):
+        player = self.by_user.pop(key, None)
+        if player is None:
+            return None
+
+        if self.by_socket.get(player.socket) is player:
+            del self.by_socket[player.socket]
+        unbind_socket(player.socket, player)
+        return player
+
+    def set_socket(self, key, socket_id):
+        """
+        Moves a known player to a new socket, after a reconnect.
+        """
+        player = self.by_user[key]
+        if self.by_socket.get(player.socket) is player:
+            del self.by_socket[player.socket]
+        unbind_socket(player.socket, player)
+
+        player.socket = socket_id
+        self.by_socket[socket_id] = player
+        bind_socket(socket_id, self.namespace, self.room_id, player)
+
+    def get(self, key):
+        return self.by_user.get(key)
+
+    def get_by_socket(self, socket_id):
+        return self.by_socket.get(socket_id)
+
+    def __contains__(self, key):
+        return key in self.by_user
+
+    def __len__(self):
+        return len(self.by_user)
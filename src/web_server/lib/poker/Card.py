@@ -1,4 +1,6 @@
+import random
 from enum import Enum
+from typing import List
 
 
 class CardRanks(Enum):
@@ -30,26 +32,73 @@ class CardColours(Enum):
 
 
 class Card:
+    """
+    An immutable playing card. Do not construct cards directly, all 52 cards are interned in CARDS,
+    use get_card or card_from_index instead.
+    """
+    __slots__ = ("rank", "suit", "index", "rank_value", "suit_value", "bit", "_json")
+
     def __init__(self, rank: CardRanks, suit: CardSuits):
-        self.rank = rank
-        self.suit = suit
+        set_attribute = super().__setattr__
+        set_attribute("rank", rank)
+        set_attribute("suit", suit)
+        set_attribute("rank_value", rank.value)
+        set_attribute("suit_value", suit.value)
+        set_attribute("index", (rank.value - 2) * len(CardSuits) + suit.value)
+        # Rank bit as used by the hand evaluator
+        set_attribute("bit", 1 << (rank.value - 2))
+
+        # TODO: Rename the files to remove this hack
+        json_rank = rank.name.lower()
+        if rank.value < 11:
+            json_rank = rank.value
+        set_attribute("_json", {
+            "rank": json_rank,
+            "suit": suit.name.lower()
+        })
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Cards are immutable.")
 
     def colour(self):
         if self.suit == CardSuits.HEARTS or self.suit == CardSuits.DIAMONDS:
             return CardColours.RED
         return CardColours.BLACK
 
+    def __eq__(self, other):
+        return isinstance(other, Card) and self.index == other.index
+
+    def __hash__(self):
+        return self.index
+
+    def __reduce__(self):
+        return card_from_index, (self.index,)
+
     def __repr__(self):
         return "%s of %s" % (self.rank.name.capitalize(), self.suit.name.capitalize())
 
     __str__ = __repr__
 
     def to_json(self):
-        # TODO: Rename the files to remove this hack
-        rank = self.rank.name.lower()
-        if self.rank.value < 11:
-            rank = self.rank.value
-        return {
-            "rank": rank,
-            "suit": self.suit.name.lower()
-        }
+        return self._json
+
+
+CARDS: List[Card] = sorted((Card(rank, suit) for rank in CardRanks for suit in CardSuits), key=lambda c: c.index)
+
+
+def card_from_index(index: int) -> Card:
+    return CARDS[index]
+
+
+def get_card(rank: CardRanks, suit: CardSuits) -> Card:
+    return CARDS[(rank.value - 2) * len(CardSuits) + suit.value]
+
+
+def new_deck(rng: random.Random = random) -> List[Card]:
+    """
+    Returns all 52 cards in a random order.
+    """
+    indices = list(range(len(CARDS)))
+    # TODO: Use a non-crackable shuffle function instead
+    rng.shuffle(indices)
+    return [CARDS[index] for index in indices]
@@ -0,0 +1,226 @@
+"""
+Monte Carlo win/tie equity estimation for the players at a poker table.
+
+Random runouts of the remaining community cards are drawn from the deck and evaluated in batches with NumPy,
+using the same lookup tables as the scalar evaluator in Evaluator.py.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import List, Optional
+
+import numpy as np
+
+from src.web_server import sio
+from src.web_server.lib.poker import Evaluator
+from src.web_server.lib.poker.Card import Card
+from src.web_server.lib.poker.Evaluator import HandCategory
+
+BATCH_SIZE = 500
+
+POPCOUNT = np.array(Evaluator.POPCOUNT, dtype=np.int64)
+HIGHEST_BIT = np.array(Evaluator.HIGHEST_BIT, dtype=np.int64)
+STRAIGHT_HIGH = np.array(Evaluator.STRAIGHT_HIGH, dtype=np.int64)
+
+# Worker processes for the runouts, set from the POKER_EQUITY_PROCESSES config. 0 simulates in the calling process.
+_processes = 0
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def configure(processes):
+    """
+    Sets the amount of worker processes, the pool is started on first use.
+    """
+    global _processes
+    if processes != _processes:
+        stop()
+    _processes = max(0, int(processes))
+
+
+def stop():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Spawn instead of fork, the workers should not inherit the monkey patched gevent hub of the web process.
+        _pool = ProcessPoolExecutor(max_workers=_processes, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _encode(cards: List[Card]):
+    bits = np.array([card.bit for card in cards], dtype=np.int64)
+    suits = np.array([card.suit_value for card in cards], dtype=np.int64)
+    return bits, suits
+
+
+def _top_ranks(mask, n):
+    ranks = []
+    for _ in range(n):
+        bit = HIGHEST_BIT[mask]
+        ranks.append(np.where(bit >= 0, bit + 2, 0))
+        mask = mask & ~np.where(bit >= 0, 1 << np.maximum(bit, 0), 0)
+    return ranks
+
+
+def _pack(category, ranks):
+    strength = np.int64(category)
+    for rank in (ranks + [0, 0, 0, 0, 0])[:5]:
+        strength = (strength << 4) | rank
+    return strength
+
+
+def _rank_bit(rank):
+    return np.where(rank > 0, 1 << np.maximum(rank - 2, 0), 0)
+
+
+def evaluate_batch(bits, suits):
+    """
+    Vectorized counterpart of Evaluator.evaluate.
+
+    :param bits: (n, cards) array of rank bits, as stored in Card.bit.
+    :param suits: (n, cards) array of suit values.
+    :return: (n,) array of hand strengths.
+    """
+    n = bits.shape[0]
+    seen = np.zeros(n, dtype=np.int64)
+    pairs = np.zeros(n, dtype=np.int64)
+    trips = np.zeros(n, dtype=np.int64)
+    quads = np.zeros(n, dtype=np.int64)
+    suit_masks = np.zeros((n, 4), dtype=np.int64)
+    rows = np.arange(n)
+    for column in range(bits.shape[1]):
+        bit = bits[:, column]
+        quads |= trips & bit
+        trips |= pairs & bit
+        pairs |= seen & bit
+        seen |= bit
+        suit_masks[rows, suits[:, column]] |= bit
+
+    flush = np.where(POPCOUNT[suit_masks] >= 5, suit_masks, 0).max(axis=1)
+
+    straight_flush_high = STRAIGHT_HIGH[flush]
+    straight_high = STRAIGHT_HIGH[seen]
+
+    quad = _top_ranks(quads, 1)[0]
+    trip = _top_ranks(trips, 1)[0]
+    full_house_pair = _top_ranks(pairs & ~_rank_bit(trip), 1)[0]
+    pair_ranks = _top_ranks(pairs, 2)
+
+    conditions = [
+        straight_flush_high == 14,
+        straight_flush_high > 0,
+        quad > 0,
+        (trip > 0) & (full_house_pair > 0),
+        flush > 0,
+        straight_high > 0,
+        trip > 0,
+        pair_ranks[1] > 0,
+        pair_ranks[0] > 0,
+    ]
+    choices = [
+        _pack(HandCategory.ROYAL_FLUSH, [straight_flush_high]),
+        _pack(HandCategory.STRAIGHT_FLUSH, [straight_flush_high]),
+        _pack(HandCategory.FOUR_KIND, [quad] + _top_ranks(seen & ~_rank_bit(quad), 1)),
+        _pack(HandCategory.FULL_HOUSE, [trip, full_house_pair]),
+        _pack(HandCategory.FLUSH, _top_ranks(flush, 5)),
+        _pack(HandCategory.STRAIGHT, [straight_high]),
+        _pack(HandCategory.THREE_KIND, [trip] + _top_ranks(seen & ~_rank_bit(trip), 2)),
+        _pack(HandCategory.TWO_PAIR, pair_ranks + _top_ranks(
+            seen & ~_rank_bit(pair_ranks[0]) & ~_rank_bit(pair_ranks[1]), 1)),
+        _pack(HandCategory.ONE_PAIR, pair_ranks[:1] + _top_ranks(seen & ~_rank_bit(pair_ranks[0]), 3)),
+    ]
+    return np.select(conditions, choices, default=_pack(HandCategory.HIGH_CARD, _top_ranks(seen, 5)))
+
+
+def simulate(hand_bits, hand_suits, board_bits, board_suits, deck_bits, deck_suits, iterations, seed=None):
+    """
+    Runs a number of random runouts and counts the wins and ties of every hand.
+
+    :return: The amount of wins and ties per hand, and the amount of simulated runouts.
+    """
+    rng = np.random.default_rng(seed)
+    n_hands = hand_bits.shape[0]
+    to_draw = 5 - board_bits.shape[0]
+
+    if to_draw == 0:
+        iterations = 1
+        drawn = np.zeros((1, 0), dtype=np.int64)
+    else:
+        # Every row is an independent random permutation of the remaining deck, of which we take the first cards.
+        drawn = rng.random((iterations, deck_bits.shape[0])).argsort(axis=1)[:, :to_draw]
+
+    runout_bits = np.concatenate([np.broadcast_to(board_bits, (iterations, board_bits.shape[0])),
+                                  deck_bits[drawn]], axis=1)
+    runout_suits = np.concatenate([np.broadcast_to(board_suits, (iterations, board_suits.shape[0])),
+                                   deck_suits[drawn]], axis=1)
+
+    strengths = np.empty((n_hands, iterations), dtype=np.int64)
+    for i in range(n_hands):
+        strengths[i] = evaluate_batch(
+            np.concatenate([np.broadcast_to(hand_bits[i], (iterations, hand_bits.shape[1])), runout_bits], axis=1),
+            np.concatenate([np.broadcast_to(hand_suits[i], (iterations, hand_suits.shape[1])), runout_suits], axis=1)
+        )
+
+    best = strengths == strengths.max(axis=0)
+    n_best = best.sum(axis=0)
+    wins = (best & (n_best == 1)).sum(axis=1)
+    ties = (best & (n_best > 1)).sum(axis=1)
+    return wins, ties, iterations
+
+
+def estimate_equity(hands: List[List[Card]], community_cards: List[Card], deck: List[Card],
+                    iterations=2000, time_budget=0.05):
+    """
+    Estimates the chance of every hand to win or tie the pot.
+
+    :param hands: The hands of all players which did not fold.
+    :param community_cards: The community cards dealt so far.
+    :param deck: The remaining cards in the deck.
+    :param iterations: The maximum amount of runouts to simulate.
+    :param time_budget: The maximum amount of seconds to spend. At least one batch is always simulated.
+    :return: A list with a {"win": float, "tie": float} dictionary per hand.
+    """
+    hand_encoded = [_encode(hand) for hand in hands]
+    hand_bits = np.stack([bits for bits, _ in hand_encoded])
+    hand_suits = np.stack([suits for _, suits in hand_encoded])
+    board_bits, board_suits = _encode(community_cards)
+    deck_bits, deck_suits = _encode(deck)
+    args = (hand_bits, hand_suits, board_bits, board_suits, deck_bits, deck_suits)
+
+    wins = np.zeros(len(hands), dtype=np.int64)
+    ties = np.zeros(len(hands), dtype=np.int64)
+    total = 0
+
+    start = time.monotonic()
+    if _processes > 0:
+        batches = [min(BATCH_SIZE, iterations - done) for done in range(0, iterations, BATCH_SIZE)]
+        futures = [_get_pool().submit(simulate, *args, batch) for batch in batches]
+        for future in futures:
+            # Wait for the first batch regardless of the budget, so there is always a result
+            timeout = None if total == 0 else max(0., time_budget - (time.monotonic() - start))
+            try:
+                batch_wins, batch_ties, simulated = future.result(timeout=timeout)
+            except TimeoutError:
+                future.cancel()
+                continue
+            wins += batch_wins
+            ties += batch_ties
+            total += simulated
+    else:
+        while total < iterations:
+            batch_wins, batch_ties, simulated = simulate(*args, min(BATCH_SIZE, iterations - total))
+            wins += batch_wins
+            ties += batch_ties
+            total += simulated
+            if simulated < BATCH_SIZE or time.monotonic() - start > time_budget:
+                break
+
+            # Give the other greenlets a chance to run between batches
+            sio.sleep(0)
+
+    return [{"win": float(win) / total, "tie": float(tie) / total} for win, tie in zip(wins, ties)]
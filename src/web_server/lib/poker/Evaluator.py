@@ -1,141 +1,175 @@
+"""
+Poker hand evaluator based on rank bitmasks.
+
+A hand of up to 7 cards is reduced to a couple of 13 bit integers (one bit per rank), from which a single
+comparable strength integer is computed. A higher strength always means a better hand, equal strengths tie.
+
+The strength is laid out as ``category << 20 | r1 << 16 | r2 << 12 | r3 << 8 | r4 << 4 | r5``, where r1..r5 are
+the ranks (2-14) deciding the hand, in order of importance.
+"""
 from typing import List
 
 from src.web_server.lib.poker.Card import Card
 
-
-def get_ranks(cards):
-    rank_dict = {}
+N_RANKS = 13
+RANK_MASK = (1 << N_RANKS) - 1
+CATEGORY_SHIFT = 20
+
+
+class HandCategory:
+    HIGH_CARD = 0
+    ONE_PAIR = 1
+    TWO_PAIR = 2
+    THREE_KIND = 3
+    STRAIGHT = 4
+    FLUSH = 5
+    FULL_HOUSE = 6
+    FOUR_KIND = 7
+    STRAIGHT_FLUSH = 8
+    ROYAL_FLUSH = 9
+
+
+CATEGORY_NAMES = {
+    HandCategory.HIGH_CARD: "High card",
+    HandCategory.ONE_PAIR: "One pair",
+    HandCategory.TWO_PAIR: "Two pair",
+    HandCategory.THREE_KIND: "Three of a kind",
+    HandCategory.STRAIGHT: "Straight",
+    HandCategory.FLUSH: "Flush",
+    HandCategory.FULL_HOUSE: "Full house",
+    HandCategory.FOUR_KIND: "Four of a kind",
+    HandCategory.STRAIGHT_FLUSH: "Straight flush",
+    HandCategory.ROYAL_FLUSH: "Royal flush",
+}
+
+
+def _build_tables():
+    """
+    Precompute, for every 13 bit rank mask, the amount of set bits, the highest set bit and the highest straight.
+    """
+    popcount = [0] * (1 << N_RANKS)
+    highest_bit = [-1] * (1 << N_RANKS)
+    for mask in range(1, 1 << N_RANKS):
+        popcount[mask] = popcount[mask >> 1] + (mask & 1)
+        highest_bit[mask] = mask.bit_length() - 1
+
+    # Straights from ace high down to six high, the wheel (A-2-3-4-5) is checked last.
+    straights = [(0b11111 << low, low + 6) for low in range(N_RANKS - 5, -1, -1)]
+    straights.append((0b1000000001111, 5))
+
+    straight_high = [0] * (1 << N_RANKS)
+    for mask in range(1 << N_RANKS):
+        for straight, high in straights:
+            if mask & straight == straight:
+                straight_high[mask] = high
+                break
+
+    return popcount, highest_bit, straight_high
+
+
+POPCOUNT, HIGHEST_BIT, STRAIGHT_HIGH = _build_tables()
+
+
+def top_ranks(mask, n):
+    """
+    Returns the n highest ranks (2-14) in the rank mask, padded with zeroes if the mask has fewer bits set.
+    """
+    ranks = []
+    for _ in range(n):
+        bit = HIGHEST_BIT[mask]
+        if bit < 0:
+            ranks.append(0)
+            continue
+        ranks.append(bit + 2)
+        mask &= ~(1 << bit)
+    return ranks
+
+
+def make_strength(category, ranks):
+    strength = category
+    for rank in (ranks + [0, 0, 0, 0, 0])[:5]:
+        strength = (strength << 4) | rank
+    return strength
+
+
+def strength_from_masks(seen, pairs, trips, quads, flush):
+    """
+    Computes the hand strength from rank masks.
+
+    :param seen: Ranks which occur at least once.
+    :param pairs: Ranks which occur at least twice.
+    :param trips: Ranks which occur at least three times.
+    :param quads: Ranks which occur four times.
+    :param flush: Ranks of the flush suit, or 0 if there is no flush.
+    :return: The comparable hand strength.
+    """
+    if flush:
+        high = STRAIGHT_HIGH[flush]
+        if high == 14:
+            return make_strength(HandCategory.ROYAL_FLUSH, [high])
+        if high:
+            return make_strength(HandCategory.STRAIGHT_FLUSH, [high])
+
+    if quads:
+        quad = HIGHEST_BIT[quads]
+        return make_strength(HandCategory.FOUR_KIND, [quad + 2] + top_ranks(seen & ~(1 << quad), 1))
+
+    if trips:
+        trip = HIGHEST_BIT[trips]
+        rest = pairs & ~(1 << trip)
+        if rest:
+            return make_strength(HandCategory.FULL_HOUSE, [trip + 2] + top_ranks(rest, 1))
+
+    if flush:
+        return make_strength(HandCategory.FLUSH, top_ranks(flush, 5))
+
+    high = STRAIGHT_HIGH[seen]
+    if high:
+        return make_strength(HandCategory.STRAIGHT, [high])
+
+    if trips:
+        trip = HIGHEST_BIT[trips]
+        return make_strength(HandCategory.THREE_KIND, [trip + 2] + top_ranks(seen & ~(1 << trip), 2))
+
+    if pairs:
+        pair_ranks = top_ranks(pairs, 2)
+        if pair_ranks[1]:
+            rest = seen & ~(1 << (pair_ranks[0] - 2)) & ~(1 << (pair_ranks[1] - 2))
+            return make_strength(HandCategory.TWO_PAIR, pair_ranks + top_ranks(rest, 1))
+        return make_strength(HandCategory.ONE_PAIR,
+                             pair_ranks[:1] + top_ranks(seen & ~(1 << (pair_ranks[0] - 2)), 3))
+
+    return make_strength(HandCategory.HIGH_CARD, top_ranks(seen, 5))
+
+
+def evaluate(cards: List[Card]):
+    """
+    Evaluates the best 5 card hand out of the given cards.
+
+    :param cards: Up to 7 cards, the players hand and the community cards.
+    :return: The hand strength, higher is better.
+    """
+    seen = pairs = trips = quads = 0
+    suits = [0, 0, 0, 0]
     for card in cards:
-        if card.rank in rank_dict:
-            rank_dict[card.rank].append(card)
-        else:
-            rank_dict[card.rank] = [card]
-    return rank_dict
+        bit = card.bit
+        quads |= trips & bit
+        trips |= pairs & bit
+        pairs |= seen & bit
+        seen |= bit
+        suits[card.suit_value] |= bit
 
+    flush = 0
+    for suit_mask in suits:
+        if POPCOUNT[suit_mask] >= 5:
+            flush = suit_mask
 
-def get_suits(cards):
-    suits_count = {"HEARTS": [],
-                   "DIAMONDS": [],
-                   "SPADES": [],
-                   "CLUBS": []}
+    return strength_from_masks(seen, pairs, trips, quads, flush)
 
-    for card in cards:
-        suits_count[card.suit.name].append(card)
-    return suits_count
-
-
-def royal_flush(cards):
-    suits_count = get_suits(cards)
-    for cards in suits_count.values():
-
-        if len(cards) >= 5:  # Amount of same suit needed for royal flush to be possible
-            royal_flush_cards = []
-            for card in cards:
-                if card.rank.value >= 10:
-                    royal_flush_cards.append(card)
-            if len(royal_flush_cards) == 5:
-                return True, sorted(royal_flush_cards, key=lambda c: c.rank.value, reverse=True)
-    return False, None
-
-
-def straight_flush(cards):
-    suits_count = get_suits(cards)
-    for suit_cards in suits_count.values():
-        if len(suit_cards) >= 5:
-            index = -1  # To get highest possible straight flush go from highest to lowest cards
-            sorted_cards = sorted(suit_cards, key=lambda c: c.rank.value, reverse=False)
-
-            in_row = [sorted_cards[index]]
-            while len(in_row) < 5:
-                try:
-                    if sorted_cards[index].rank.value - 1 == sorted_cards[index - 1].rank.value:
-                        in_row.append(sorted_cards[index - 1])
-                    elif sorted_cards[index].rank.value == sorted_cards[index - 1].rank.value:
-                        index -= 1
-                        continue
-                    else:
-                        in_row = [sorted_cards[index - 1]]
-                    index -= 1
-                except IndexError:
-                    return False, None
-            return True, in_row
-    return False, None
-
-
-def four_kind(cards):
-    rank_dict = get_ranks(cards)
-    for rank, cards in rank_dict.items():
-        sorted_cards = sorted(cards, key=lambda c: c.rank.value, reverse=True)
-        if len(sorted_cards) == 4:
-            return True, sorted_cards[0:4]
-    return False, None
-
-
-def full_house(cards):
-    match, three_kind_cards = three_kind(cards)
-    if not match:
-        return False, None
-    match, one_pair_cards = one_pair([card for card in cards if card not in three_kind_cards])
-    if match:
-        return True, three_kind_cards + one_pair_cards
-    return False, None
-
-
-def flush(cards):
-    suit_dict = get_suits(cards)
-    for suit, cards in suit_dict.items():
-        sorted_cards = sorted(cards, key=lambda c: c.rank.value, reverse=True)
-        if len(sorted_cards) >= 5:
-            return True, sorted_cards[0:5]
-    return False, None
-
-
-def straight(cards):
-    sorted_cards = sorted(cards, key=lambda c: c.rank.value, reverse=False)
-    index = -1
-    in_row = [sorted_cards[index]]
-    while len(in_row) < 5:
-        try:
-            if sorted_cards[index].rank.value - 1 == sorted_cards[index - 1].rank.value:
-                in_row.append(sorted_cards[index - 1])
-            elif sorted_cards[index].rank.value == sorted_cards[index - 1].rank.value:
-                index -= 1
-                continue
-            else:
-                in_row = [sorted_cards[index - 1]]
-            index -= 1
-        except IndexError:
-            return False, None
-    return True, in_row
-
-
-def three_kind(cards):
-    rank_dict = get_ranks(cards)
-    three_kind_cards = None
-    for rank, cards in rank_dict.items():
-        if len(cards) == 3:
-            if three_kind_cards is None:
-                three_kind_cards = cards
-            elif rank.value > three_kind_cards[0].rank.value:
-                three_kind_cards = cards
-    return three_kind_cards is not None, three_kind_cards  # TODO: Refactor this
-
-
-def one_pair(cards):
-    rank_dict = get_ranks(cards)
-    pair = None
-    for rank, cards in rank_dict.items():
-        if len(cards) >= 2:
-            if pair is None:
-                pair = cards
-            elif rank.value > pair[0].rank.value:
-                pair = cards
-    if pair is None:
-        return False, None
-
-    return True, pair[0:2]
-
-
-def highest_card(cards: List[Card]):
-    sorted_cards = sorted(cards, key=lambda c: c.rank.value, reverse=True)
-    return True, [sorted_cards[0]]
+
+def category(strength):
+    return strength >> CATEGORY_SHIFT
+
+
+def category_name(strength):
+    return CATEGORY_NAMES[category(strength)]
@@ -0,0 +1,100 @@
+"""
+Append-only hand history for poker tables.
+
+Every event of a hand is written as one compact JSON line, all events of a hand share the same "hand" number:
+ - start: the deck seed and order, the seated players, the pot left from the previous hand and the settings.
+ - action: an action as passed to PokerTable.round.
+ - phase: a phase transition from PokerTable.start_next_phase.
+ - leave: a player which left the table during the hand, see PokerTable.remove_player.
+ - end: the winners and the balances after the payout.
+
+The history can be replayed headless with poker_replay.py. Recording is off unless POKER_HAND_HISTORY is set in the
+config, every hand adds to the files in HAND_HISTORY_DIRECTORY.
+"""
+import json
+import os
+import pathlib
+
+HAND_HISTORY_DIRECTORY = "storage/hand_history"
+# Set from the POKER_HAND_HISTORY config
+record_hand_history = False
+
+
+def configure(enabled: bool):
+    global record_hand_history
+    record_hand_history = enabled
+
+
+class HandHistoryRecorder:
+    def __init__(self, room_id, directory=HAND_HISTORY_DIRECTORY):
+        pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+        self.path = os.path.join(directory, f"table_{room_id}.jsonl")
+        self.room_id = room_id
+        self.hand = 0
+        self._file = None
+
+    def write(self, event: dict):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        event["hand"] = self.hand
+        self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def start_hand(self, table, seed):
+        self.hand += 1
+        self.write({
+            "type": "start",
+            "room_id": self.room_id,
+            "seed": seed,
+            "deck": [card.index for card in table.deck],
+            "small_blind_index": table.small_blind_index,
+            "pot": table.pot,
+            "settings": table.settings.to_json(),
+            "players": [{
+                "owner_id": player.profile['owner_id'],
+                "owner": player.profile['owner'],
+                "balance": player.chips,
+            } for player in table.player_list],
+        })
+
+    def record_action(self, profile, action, value):
+        self.write({"type": "action", "owner_id": profile['owner_id'], "action": action, "value": value})
+
+    def record_leave(self, profile):
+        self.write({"type": "leave", "owner_id": profile['owner_id']})
+
+    def record_phase(self, phase):
+        self.write({"type": "phase", "phase": phase.name})
+
+    def end_hand(self, table, winning_players):
+        self.write({
+            "type": "end",
+            "winners": [player.profile['owner_id'] for player in winning_players],
+            "balances": {str(player.profile['owner_id']): player.chips for player in table.player_list},
+            "pot": table.pot,
+        })
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_hands(path):
+    """
+    Reads a hand history file, and yields the list of events of every complete hand.
+    """
+    events = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+
+            if event["type"] == "start":
+                events = []
+            events.append(event)
+            if event["type"] == "end" and events[0]["type"] == "start":
+                yield events
+                events = []
@@ -0,0 +1,79 @@
+import json
+import os
+import pathlib
+import uuid
+from typing import Dict, Optional
+
+from src.database.repository import profile_repository
+
+LEDGER_DIRECTORY = "storage/ledger"
+
+
+class ChipLedger:
+    """
+    Keeps track of all balance changes at a poker table during a hand, and writes them to the database in a
+    single transaction when the hand is settled.
+
+    Every change is also appended to a journal file, so a hand interrupted by a crash can be settled on restart. The
+    journal starts with the id of the hand, which is stored in the same transaction as the balances: a journal of a
+    hand which was settled, but not removed yet, is not applied again.
+    """
+
+    def __init__(self, room_id):
+        pathlib.Path(LEDGER_DIRECTORY).mkdir(parents=True, exist_ok=True)
+        self.table = f"table_{room_id}"
+        self.journal_path = os.path.join(LEDGER_DIRECTORY, f"{self.table}.jsonl")
+        self.hand_id: Optional[str] = None
+        self.changes: Dict[int, int] = {}
+
+    def record(self, player, amount: int):
+        """
+        Records a bet (negative amount) or payout (positive amount) and updates the chips of the player at the table.
+        """
+        owner_id = player.profile['owner_id']
+        player.chips += amount
+        self.changes[owner_id] = self.changes.get(owner_id, 0) + amount
+
+        with open(self.journal_path, "a") as f:
+            if self.hand_id is None:
+                self.hand_id = uuid.uuid4().hex
+                f.write(json.dumps({"hand_id": self.hand_id}) + "\n")
+            f.write(json.dumps({"owner_id": owner_id, "amount": amount}) + "\n")
+
+    def settle(self):
+        """
+        Writes all recorded changes to the database in one transaction and clears the journal.
+        """
+        if len(self.changes) != 0:
+            if not profile_repository.settle_hand(self.table, self.hand_id or uuid.uuid4().hex, self.changes):
+                print("Hand %s of %s was settled before, skipping it" % (self.hand_id, self.table))
+        self.changes = {}
+        self.hand_id = None
+        self.clear_journal()
+
+    def recover(self):
+        """
+        Settles the changes left in the journal by a hand which never finished.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may have been cut off while writing it
+                    continue
+                if "hand_id" in entry:
+                    self.hand_id = entry["hand_id"]
+                    continue
+                self.changes[entry["owner_id"]] = self.changes.get(entry["owner_id"], 0) + entry["amount"]
+
+        print("Recovering %d unsettled balance changes of hand %s from %s" % (len(self.changes), self.hand_id,
+                                                                               self.journal_path))
+        self.settle()
+
+    def clear_journal(self):
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
@@ -1,5 +1,4 @@
 from src.database.models import models
-from src.database.repository import profile_repository
 
 
 class Player:
@@ -10,7 +9,9 @@ class Player:
     def __init__(self, profile: models.UserModel, socket, table):
         self.profile = profile
         self.socket = socket
-        self.initial_balance = profile.balance
+        # The chips at the table, the balance of the profile is only changed when the ledger settles a hand.
+        self.chips = profile.balance
+        self.initial_balance = self.chips
 
         from src.web_server.lib.poker.PokerTable import PokerTable
         self.table: PokerTable = table
@@ -37,21 +38,21 @@ class Player:
         """
         to_pay = current_call_value - self.current_call_value
 
-        if self.profile['balance'] <= to_pay:  # all in
-            paid = self.profile['balance']
-            self.profile['balance'] = 0
+        if self.chips <= to_pay:  # all in
+            paid = self.chips
             self.all_in = True
 
             self.table.broadcast("%s went all in." % self.profile['owner'])
             self.table.all_in_list.append(self)
         else:  # not all in
             paid = to_pay
-            self.profile = profile_repository.update_money(self.profile, -to_pay)
-        self.current_call_value = current_call_value
+        self.table.ledger.record(self, -paid)
+        # Keep track of what was actually put in, an all in player may have paid less than the call value.
+        self.current_call_value += paid
         return paid
 
     def payout(self, pot):
-        self.profile = profile_repository.update_money(self.profile, pot)
+        self.table.ledger.record(self, pot)
 
     def export_hand(self):
         if len(self.hand) == 0:
@@ -1,15 +1,34 @@
 class PokerSettingsDefaults:
     SMALL_BLIND_VALUE = 2
     MAX_BUY_IN = 20000
+    EQUITY_ITERATIONS = 2000
+    EQUITY_TIME_BUDGET = 0.05  # Seconds
+
+
+class PokerSettingsLimits:
+    # The equity estimate runs in the table's process, room owners may only lower its budget below these.
+    MAX_EQUITY_ITERATIONS = 20000
+    MAX_EQUITY_TIME_BUDGET = 0.1  # Seconds
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
 
 
 class PokerSettings:
     def __init__(self, settings: dict):
         self.small_blind_value = int(settings.get("small_blind_value", PokerSettingsDefaults.SMALL_BLIND_VALUE))
         self.max_buy_in = int(settings.get("max_buy_in", PokerSettingsDefaults.MAX_BUY_IN))
+        self.equity_iterations = clamp(int(settings.get("equity_iterations", PokerSettingsDefaults.EQUITY_ITERATIONS)),
+                                       0, PokerSettingsLimits.MAX_EQUITY_ITERATIONS)
+        self.equity_time_budget = clamp(float(settings.get("equity_time_budget",
+                                                           PokerSettingsDefaults.EQUITY_TIME_BUDGET)),
+                                        0., PokerSettingsLimits.MAX_EQUITY_TIME_BUDGET)
 
     def to_json(self):
         return {
             "small_blind_value": self.small_blind_value,
-            "max_buy_in": self.max_buy_in
+            "max_buy_in": self.max_buy_in,
+            "equity_iterations": self.equity_iterations,
+            "equity_time_budget": self.equity_time_budget,
         }
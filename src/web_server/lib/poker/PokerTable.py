@@ -2,14 +2,20 @@ from enum import Enum
 
 from src.database.repository import profile_repository
 from src.web_server import sio
-from src.web_server.lib.poker import Evaluator
+from src.web_server.lib.player_registry import RoomPlayers
+from src.web_server.lib.poker import Evaluator, Equity
 from src.web_server.lib.poker.exceptions import PokerException
+from src.web_server.lib.poker import HandHistory
+from src.web_server.lib.poker.HandHistory import HandHistoryRecorder
+from src.web_server.lib.poker.Ledger import ChipLedger
 from src.web_server.lib.poker.Player import Player
-from src.web_server.lib.poker.Card import CardSuits, Card, CardRanks
+from src.web_server.lib.poker.Card import Card, new_deck
 import random
 from typing import Optional, List
 
 from src.web_server.lib.poker.PokerSettings import PokerSettings
+from src.web_server.lib.poker.SidePots import build_pots, settle_pots
+from src.web_server.lib.poker.TableState import diff_state
 
 SMALL_BLIND_CALL_VALUE = 2
 MINIMUM_RAISE = 1
@@ -24,36 +30,18 @@ class Phases(Enum):
     POST_ROUND = 5
 
 
-class HandRanking:
-    ROYAL_FLUSH = 0
-    STRAIGHT_FLUSH = 1
-    FOUR_KIND = 2
-    FULL_HOUSE = 3
-    FLUSH = 4
-    STRAIGHT = 5
-    THREE_KIND = 6
-    ONE_PAIR = 7
-    HIGH_CARD = 8
-
-
-def deck_generator():
-    deck = []
-
-    for suit in [suit for suit in dir(CardSuits) if not suit.startswith("__")]:
-        for rank in [rank for rank in dir(CardRanks) if not rank.startswith("__")]:
-            deck.append(Card(CardRanks[rank], CardSuits[suit]))
-
-    # TODO: Use a non-crackable shuffle function instead
-    random.shuffle(deck)
-    return deck
-
-
 class PokerTable:
     """
     Stores information about the web_server game being played
     """
 
-    def __init__(self, room_id):
+    def __init__(self, room_id, ledger: ChipLedger, history: Optional[HandHistoryRecorder] = None):
+        """
+        Use create() for the tables of rooms, which write to the database and the hand history.
+
+        :param ledger: Keeps the balance changes of a hand, and settles them.
+        :param history: Records every hand, None records nothing.
+        """
         self.room_id = room_id
 
         self.player_list: List[Player] = []
@@ -62,6 +50,9 @@ class PokerTable:
         self.fold_list: List[Player] = []
         self.caller_list: List[Player] = []
 
+        # Players and spectators by owner id and by socket id.
+        self.players = RoomPlayers("/poker", room_id)
+
         self.deck = None
         self.small_blind_index = 0
         self.phase: Phases = Phases.NOT_YET_STARTED
@@ -70,6 +61,12 @@ class PokerTable:
         self.first = True
         self.pot = 0
 
+        # Balance changes are kept in memory and written to the database once per hand.
+        self.ledger = ledger
+
+        # Stream every hand to disk so it can be replayed offline.
+        self.history = history
+
         # Create default settings class.
         self.settings = PokerSettings(settings={})
 
@@ -77,10 +74,29 @@ class PokerTable:
         self.active_player_index = 0
         self.all_in = False
 
-    def initialize_round(self):
+        # The last broadcast shared state, clients receive patches relative to it.
+        self.public_state = {}
+        self.state_version = 0
+
+        # Win chances shown to spectators, cached until the phase changes or a player folds.
+        self.equity = None
+        self.equity_key = None
+
+    @classmethod
+    def create(cls, room_id) -> "PokerTable":
+        """
+        Creates the table of a room, after settling the hand it left unfinished on a crash.
+        """
+        ledger = ChipLedger(room_id)
+        ledger.recover()
+        history = HandHistoryRecorder(room_id) if HandHistory.record_hand_history else None
+        return cls(room_id, ledger, history)
+
+    def initialize_round(self, deck: List[Card] = None):
         """
         Initializes the Poker game, resets the pot to 0
 
+        :param deck: Play with this deck instead of a freshly shuffled one, used to replay recorded hands.
         :return: An error string, or None if no error occurred.
         """
         # Move all spectating players to the table
@@ -88,10 +104,10 @@ class PokerTable:
         self.spectator_list = []
 
         # Get latest balance from server
+        profiles = profile_repository.get_profiles([player.profile['owner_id'] for player in self.player_list])
+        profiles = {profile.discord_id: profile for profile in profiles}
         for player in self.player_list:
-            profile = profile_repository.get_profile(user_id=player.profile['owner_id'])
-            player.profile = profile
-            print("Updating %ss profile" % player.profile['owner'])
+            player.profile = profiles.get(player.profile['owner_id'], player.profile)
 
         # Move all no balance players to spectator list
         for player in self.player_list[:]:
@@ -117,7 +133,10 @@ class PokerTable:
         # Ensure all players start on equal grounds.
         self.set_player_balances()
 
-        self.deck = deck_generator()
+        seed = random.getrandbits(128)
+        self.deck = deck[:] if deck is not None else new_deck(random.Random(seed))
+        if self.history is not None:
+            self.history.start_hand(self, seed)
         self.deal_cards()
 
         self.current_call_value = self.settings.small_blind_value
@@ -130,6 +149,7 @@ class PokerTable:
 
         self.active_player_index = self.small_blind_index
         self.community_cards: List[Card] = []
+        self.equity_key = None
 
         self.start_next_phase()
 
@@ -141,68 +161,52 @@ class PokerTable:
         self.caller_list = [player for player in self.player_list if player not in self.fold_list]
 
         # The game actually finished after all phases
-        if len(self.fold_list) != len(self.player_list) - 1:
-            hand_scores = {}
-            for player in self.caller_list:
-                hand_scores[player] = self.evaluate_hand(player.hand)
-
-            winning_players = [self.caller_list[0]]
-            for player in self.caller_list[1:]:
-                equal = True
-                for (_, tier1), (_, tier2) in zip(hand_scores[player], hand_scores[winning_players[0]]):
-                    if tier1 < tier2:
-                        winning_players = [player]
-                        equal = False
-                        break
-                    if tier1 > tier2:
-                        equal = False
-                        break
-
-                if equal:
-                    for (card1, _), (card2, _) in zip(hand_scores[player], hand_scores[winning_players[0]]):
-                        if card1.rank.value > card2.rank.value:
-                            winning_players = [player]
-                            equal = False
-                            break
-                        if card1.rank.value < card2.rank.value:
-                            equal = False
-                            break
-                    if equal:
-                        winning_players.append(player)
+        showdown = len(self.fold_list) != len(self.player_list) - 1
+        if showdown:
+            strengths = {player: self.evaluate_hand(player.hand) for player in self.caller_list}
         else:
-            winning_players = [self.caller_list[0]]
+            strengths = {self.caller_list[0]: 0}
 
-        shared_pot = self.payout_pot(len(winning_players))
-
-        self.broadcast("%s won." % ",".join([player.profile['owner'] for player in winning_players]))
+        payouts = self.payout_pots(strengths)
+        winning_players = [player for player in self.caller_list if payouts.get(player, 0) > 0]
 
         # Payout the game
         for player in winning_players:
-            player.payout(shared_pot)
+            player.payout(payouts[player])
+            if showdown:
+                self.broadcast("%s won %d with %s." % (player.profile['owner'], payouts[player],
+                                                       Evaluator.category_name(strengths[player]).lower()))
+            else:
+                self.broadcast("%s won %d." % (player.profile['owner'], payouts[player]))
+
+        # Write all balance changes of this hand to the database at once
+        self.ledger.settle()
+
+        if self.history is not None:
+            self.history.end_hand(self, winning_players)
 
         self.phase = Phases.NOT_YET_STARTED
 
         self.update_players()
 
-    def get_player(self, profile: dict = None, spectator=False, socket_id=None):
-        combined_list = self.player_list[:]
-        if spectator:
-            combined_list.extend(self.spectator_list)
-
+    def get_player(self, profile=None, spectator=False, socket_id=None):
         if profile is not None:
-            for player in combined_list:
-                if player.profile['owner_id'] == profile['owner_id']:
-                    return player
-            return None
+            # Players are registered by discord id, see add_player
+            player = self.players.get(profile.discord_id)
         elif socket_id is not None:
-            for player in combined_list:
-                if player.socket == socket_id:
-                    return player
+            player = self.players.get_by_socket(socket_id)
+        else:
+            return None
+
+        if player is not None and not spectator and player in self.spectator_list:
             return None
+        return player
 
     def start_next_phase(self):
         self.phase = Phases(self.phase.value + 1)
         self.broadcast("Starting phase " + self.phase.name.capitalize().replace("_", " "))
+        if self.history is not None:
+            self.history.record_phase(self.phase)
 
         if self.phase == Phases.PRE_FLOP:
             self.first = True
@@ -223,6 +227,9 @@ class PokerTable:
             self.start_next_phase()
 
     def round(self, profile: dict, action: str, value: int = 0):
+        if self.history is not None:
+            self.history.record_action(profile, action, value)
+
         if self.phase == Phases.NOT_YET_STARTED or self.phase == Phases.POST_ROUND:
             return "The next round has not yet started."
 
@@ -304,13 +311,13 @@ class PokerTable:
             return None
 
     def add_player(self, profile, socket_id):
-        for player in self.player_list + self.spectator_list:
-            if player.profile.discord_id == profile.discord_id:
-                # If the user is already in the list, overwrite the socket id to the newest one.
-                player.socket = socket_id
-                return
+        if profile.discord_id in self.players:
+            # If the user is already in the list, overwrite the socket id to the newest one.
+            self.players.set_socket(profile.discord_id, socket_id)
+            return
 
         player = Player(profile, socket_id, self)
+        self.players.add(profile.discord_id, player)
         if self.phase == Phases.NOT_YET_STARTED and len(self.player_list) < 8:
             # Store database profile to player list
             self.player_list.append(player)
@@ -336,8 +343,16 @@ class PokerTable:
         self.start_next_phase()
 
     def export_state(self, player: Player):
+        """
+        The full table state for a single player, used when a client joins or has to resync.
+        The shared part is the last broadcast state, so that the next patch applies cleanly on top of it.
+        """
+        state = dict(self.public_state) if self.public_state else self.export_public_state()
+        state.update(self.export_private_state(player))
+        return state
+
+    def export_public_state(self):
         return {
-            "you": player.profile['owner'],
             "small_blind": self.get_small_blind().profile['owner'],
             "current_call_value": self.current_call_value,
             "pot": self.pot,
@@ -348,47 +363,49 @@ class PokerTable:
             "fold_list": [player.profile['owner'] for player in self.fold_list],
             "caller_list": [player.profile['owner'] for player in self.caller_list],
             "spectator_list": [player.profile['owner'] for player in self.spectator_list],
-            "hand": player.export_hand(),
             "players": self.export_player_game_data(),
-            "balance": player.profile['balance'],
-            "to_call": (self.current_call_value - player.current_call_value),
             "started": self.phase != Phases.NOT_YET_STARTED,
             "settings": self.settings.to_json(),
         }
 
+    def export_private_state(self, player: Player):
+        return {
+            "version": self.state_version,
+            "you": player.profile['owner'],
+            "hand": player.export_hand(),
+            "balance": player.chips,
+            "to_call": (self.current_call_value - player.current_call_value),
+            "equity": self.get_equity() if player in self.spectator_list else None,
+        }
+
+    def get_equity(self):
+        """
+        Estimates the win and tie chances of every player which has not folded yet.
+        The estimate is computed once per phase (or fold) and shared between all spectators.
+
+        :return: A list of equity dictionaries, or None if there is no round in progress.
+        """
+        if self.phase in (Phases.NOT_YET_STARTED, Phases.POST_ROUND) or self.settings.equity_iterations <= 0:
+            return None
+
+        key = (self.phase, len(self.fold_list))
+        if self.equity_key != key:
+            contenders = [player for player in self.player_list if player not in self.fold_list]
+            chances = Equity.estimate_equity([player.hand for player in contenders], self.community_cards, self.deck,
+                                             iterations=self.settings.equity_iterations,
+                                             time_budget=self.settings.equity_time_budget)
+            self.equity = [{"name": player.profile['owner'], **chance} for player, chance in zip(contenders, chances)]
+            self.equity_key = key
+        return self.equity
+
     def evaluate_hand(self, hand: List[Card]):
-        all_cards = hand + self.community_cards
-
-        best_cards = []
-
-        evaluators = [
-            Evaluator.royal_flush,
-            Evaluator.straight_flush,
-            Evaluator.four_kind,
-            Evaluator.full_house,
-            Evaluator.flush,
-            Evaluator.straight,
-            Evaluator.three_kind,
-            Evaluator.one_pair,
-            Evaluator.highest_card
-        ]
-
-        highest_evaluator = 0
-        while len(best_cards) < 5:
-            for highest_evaluator in range(highest_evaluator, len(evaluators)):
-                match, cards = evaluators[highest_evaluator](all_cards)
-                if match:
-                    # Remove all matches from all cards list
-                    all_cards = [card for card in all_cards if card not in cards]
-
-                    # Add evaluator rank to card
-                    result = list(zip(cards, len(cards) * [highest_evaluator]))
-                    best_cards.extend(result)
-                    if len(best_cards) == 4:  # In case four of a kind with pair
-                        highest_evaluator = 8
-                    break
-
-        return best_cards[0:5]
+        """
+        Computes the strength of the best hand which can be made from the hand and the community cards.
+
+        :param hand: The cards of a player.
+        :return: A strength integer, the higher strength wins and equal strengths split the pot.
+        """
+        return Evaluator.evaluate(hand + self.community_cards)
 
     def action_fold(self, player: Player):
         """
@@ -410,15 +427,36 @@ class PokerTable:
         self.caller_list.append(player)
         self.broadcast("%s called %d." % (player.profile['owner'], value))
 
-    def payout_pot(self, shares=1):
-        payout_pot = int(self.pot / shares)
-        leftover = self.pot - (payout_pot * shares)
-        self.pot = leftover
-        return payout_pot
+    def payout_pots(self, strengths):
+        """
+        Splits the pot into a main pot and side pots based on what every player put in, and settles them.
+        Chips which cannot be split evenly stay in the pot for the next round.
+
+        :param strengths: The hand strength of every player which did not fold.
+        :return: The amount won by every player.
+        """
+        contributions = {player: player.current_call_value for player in self.player_list}
+        # Chips left over from the previous round, or put in by players who left the table
+        extra = self.pot - sum(contributions.values())
+
+        pots = build_pots(contributions, list(strengths.keys()), extra)
+        payouts, self.pot = settle_pots(pots, strengths)
+        return payouts
 
     def update_players(self):
+        """
+        Broadcasts the changes of the shared state once to the whole room as a versioned patch,
+        followed by the small private state of every player.
+        """
+        public_state = self.export_public_state()
+        patch = diff_state(self.public_state, public_state)
+        self.public_state = public_state
+        self.state_version += 1
+
+        sio.emit("table_patch", {"version": self.state_version, "patch": patch}, room=self.room_id,
+                 namespace="/poker")
         for player in self.player_list + self.spectator_list:
-            sio.emit("table_state", self.export_state(player), room=player.socket, namespace="/poker")
+            sio.emit("table_private", self.export_private_state(player), room=player.socket, namespace="/poker")
 
     def export_player_game_data(self):
         data = []
@@ -440,7 +478,7 @@ class PokerTable:
                 "active": self.get_current_player() == other,
                 "name": other.profile['owner'],
                 "state": state,
-                "balance": other.profile['balance'],
+                "balance": other.chips,
                 "hand": hand,
                 "ready": other.ready,
             })
@@ -451,14 +489,20 @@ class PokerTable:
         for player in self.player_list:
             player.leave()
 
+        if self.history is not None:
+            self.history.close()
+
     def check_readies(self):
         for player in self.player_list:
             if not player.ready:
                 return False
         return True
 
-    def remove_player(self, profile: dict):
-        player = self.get_player(profile, spectator=True)
+    def remove_player(self, profile):
+        player = self.players.remove(profile.discord_id)
+        if player is not None and self.history is not None and self.phase != Phases.NOT_YET_STARTED:
+            # The hand goes on without the player, replays have to remove the player at the same moment.
+            self.history.record_leave(profile)
 
         lists = [self.player_list, self.spectator_list, self.all_in_list, self.fold_list, self.caller_list]
         # Cleanup player from all lists
@@ -468,5 +512,4 @@ class PokerTable:
 
     def set_player_balances(self):
         for player in self.player_list:
-            player.initial_balance = player.profile['balance'] = min(player.profile['balance'],
-                                                                     self.settings.max_buy_in)
+            player.initial_balance = player.chips = min(player.profile['balance'], self.settings.max_buy_in)
@@ -0,0 +1,80 @@
+"""
+Splits the chips of a hand into a main pot and side pots, and settles them.
+
+Every player can only win from each other player as much as they contributed themselves. Sorting the
+contributions once gives the layers: between two consecutive contribution levels, every player who reached the
+upper level puts in the same amount, and only the players which did not fold out of those are eligible to win it.
+"""
+from typing import Dict, List, Tuple
+
+
+class Pot:
+    def __init__(self, amount: int, eligible: list):
+        self.amount = amount
+        self.eligible = eligible
+
+    def __repr__(self):
+        return "Pot(%d, %s)" % (self.amount, self.eligible)
+
+
+def build_pots(contributions: Dict[object, int], contenders: list, extra: int = 0) -> List[Pot]:
+    """
+    Builds the pots from the contribution of every player.
+
+    :param contributions: The amount every player put in this hand, including players which folded.
+    :param contenders: The players which did not fold, only they can win a pot.
+    :param extra: Chips without owner (e.g. left over from the previous hand), added to the main pot.
+    :return: The main pot followed by the side pots. Pots have at least one eligible player.
+    """
+    contender_set = set(contenders)
+    ordered = sorted(contributions.items(), key=lambda item: item[1])
+
+    pots: List[Pot] = []
+    previous_level = 0
+    unclaimed = 0
+    for i, (_, level) in enumerate(ordered):
+        if level == previous_level:
+            continue
+
+        # Everybody from this player onward contributed at least this level.
+        amount = (level - previous_level) * (len(ordered) - i)
+        eligible = [player for player, _ in ordered[i:] if player in contender_set]
+        previous_level = level
+
+        if len(eligible) == 0:
+            # Only folded players reached this level, the chips go to the highest pot.
+            unclaimed += amount
+        elif len(pots) != 0 and pots[-1].eligible == eligible:
+            pots[-1].amount += amount
+        else:
+            pots.append(Pot(amount, eligible))
+
+    if len(pots) == 0:
+        # No contender put anything in, they still win the chips of the players which folded.
+        amount = extra + unclaimed
+        return [Pot(amount, list(contenders))] if amount and contenders else []
+
+    pots[0].amount += extra
+    pots[-1].amount += unclaimed
+    return pots
+
+
+def settle_pots(pots: List[Pot], strengths: Dict[object, int]) -> Tuple[Dict[object, int], int]:
+    """
+    Pays every pot out to the strongest eligible hands, splitting it evenly between ties.
+
+    :param pots: The pots as built by build_pots.
+    :param strengths: The hand strength per contender.
+    :return: The payout per player, and the chips which could not be divided evenly.
+    """
+    payouts = {}
+    leftover = 0
+    for pot in pots:
+        best = max(strengths[player] for player in pot.eligible)
+        winners = [player for player in pot.eligible if strengths[player] == best]
+
+        share = pot.amount // len(winners)
+        leftover += pot.amount - share * len(winners)
+        for winner in winners:
+            payouts[winner] = payouts.get(winner, 0) + share
+    return payouts, leftover
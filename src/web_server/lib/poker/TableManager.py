@@ -0,0 +1,226 @@
+"""
+Routes poker events to the process which owns the table of a room.
+
+The socket handlers in poker_socket.py only deal with the socket session (joining the socket.io room, looking up the
+session user), and then dispatch the event with the room id through the table manager:
+ - LocalTableManager runs the tables inside the web process, as before.
+ - ShardedTableManager starts a number of worker processes, every room id is always handled by the same worker.
+   The workers emit through the socket.io message queue (SOCKETIO_MESSAGE_QUEUE), so the web process delivers the
+   messages to the clients. A slow showdown on one table then only delays the tables of the same worker.
+
+The event handlers below run in the process which owns the table, they do not have a request or session context.
+"""
+import multiprocessing
+import traceback
+from typing import Dict
+
+from src.database.repository import profile_repository
+from src.database.repository import room_repository
+from src.web_server import sio
+from src.web_server.lib.poker.exceptions import PokerException
+from src.web_server.lib.poker.PokerSettings import PokerSettings
+from src.web_server.lib.poker.PokerTable import PokerTable, Phases
+
+# The tables owned by this process.
+tables: Dict[int, PokerTable] = {}
+
+
+def handle_join(room_id, data, socket_id, user):
+    if room_id not in tables:
+        tables[room_id] = PokerTable.create(room_id)
+
+    profile_repository.get_profile(user=user)
+
+    table = tables[room_id]
+    table.add_player(user, socket_id)
+
+    sio.emit("join", user.discord_username, room=room_id, namespace="/poker")
+    table.update_players()
+
+
+def handle_leave(room_id, data, socket_id, user):
+    table = tables.get(room_id, None)
+    if table is None:
+        return
+
+    player = table.get_player(socket_id=socket_id)
+    if player:
+        table.remove_player(player.profile)
+
+        table.broadcast("%s left the table." % player.profile.discord_username)
+        sio.emit("leave", player.profile.discord_username, room=room_id, namespace="/poker")
+
+
+def handle_change_settings(room_id, data, socket_id, user):
+    room = room_repository.get_room(room_id)
+    table = tables[room_id]
+
+    # Only the owner may change room settings
+    if room.author_id != user.discord_id:
+        return sio.emit("message", "You may not change the room settings.", room=socket_id, namespace="/poker")
+
+    table.settings = PokerSettings(data.get("settings", {}))
+    table.update_players()
+
+
+def handle_start(room_id, data, socket_id, user):
+    room = room_repository.get_room(room_id)
+
+    table = tables[room_id]
+    player = table.get_player(user)
+
+    # All normal players toggle their ready state
+    player.ready = not player.ready
+
+    # Only the owner may start the game
+    if room.author_id != user.discord_id:
+        table.update_players()
+        return
+
+    # Room owner is always true
+    player.ready = True
+    if not table.check_readies():
+        sio.emit("message", "The room owner wants to start. Ready up!", room=room_id, namespace="/poker")
+        return
+
+    try:
+        if table.phase != Phases.NOT_YET_STARTED:
+            return
+        table.initialize_round()
+        table.update_players()
+
+        # Assume everybody is ready, maybe implement ready check later
+        sio.emit("start", None, room=room_id, namespace="/poker")
+    except PokerException as e:
+        sio.emit("message", e.message, room=player.socket, namespace="/poker")
+
+
+def handle_action(room_id, data, socket_id, user):
+    table = tables[room_id]
+
+    player = table.get_player(user)
+    if player is None:
+        return sio.emit("message", "You are currently spectating.", room=socket_id, namespace="/poker")
+
+    response = table.round(user, data.get("action"), int(data.get("value", 0)))
+
+    if response is not None:
+        sio.emit("message", response, room=player.socket, namespace="/poker")
+
+    table.update_players()
+
+
+def handle_table_state(room_id, data, socket_id, user):
+    table = tables.get(room_id, None)
+    if table is None:
+        return
+
+    player = table.get_player(user, spectator=True)
+    if not player:
+        return
+    sio.emit("table_state", table.export_state(player), room=player.socket, namespace="/poker")
+
+
+HANDLERS = {
+    "join": handle_join,
+    "leave": handle_leave,
+    "change settings": handle_change_settings,
+    "start": handle_start,
+    "action": handle_action,
+    "table_state": handle_table_state,
+}
+
+
+def handle_event(event, room_id, data, socket_id, user):
+    HANDLERS[event](room_id, data, socket_id, user)
+
+
+def cleanup_tables():
+    for table in tables.values():
+        table.cleanup()
+
+
+class LocalTableManager:
+    """
+    Runs every table in the web process.
+    """
+
+    def dispatch(self, event, room_id, data, socket_id, user):
+        handle_event(event, room_id, data, socket_id, user)
+
+    def stop(self):
+        cleanup_tables()
+
+
+def run_worker(queue, config_name):
+    """
+    Entry point of a table worker process, handles the events of its rooms until it receives None.
+    """
+    from src.web_server import create_app
+    app = create_app(config_name, start_bot=False)
+
+    while True:
+        message = queue.get()
+        if message is None:
+            break
+
+        # Every event gets a fresh application context, like a socket event in the web process.
+        with app.app_context():
+            try:
+                handle_event(*message)
+            except Exception:
+                traceback.print_exc()
+
+    with app.app_context():
+        cleanup_tables()
+
+
+class ShardedTableManager:
+    """
+    Spreads the tables over worker processes by room id.
+    """
+
+    def __init__(self, n_workers, config_name=None):
+        # Spawn instead of fork, the workers should not inherit the monkey patched gevent hub of the web process.
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue() for _ in range(n_workers)]
+        self.workers = [
+            context.Process(target=run_worker, args=(queue, config_name), name=f"poker-worker-{i}", daemon=True)
+            for i, queue in enumerate(self.queues)
+        ]
+        for worker in self.workers:
+            worker.start()
+        print(f"Started {n_workers} poker table workers")
+
+    def worker_index(self, room_id):
+        return room_id % len(self.queues)
+
+    def dispatch(self, event, room_id, data, socket_id, user):
+        self.queues[self.worker_index(room_id)].put((event, room_id, data, socket_id, user))
+
+    def stop(self):
+        for queue in self.queues:
+            queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+
+
+table_manager = LocalTableManager()
+
+
+def init_table_manager(app, config_name=None):
+    """
+    Chooses the table manager from the POKER_WORKERS setting, 0 keeps the tables in the web process.
+    """
+    global table_manager
+
+    n_workers = app.config.get("POKER_WORKERS", 0)
+    if n_workers <= 0:
+        table_manager = LocalTableManager()
+        return table_manager
+
+    if not app.config.get("SOCKETIO_MESSAGE_QUEUE"):
+        raise ValueError("POKER_WORKERS requires SOCKETIO_MESSAGE_QUEUE, the workers emit through the message queue.")
+
+    table_manager = ShardedTableManager(n_workers, config_name)
+    return table_manager
@@ -0,0 +1,36 @@
+"""
+Helpers to send table state as small patches instead of the full state after every action.
+
+A patch has three optional sections:
+ - "set": top level fields which were replaced entirely.
+ - "append": list fields which only had items appended, with just the new items.
+ - "items": list fields of equal length, with only the changed items by index.
+"""
+
+
+def diff_state(old: dict, new: dict) -> dict:
+    """
+    Computes the patch which turns the old state into the new state.
+
+    :param old: The previously sent state.
+    :param new: The current state.
+    :return: A patch dictionary, empty if nothing changed.
+    """
+    patch = {}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+
+        previous = old.get(key)
+        if isinstance(value, list) and isinstance(previous, list):
+            if len(previous) < len(value) and value[:len(previous)] == previous:
+                patch.setdefault("append", {})[key] = value[len(previous):]
+                continue
+            if len(previous) == len(value):
+                patch.setdefault("items", {})[key] = {
+                    index: item for index, item in enumerate(value) if item != previous[index]
+                }
+                continue
+
+        patch.setdefault("set", {})[key] = value
+    return patch
@@ -5,6 +5,7 @@ from flask_socketio import join_room
 
 from src.web_server import session_user, sio
 from src.web_server.utils import timing
+from src.web_server.lib import player_registry
 from src.web_server.lib.user_session import session_user_set
 from src.web_server.lib.wordle.WordleTable import WordleTable, WordlePlayer
 
@@ -14,18 +15,16 @@ tables: Dict[int, WordleTable] = {}
 @sio.event(namespace="/wordle")
 @timing
 def disconnect():
-    to_remove_ids = []
-    for room_id, game in tables.items():
-        player = game.get_player(None, socket_id=request.sid)
-        if player:
-            game.remove_player(player)
-            game.broadcast_players()
-            if len(game.player_list) == 0:
-                to_remove_ids.append(room_id)
+    entry = player_registry.lookup_socket(request.sid)
+    if entry is None or entry.namespace != "/wordle" or entry.room_id not in tables:
+        return
 
-    for remove_id in to_remove_ids:
-        print(f"Empty room {remove_id}, deleting.")
-        del tables[remove_id]
+    game = tables[entry.room_id]
+    game.remove_player(entry.player)
+    game.broadcast_players()
+    if len(game.player_list) == 0:
+        print(f"Empty room {entry.room_id}, deleting.")
+        del tables[entry.room_id]
 
 
 def on_ping():
@@ -72,8 +71,10 @@ def on_join(data):
 
     table = tables[room_id]
 
-    # Add new player to table if it is not already in there.
-    if not table.get_player(session_user()):
+    # Add new player to table if it is not already in there, otherwise move it to the new socket.
+    if table.get_player(username):
+        table.players.set_socket(username, request.sid)
+    else:
         sio.emit("join", "message", room=room_id, namespace="/wordle")
         # Initialize player and add to table, then inform other players
         player = WordlePlayer(username, request.sid, table)
@@ -8,6 +8,7 @@ from enum import Enum
 from typing import List
 
 from src.web_server import sio
+from src.web_server.lib.player_registry import RoomPlayers
 
 WORD_LISTS = defaultdict(list)
 
@@ -89,6 +90,7 @@ class WordleTable:
         self.room_id = room_id
 
         self.player_list: List[WordlePlayer] = []
+        self.players = RoomPlayers("/wordle", room_id)
         self.current_word = ""
 
         self.guessed_words = []
@@ -234,17 +236,16 @@ class WordleTable:
     def join(self, player: WordlePlayer):
 
         self.player_list.append(player)
+        self.players.add(player.username, player)
 
     def remove_player(self, player):
         self.player_list.remove(player)
+        self.players.remove(player.username)
 
     def get_player(self, username, socket_id=None):
         if socket_id is not None:
-            for player in self.player_list:
-                if player.socket == socket_id:
-                    return player
-
-        for player in self.player_list:
-            if player.username == username:
+            player = self.players.get_by_socket(socket_id)
+            if player is not None:
                 return player
-        return None
+
+        return self.players.get(username)
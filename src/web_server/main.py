@@ -1,10 +1,12 @@
 from flask import (
-    Blueprint, render_template
+    Blueprint, render_template, jsonify
 )
 from werkzeug.exceptions import abort
 
 from src.database.repository import room_repository
 from src.web_server.lib.hallway.entities.player_class import PlayerClass
+from src.web_server.lib.hallway.hallway_hunters import games as hallway_games
+from src.web_server.lib.hallway.profiler import metrics as hallway_metrics
 from src.web_server.lib.user_session import session_user
 
 bp = Blueprint('poker', __name__)
@@ -41,3 +43,8 @@ def wordle(room_id):
 @bp.route('/capture/<int:room_id>', methods=('GET',))
 def capture(room_id):
     return render_template('capture.html', room=room_id)
+
+
+@bp.route('/metrics', methods=('GET',))
+def metrics():
+    return jsonify(hallway_metrics(hallway_games))
@@ -63,9 +63,8 @@ export class HallwayHunters {
             }],
             camera_list: []
         },
-        visible_tiles: [
-            {x: 0, y: 0, tile: {}}
-        ],
+        // Visible cells as [x, y, palette id]
+        visible_tiles: [],
         board: [],
 
     };
@@ -85,6 +84,8 @@ export class HallwayHunters {
     notification = new FadingText(0, 0);
     lookup = {};
     items = [];
+    // Serialized tiles by palette id, the server only sends entries which are new to this client.
+    palette = [];
 
     players = {};
     passives = {};
@@ -92,18 +93,35 @@ export class HallwayHunters {
     setState(data) {
         let start = performance.now();
         if (this.state.board.length === 0) {
+            // Updates to the room can arrive before the full state of this client, which holds the board size.
+            if (data.board_size === undefined) return;
             this.initializeBoard(data.board_size);
         }
 
-        data.removed_entity_ids.forEach(entityId => {
-            this.entities[entityId].renderable = false;
-            delete this.entities[entityId];
-        });
+        if (data.palette !== undefined) {
+            data.palette.forEach((tile, i) => {
+                this.palette[data.palette_offset + i] = tile;
+            });
+        }
+
+        // During the game the server only sends the parts of the state which changed.
+        if (data.removed_entity_ids !== undefined) {
+            data.removed_entity_ids.forEach(entityId => {
+                if (this.entities[entityId] === undefined) return;
+                this.entities[entityId].renderable = false;
+                delete this.entities[entityId];
+            });
+        }
 
         if (data.visible_tiles !== undefined) {
             this.updateBoardSprites(data.visible_tiles);
             this.updateItems(data.visible_tiles);
         }
+        // Changed cells within sight, as [x, y, palette id]
+        if (data.board_changes !== undefined) {
+            this.updateBoardSprites(data.board_changes);
+            this.updateItems(data.board_changes);
+        }
 
         this.state = {
             ...this.state,
@@ -114,25 +132,27 @@ export class HallwayHunters {
 
         // This marks the tiles which are visible
         this.lookup = {};
-        this.state.visible_tiles.forEach((obj) => {
-            if (this.lookup[obj.x] === undefined) {
-                this.lookup[obj.x] = {};
+        this.state.visible_tiles.forEach(([x, y]) => {
+            if (this.lookup[x] === undefined) {
+                this.lookup[x] = {};
             }
-            this.lookup[obj.x][obj.y] = true;
+            this.lookup[x][y] = true;
         });
 
-        // Fix renderable players like this.
-        for (const player of Object.values(this.players)) {
-            player.renderable = false;
-        }
+        if (data.all_players !== undefined) {
+            // Fix renderable players like this.
+            for (const player of Object.values(this.players)) {
+                player.renderable = false;
+            }
 
-        // Update player objects
-        data.all_players.forEach(player => {
-            this.players[player.color].renderable = true;
-            this.players[player.color].update(player);
-        });
+            // Update player objects
+            data.all_players.forEach(player => {
+                this.players[player.color].renderable = true;
+                this.players[player.color].update(player);
+            });
+        }
 
-        data.visible_entities.forEach(entity => {
+        (data.visible_entities || []).forEach(entity => {
             if (entity.sprite_name === undefined) return;
             let entityObj = this.entities[entity.uid];
 
@@ -237,9 +257,9 @@ export class HallwayHunters {
     }
 
     updateBoardSprites(tiles) {
-        tiles.forEach(obj => {
-            let oldTile = this.state.board[obj.x][obj.y];
-            oldTile.setImage(this.tileSet.tiles[obj.tile.image])
+        tiles.forEach(([x, y, paletteId]) => {
+            let oldTile = this.state.board[x][y];
+            oldTile.setImage(this.tileSet.tiles[this.palette[paletteId].image])
         });
     }
 
@@ -291,25 +311,26 @@ export class HallwayHunters {
 
 
     updateItems(tiles) {
-        tiles.forEach(tile => {
-            if (this.state.board[tile.x][tile.y].item !== undefined) {
-                if (tile.tile.item === null) {
+        tiles.forEach(([x, y, paletteId]) => {
+            const tileItem = this.palette[paletteId].item;
+            if (this.state.board[x][y].item !== undefined) {
+                if (tileItem === null) {
                     // TODO: Remove this object from the renderable list
-                    this.state.board[tile.x][tile.y].item.renderable = false;
-                    this.state.board[tile.x][tile.y].item = undefined;
+                    this.state.board[x][y].item.renderable = false;
+                    this.state.board[x][y].item = undefined;
                 } else {
-                    this.state.board[tile.x][tile.y].item.setImage(this.tileSet.tiles[tile.tile.item.name]);
+                    this.state.board[x][y].item.setImage(this.tileSet.tiles[tileItem.name]);
                 }
                 return;
             }
-            if (tile.tile.item !== null) {
-                let item = new SpriteTile(this.tileSet.tiles[tile.tile.item.name]);
+            if (tileItem !== null) {
+                let item = new SpriteTile(this.tileSet.tiles[tileItem.name]);
                 // FIXME: Items aren't always renderable, update this.
                 item.renderable = true;
-                item.x = tile.x * 16;
-                item.y = tile.y * 16;
+                item.x = x * 16;
+                item.y = y * 16;
                 item.z = 1;
-                this.state.board[tile.x][tile.y].item = item;
+                this.state.board[x][y].item = item;
                 this.view.addObjects(item);
             }
         });
@@ -405,7 +405,8 @@ function start() {
      */
     socket.on("game_state", (data) => {
         if (!data.started) {
-            // Lobby information
+            // Lobby information, only sent when a player changed
+            if (data.all_players === undefined) return;
             COLORS.forEach(color => {
                 menuView.colorButtons[color].playerText.setText("");
             });
@@ -93,12 +93,29 @@ function PokerTable() {
 	this.nMessages = 0;
     this.fadeMessages = [];
 
+    // True while waiting for a full state, patches are ignored until it arrives.
+    this.syncing = true;
+
     this.setState = function(data) {
         this.state = {
             ...data,
         };
     };
 
+    this.applyPatch = function(data) {
+        let state = {...this.state, ...(data.patch.set || {}), version: data.version};
+        Object.entries(data.patch.append || {}).forEach(([key, items]) => {
+            state[key] = this.state[key].concat(items);
+        });
+        Object.entries(data.patch.items || {}).forEach(([key, items]) => {
+            state[key] = [...this.state[key]];
+            Object.entries(items).forEach(([index, item]) => {
+                state[key][parseInt(index)] = item;
+            });
+        });
+        return state;
+    };
+
     this.MESSAGE_HEIGHT = 40;
     this.drawFadeMessages = function() {
         let origHeight = 100;
@@ -329,36 +346,25 @@ function initialize() {
      */
     socket.on("table_state", (data) => {
         console.log("Received table state.");
-        // Check before overwriting state.
-        if (pokerTable.state.active_player !== USER_NAME && data.active_player === USER_NAME) {
-            audioFiles["notify"].play();
+        pokerTable.syncing = false;
+        handleTableState(data);
+    });
+    socket.on("table_patch", (data) => {
+        if (pokerTable.syncing) {
+            return;
         }
-        pokerTable.setState(data);
-
-        rangeSlider.max = pokerTable.state.balance;
-
-        document.getElementById("call-button").innerHTML = "Call with " + (pokerTable.state.to_call)
-
-        if (!pokerTable.state.started) {
-            let userList = $(".user-list");
-            userList.empty();
-            data.players.forEach(player => {
-                userList.append(`
-                    <div class="user-entry">
-                    <div class="user-entry-name">${player.color}</div>
-                    <div class="user-entry-balance">${CURRENCY}${player.balance}</div>
-                    <div class="user-entry-ready">${player.ready ? "Ready" : "Not Ready"}</div>
-                    </div>
-                `);
-            });
-
-            let settings = document.getElementById("room-settings");
-            settings.innerHTML = `<div>   
-                <div>Small blind value: ${data.settings.small_blind_value}</div>
-                <div>Max buy-in: ${data.settings.max_buy_in}</div>
-            </div>`;
+        // We missed a version, ask for the full state instead.
+        if (data.version !== pokerTable.state.version + 1) {
+            requestTableState();
+            return;
         }
-
+        handleTableState(pokerTable.applyPatch(data));
+    });
+    socket.on("table_private", (data) => {
+        if (pokerTable.syncing || data.version !== pokerTable.state.version) {
+            return;
+        }
+        handleTableState({...pokerTable.state, ...data});
     });
     socket.on("message", (data) => {
 		pokerTable.nMessages++;
@@ -368,12 +374,49 @@ function initialize() {
         });
     });
 
-    console.log("Requesting stable state");
+    requestTableState();
+}
+
+function requestTableState() {
+    console.log("Requesting table state");
+    pokerTable.syncing = true;
     socket.emit("table_state", {
         "room": ROOM_ID
     });
 }
 
+function handleTableState(data) {
+    // Check before overwriting state.
+    if (pokerTable.state.active_player !== USER_NAME && data.active_player === USER_NAME) {
+        audioFiles["notify"].play();
+    }
+    pokerTable.setState(data);
+
+    rangeSlider.max = pokerTable.state.balance;
+
+    document.getElementById("call-button").innerHTML = "Call with " + (pokerTable.state.to_call)
+
+    if (!pokerTable.state.started) {
+        let userList = $(".user-list");
+        userList.empty();
+        data.players.forEach(player => {
+            userList.append(`
+                <div class="user-entry">
+                <div class="user-entry-name">${player.color}</div>
+                <div class="user-entry-balance">${CURRENCY}${player.balance}</div>
+                <div class="user-entry-ready">${player.ready ? "Ready" : "Not Ready"}</div>
+                </div>
+            `);
+        });
+
+        let settings = document.getElementById("room-settings");
+        settings.innerHTML = `<div>   
+            <div>Small blind value: ${data.settings.small_blind_value}</div>
+            <div>Max buy-in: ${data.settings.max_buy_in}</div>
+        </div>`;
+    }
+}
+
 function postInit() {
 }
 